@@ -1,6 +1,8 @@
 from django.contrib.auth import views as auth_views
 from django.urls import path
 
+from taavonyar.query_budget import query_budget
+
 from .views import (
     choose_dashboard,
     dashboard,
@@ -13,7 +15,11 @@ from .views import (
 app_name = "accounts"
 
 urlpatterns = [
-    path("login/", auth_views.LoginView.as_view(template_name="accounts/login.html"), name="login"),
+    path(
+        "login/",
+        query_budget(5)(auth_views.LoginView.as_view(template_name="accounts/login.html")),
+        name="login",
+    ),
     path("logout/", logout_then_redirect, name="logout"),
     path("register/", register, name="register"),
     path("profile/", profile, name="profile"),
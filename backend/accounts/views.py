@@ -3,6 +3,7 @@ from django.contrib.auth import logout
 from django.contrib.auth.decorators import login_required
 
 from django.db import transaction
+from taavonyar.query_budget import query_budget
 from .forms import RegistrationForm
 
 
@@ -15,6 +16,7 @@ import uuid
 from .models import Individual, Shareholder
 
 
+@query_budget(3)
 @login_required
 def profile(request):
     if hasattr(request.user, "individual"):
@@ -42,14 +44,20 @@ def profile(request):
 
 
 def _role_flags(user):
-    if not hasattr(user, "individual"):
+    # One query for both profiles instead of a lookup per hasattr()
+    flags = (
+        Individual.objects
+        .filter(user=user)
+        .values_list("board_profile__id", "shareholder_profile__id")
+        .first()
+    )
+    if flags is None:
         return False, False
-    ind = user.individual
-    is_board = hasattr(ind, "board_profile")
-    is_shareholder = hasattr(ind, "shareholder_profile")
-    return is_board, is_shareholder
+    board_id, shareholder_id = flags
+    return board_id is not None, shareholder_id is not None
 
 
+@query_budget(5)
 @login_required
 def switch_mode(request, mode: str):
     """
@@ -70,6 +78,7 @@ def switch_mode(request, mode: str):
     return redirect("accounts:dashboard")
 
 
+@query_budget(6)
 @login_required
 def dashboard(request):
     # Require Individual
@@ -98,6 +107,7 @@ def dashboard(request):
     return render(request, "accounts/dashboard_switch.html")
 
 
+@query_budget(6)
 @login_required
 def choose_dashboard(request):
     if not hasattr(request.user, "individual"):
@@ -121,6 +131,7 @@ def _new_shareholder_id() -> str:
     return f"SH-{uuid.uuid4().hex[:12].upper()}"
 
 
+@query_budget(6)
 @require_http_methods(["GET", "POST"])
 def register(request):
     if request.user.is_authenticated:
@@ -154,6 +165,7 @@ def register(request):
 
 
 
+@query_budget(4)
 @require_http_methods(["GET", "POST"])
 def logout_then_redirect(request):
     logout(request)
@@ -0,0 +1,19 @@
+"""
+Ad-hoc performance benchmarks (not collected by pytest).
+
+Run from backend/ against a scratch PostgreSQL database, e.g.:
+
+    python -m benchmarks.query_plans --help
+"""
+import os
+
+
+def setup_django() -> None:
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "taavonyar.settings")
+    # Bulk seeding runs far past the web request limits (taavonyar.db)
+    os.environ.setdefault("POSTGRES_STATEMENT_TIMEOUT_MS", "0")
+    os.environ.setdefault("POSTGRES_IDLE_IN_TRANSACTION_TIMEOUT_MS", "0")
+
+    import django
+
+    django.setup()
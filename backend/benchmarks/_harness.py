@@ -0,0 +1,79 @@
+"""Small helpers shared by the concurrency benchmarks."""
+import statistics
+import threading
+import time
+from dataclasses import dataclass, field
+
+
+@dataclass
+class RunResult:
+    elapsed: float
+    latencies: list[float] = field(default_factory=list)
+    errors: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def ops(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def throughput(self) -> float:
+        return self.ops / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, pct: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def summary(self, label: str) -> str:
+        errors = ", ".join(f"{name}={count}" for name, count in sorted(self.errors.items())) or "none"
+        mean = statistics.fmean(self.latencies) if self.latencies else 0.0
+        return (
+            f"{label:<28} {self.ops:>7} ok  {self.throughput:>9.1f} ops/s  "
+            f"mean {mean * 1000:7.2f} ms  p50 {self.percentile(50) * 1000:7.2f}  "
+            f"p95 {self.percentile(95) * 1000:7.2f}  p99 {self.percentile(99) * 1000:7.2f} ms  errors: {errors}"
+        )
+
+
+def run_concurrently(*, workers: int, iterations: int, operation) -> RunResult:
+    """
+    Run `operation(worker_index, iteration)` `iterations` times in each of
+    `workers` threads, all released at once. Every thread gets its own Django
+    database connection, which is closed when the thread finishes.
+    """
+    from django.db import connection
+
+    result = RunResult(elapsed=0.0)
+    lock = threading.Lock()
+    barrier = threading.Barrier(workers + 1)
+
+    def worker(index: int) -> None:
+        latencies: list[float] = []
+        errors: dict[str, int] = {}
+        try:
+            barrier.wait()
+            for i in range(iterations):
+                started = time.perf_counter()
+                try:
+                    operation(index, i)
+                except Exception as e:  # counted, not fatal: benchmarks report failures
+                    errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+        finally:
+            connection.close()
+            with lock:
+                result.latencies.extend(latencies)
+                for name, count in errors.items():
+                    result.errors[name] = result.errors.get(name, 0) + count
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(workers)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for t in threads:
+        t.join()
+    result.elapsed = time.perf_counter() - started
+    return result
@@ -0,0 +1,123 @@
+"""
+Packed cap table benchmark.
+
+Seeds one cooperative with N holders' ledger entries (1M by default) inside a
+transaction, then times a HoldingSnapshot of the whole cap table, reading it
+back through shares.ledger with and without a ledger tail, diffing two tables
+and computing percentages. Reports the in-memory size, the stored blob size
+and the peak Python allocation of a read. Rolls everything back.
+
+    python -m benchmarks.cap_table --holders 1000000 --tail 10000
+
+Point POSTGRES_* at a scratch database: nothing is committed, but seeding
+takes locks and WAL like any bulk insert.
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import timedelta
+
+from . import setup_django
+
+
+def _seed(cursor, *, holders: int, at) -> tuple[int, list[int]]:
+    from tests.factories import CooperativeFactory
+
+    cursor.execute(
+        """
+        INSERT INTO auth_user (password, is_superuser, username, first_name, last_name, email, is_staff, is_active, date_joined)
+        SELECT '!', false, 'bench_cap_' || g, '', '', '', false, true, now()
+        FROM generate_series(1, %s) AS g
+        RETURNING id
+        """,
+        [holders],
+    )
+    user_ids = [row[0] for row in cursor.fetchall()]
+    coop_id = CooperativeFactory(name="bench_cap_coop", total_shares=2_000_000_000).id
+    # Many small holders, a long tail of large ones; a few percent with shares listed
+    cursor.execute(
+        """
+        INSERT INTO shares_shareledgerentry (cooperative_id, user_id, bucket, kind, delta, created_at)
+        SELECT %(coop)s, u, 'HELD', 'OPENING', 1 + floor(exp(random() * 12))::int, %(at)s
+        FROM unnest(%(users)s::bigint[]) AS u
+        UNION ALL
+        SELECT %(coop)s, u, 'LISTED', 'LISTING', 1 + floor(random() * 20)::int, %(at)s
+        FROM unnest(%(users)s::bigint[]) AS u
+        WHERE random() < 0.03
+        """,
+        {"coop": coop_id, "users": user_ids, "at": at},
+    )
+    cursor.execute("ANALYZE shares_shareledgerentry")
+    return coop_id, user_ids
+
+
+def _timed(fn, *args, **kwargs) -> tuple[object, float]:
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--holders", type=int, default=1_000_000)
+    parser.add_argument("--tail", type=int, default=10_000, help="Ledger entries written after the snapshot")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.db import connection, transaction
+    from django.utils import timezone
+
+    from coops.models import Cooperative
+    from shares import captable, ledger
+
+    opened = timezone.now() - timedelta(days=2)
+    with transaction.atomic(), connection.cursor() as cursor:
+        started = time.perf_counter()
+        coop_id, user_ids = _seed(cursor, holders=args.holders, at=opened)
+        coop = Cooperative.objects.get(id=coop_id)
+        print(f"seeded {args.holders} holders in {time.perf_counter() - started:.1f}s\n")
+
+        snapshot, ms = _timed(ledger.take_snapshot, coop, at=opened + timedelta(hours=1))
+        cursor.execute("SELECT pg_column_size(positions) FROM shares_holdingsnapshot WHERE id = %s", [snapshot.id])
+        stored = cursor.fetchone()[0]
+        print("snapshot")
+        print(f"  take_snapshot                      {ms:9.0f} ms")
+        print(f"  packed blob                        {len(snapshot.positions) / 2**20:9.1f} MB")
+        print(f"  stored (pg_column_size)            {stored / 2**20:9.1f} MB")
+
+        tracemalloc.start()
+        before, ms = _timed(ledger.cap_table, coop, opened + timedelta(hours=2))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print("\nreads")
+        print(f"  cap_table from the snapshot        {ms:9.0f} ms   peak {peak / 2**20:6.1f} MB"
+              f"   table {before.nbytes / 2**20:6.1f} MB")
+
+        cursor.execute(
+            """
+            INSERT INTO shares_shareledgerentry (cooperative_id, user_id, bucket, kind, delta, created_at)
+            SELECT %(coop)s, u, 'HELD', 'PURCHASE', 1 + floor(random() * 50)::int, %(at)s
+            FROM unnest(%(users)s::bigint[]) AS u
+            ORDER BY random()
+            LIMIT %(tail)s
+            """,
+            {"coop": coop_id, "users": user_ids, "at": opened + timedelta(hours=3), "tail": args.tail},
+        )
+        after, ms = _timed(ledger.cap_table, coop, opened + timedelta(hours=4))
+        print(f"  cap_table, snapshot + {args.tail} tail  {ms:9.0f} ms")
+        _, ms = _timed(ledger.as_of, coop, opened + timedelta(hours=4))
+        print(f"  as_of (dict of Position)           {ms:9.0f} ms")
+
+        changed, ms = _timed(captable.diff, before, after)
+        print("\nin memory")
+        print(f"  diff ({len(changed.user_ids)} changed)            {ms:9.1f} ms")
+        _, ms = _timed(after.percentages)
+        print(f"  percentages                        {ms:9.1f} ms")
+        assert len(changed.user_ids) == args.tail
+
+        # Leave the database exactly as we found it
+        transaction.set_rollback(True)
+
+
+if __name__ == "__main__":
+    main()
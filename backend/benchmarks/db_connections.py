@@ -0,0 +1,117 @@
+"""
+Database connection runtime benchmark.
+
+Runs the same simulated request (Django's request_started and
+request_finished signals around a few short statements) under each connection
+mode of settings.DATABASES: a fresh connection per request, one persistent
+health-checked connection per thread, and a psycopg pool. Reports per-request
+latency, what each mode saves against connecting every time, and how many
+server connections were opened.
+
+    python -m benchmarks.db_connections --requests 2000 --queries 5 --threads 4
+
+Needs psycopg_pool for the pool mode (skipped without it). Reads nothing but
+SELECT 1, so any database will do; connection setup cost grows with network
+distance and auth method, so run it against a server like production's.
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from . import setup_django
+
+MODES = ("per request", "persistent", "pool")
+
+
+def _configure(mode: str, *, pool_size: int) -> None:
+    from django.db import connection
+
+    db = connection.settings_dict  # shared with every thread's wrapper
+    if db["OPTIONS"].get("pool"):
+        connection.close_pool()
+    db["OPTIONS"].pop("pool", None)
+    db["CONN_MAX_AGE"] = 60 if mode == "persistent" else 0
+    db["CONN_HEALTH_CHECKS"] = True
+    if mode == "pool":
+        db["OPTIONS"]["pool"] = {"min_size": pool_size, "max_size": pool_size, "timeout": 30}
+
+
+def _run(requests: int, queries: int, threads: int) -> tuple[list[float], float]:
+    from django.core.signals import request_finished, request_started
+    from django.db import connection, connections
+
+    timings: list[float] = []
+    lock = threading.Lock()
+
+    def worker(count: int) -> None:
+        mine = []
+        for _ in range(count):
+            started = time.perf_counter()
+            request_started.send(sender=None)
+            with connection.cursor() as cursor:
+                for _ in range(queries):
+                    cursor.execute("SELECT 1")
+                    cursor.fetchone()
+            request_finished.send(sender=None)
+            mine.append((time.perf_counter() - started) * 1000)
+        connections.close_all()
+        with lock:
+            timings.extend(mine)
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(requests // threads,)) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return timings, time.perf_counter() - started
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=5, help="Statements per request")
+    parser.add_argument("--threads", type=int, default=4, help="Concurrent workers (the pool has this many connections)")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.db import connection
+
+    from taavonyar import db
+
+    try:
+        import psycopg_pool  # noqa: F401
+        modes = MODES
+    except ImportError:
+        print("psycopg_pool is not installed: skipping the pool mode\n")
+        modes = MODES[:2]
+
+    print(f"{args.requests} requests of {args.queries} statements on {args.threads} thread(s)\n")
+    print(f"  {'mode':<12} {'median ms':>10} {'p95 ms':>8} {'saved ms':>9} {'req/s':>8} {'connections':>12}")
+    baseline = None
+    for mode in modes:
+        _configure(mode, pool_size=args.threads)
+        _run(min(args.requests, 50 * args.threads), args.queries, args.threads)  # warm up
+        opened_warm = db.connection_stats().get("connections_opened", 0)
+        timings, wall = _run(args.requests, args.queries, args.threads)
+        stats = db.connection_stats()
+        if mode == "pool":
+            opened = stats["pool"].get("connections_num", 0)
+        else:
+            opened = stats["connections_opened"] - opened_warm
+        timings.sort()
+        median = statistics.median(timings)
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        baseline = median if baseline is None else baseline
+        print(
+            f"  {mode:<12} {median:10.3f} {p95:8.3f} {baseline - median:9.3f}"
+            f" {len(timings) / wall:8.0f} {opened:12d}"
+        )
+
+    _configure("per request", pool_size=args.threads)
+    connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Shareholder leaderboard benchmark.
+
+Seeds one cooperative with N holdings (1M by default, skewed like a real cap
+table) inside a transaction, rebuilds its Fenwick tree, then times rank
+lookups through shares.leaderboard against counting the holders ahead on the
+holdings index, top-10 reads, and holdings writes that keep the tree. Rolls
+everything back.
+
+    python -m benchmarks.leaderboard --holdings 1000000 --samples 200
+
+Point POSTGRES_* at a scratch database: nothing is committed, but seeding
+takes locks and WAL like any bulk insert.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from . import setup_django
+
+
+def _seed(cursor, *, holdings: int) -> tuple[int, list[int]]:
+    from tests.factories import CooperativeFactory
+
+    cursor.execute(
+        """
+        INSERT INTO auth_user (password, is_superuser, username, first_name, last_name, email, is_staff, is_active, date_joined)
+        SELECT '!', false, 'bench_rank_' || g, '', '', '', false, true, now()
+        FROM generate_series(1, %s) AS g
+        RETURNING id
+        """,
+        [holdings],
+    )
+    user_ids = [row[0] for row in cursor.fetchall()]
+    coop_id = CooperativeFactory(name="bench_rank_coop", total_shares=2_000_000_000).id
+    # Many small holders, a long tail of large ones
+    cursor.execute(
+        """
+        INSERT INTO shares_shareholding (cooperative_id, user_id, quantity)
+        SELECT %s, u, 1 + floor(exp(random() * 12))::int
+        FROM unnest(%s::bigint[]) AS u
+        """,
+        [coop_id, user_ids],
+    )
+    cursor.execute("ANALYZE shares_shareholding")
+    return coop_id, user_ids
+
+
+def _timed(fn, *args) -> tuple[object, float]:
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def _report(label: str, timings: list[float]) -> None:
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1] if len(timings) >= 20 else timings[-1]
+    print(f"  {label:<34} median {statistics.median(timings):8.3f} ms   p95 {p95:8.3f} ms")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--holdings", type=int, default=1_000_000)
+    parser.add_argument("--samples", type=int, default=200, help="Rank lookups and writes to time")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.db import connection, transaction
+
+    from shares import holdings, leaderboard
+    from shares.models import LeaderboardDelta, ShareLedgerEntry
+
+    def counted_rank(coop_id: int, user_id: int) -> int:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT 1 + COUNT(*) FROM shares_shareholding
+                WHERE cooperative_id = %(coop)s
+                  AND quantity > (SELECT quantity FROM shares_shareholding WHERE cooperative_id = %(coop)s AND user_id = %(user)s)
+                """,
+                {"coop": coop_id, "user": user_id},
+            )
+            return cursor.fetchone()[0]
+
+    rng = random.Random(1)
+    with transaction.atomic(), connection.cursor() as cursor:
+        started = time.perf_counter()
+        coop_id, user_ids = _seed(cursor, holdings=args.holdings)
+        print(f"seeded {args.holdings} holdings in {time.perf_counter() - started:.1f}s")
+
+        _, ms = _timed(leaderboard.rebuild, coop_id)
+        cursor.execute("SELECT COUNT(*) FROM shares_leaderboardnode WHERE cooperative_id = %s", [coop_id])
+        print(f"rebuilt the tree in {ms:.0f} ms ({cursor.fetchone()[0]} nodes)\n")
+
+        sample = rng.sample(user_ids, min(args.samples, len(user_ids)))
+        tree, counted = [], []
+        for user_id in sample:
+            expected, ms = _timed(counted_rank, coop_id, user_id)
+            counted.append(ms)
+            got, ms = _timed(leaderboard.rank, coop_id, user_id)
+            tree.append(ms)
+            assert got == expected, f"user {user_id}: tree rank {got}, counted rank {expected}"
+
+        top = leaderboard.standings(coop_id).values_list("user_id", "quantity")
+        top_timings = [_timed(lambda: list(top[:10]))[1] for _ in range(len(sample))]
+
+        print("reads")
+        _report("rank via COUNT(*) on the index", counted)
+        _report("rank via the Fenwick tree", tree)
+        _report("top 10 via the index", top_timings)
+
+        writes = []
+        for user_id in sample:
+            writes.append(_timed(lambda u=user_id: holdings.credit(
+                coop_id=coop_id, user_id=u, quantity=rng.randint(1, 50), kind=ShareLedgerEntry.Kind.PURCHASE))[1])
+        pending = LeaderboardDelta.objects.filter(cooperative_id=coop_id).count()
+        print("\nwrites")
+        _report("credit (holding, ledger, deltas)", writes)
+        print(f"  {pending / len(sample):.1f} leaderboard delta rows per credit")
+
+        _, ms = _timed(leaderboard.compact, coop_id)
+        print(f"  compacting {pending} deltas took {ms:.1f} ms")
+        assert leaderboard.verify(coop_id) == []
+
+        # Leave the database exactly as we found it
+        transaction.set_rollback(True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+Concurrent marketplace load benchmark.
+
+Seeds cooperatives, sellers with active listings and buyers with a few shares
+(via tests.factories and the share services), then runs each scenario with N
+buyer threads released at once:
+
+    marketplace     buy_from_marketplace(source="auto")
+    listing         buy_from_listing on a random seeded listing
+    primary         buy_primary_shares_from_coop
+    create_listing  create_listing from the buyer's own holding
+    mixed           a weighted mix of the four
+    same_buyer      pairs of threads share one buyer and coop, each picking
+                    one of the three buys, create_listing or cancel_listing of
+                    the buyer's own listing at random (a double-click across
+                    every entry point)
+
+For every scenario it prints ops/s, trades/s, p50/p95/p99 latency, rejected
+operations (business errors such as "sold out"), lock waits sampled from
+pg_stat_activity and deadlocks reported by pg_stat_database. After each
+scenario it checks conservation of shares per coop (held + listed + primary
+inventory never changes) and the liquidity book, and exits non-zero on any
+oversell, drift or deadlock.
+
+    python -m benchmarks.marketplace_load --coops 2 --sellers 50 --listings-per-seller 4 --workers 32
+
+Data is committed while the benchmark runs and deleted afterwards (unless
+--keep). Use a scratch database.
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+import uuid
+
+from . import setup_django
+from ._harness import run_concurrently
+
+SCENARIOS = ("marketplace", "listing", "primary", "create_listing", "mixed", "same_buyer")
+
+# Weights of the mixed scenario, in SCENARIOS order
+MIX = {"marketplace": 4, "listing": 3, "primary": 2, "create_listing": 1}
+
+
+class LockSampler:
+    """Polls pg_stat_activity from its own connection while a scenario runs."""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.samples = 0
+        self.waiting_total = 0
+        self.waiting_max = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        from django.db import connection
+
+        try:
+            with connection.cursor() as cursor:
+                while not self._stop.is_set():
+                    cursor.execute(
+                        """
+                        SELECT count(*) FROM pg_stat_activity
+                        WHERE datname = current_database() AND wait_event_type = 'Lock'
+                        """
+                    )
+                    waiting = cursor.fetchone()[0]
+                    self.samples += 1
+                    self.waiting_total += waiting
+                    self.waiting_max = max(self.waiting_max, waiting)
+                    time.sleep(self.interval)
+        finally:
+            connection.close()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def summary(self) -> str:
+        mean = self.waiting_total / self.samples if self.samples else 0.0
+        # Each sample stands for `interval` seconds of every session seen waiting
+        lock_wait = self.waiting_total * self.interval
+        return f"lock waits: ~{lock_wait:.2f} session-s, mean {mean:.2f} / max {self.waiting_max} sessions waiting"
+
+
+def _deadlocks() -> int:
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT deadlocks FROM pg_stat_database WHERE datname = current_database()")
+        return int(cursor.fetchone()[0])
+
+
+def _share_totals(coops) -> dict[int, int]:
+    """held + listed + primary inventory per coop: invariant under every operation."""
+    from django.db.models import Sum
+
+    from coops.services import primary_available
+    from shares.models import ShareHolding, ShareListing
+
+    totals = {}
+    for coop in coops:
+        coop.refresh_from_db()
+        held = ShareHolding.objects.filter(cooperative=coop).aggregate(t=Sum("quantity"))["t"] or 0
+        listed = (
+            ShareListing.objects
+            .filter(cooperative=coop, status=ShareListing.Status.ACTIVE)
+            .aggregate(t=Sum("quantity_available"))["t"]
+            or 0
+        )
+        totals[coop.id] = held + listed + primary_available(coop)
+    return totals
+
+
+def _seed(args, tag: str):
+    from django.contrib.auth import get_user_model
+
+    from coops.services import set_primary_inventory
+    from shares import leaderboard, ownership
+    from shares.models import ShareListing
+    from shares.services import create_listing
+    from tests.factories import CooperativeFactory, HoldingFactory
+
+    User = get_user_model()
+    # Bulk-created: the factory's set_password would dominate the seeding time
+    sellers = User.objects.bulk_create(
+        [User(username=f"bench_{tag}_s{n}", password="!") for n in range(args.sellers)]
+    )
+    buyers = User.objects.bulk_create(
+        [User(username=f"bench_{tag}_b{n}", password="!") for n in range(args.workers)]
+    )
+
+    coops = []
+    for n in range(args.coops):
+        coop = CooperativeFactory(name=f"bench_{tag}_{n}", price_per_share=1000, available_primary_shares=args.primary)
+        if args.stripes:
+            set_primary_inventory(coop=coop, stripes=args.stripes)
+        for seller in sellers:
+            HoldingFactory(cooperative=coop, user=seller, quantity=args.listings_per_seller * args.listing_size)
+            for _ in range(args.listings_per_seller):
+                create_listing(coop=coop, seller=seller, quantity=args.listing_size)
+        for buyer in buyers:
+            HoldingFactory(cooperative=coop, user=buyer, quantity=args.buyer_shares)
+        # The factory writes holdings directly: recount the figures the writers keep
+        # up to date (and compact as they go) from these holdings
+        ownership.rebuild(coop.id)
+        leaderboard.rebuild(coop.id)
+        coops.append(coop)
+
+    listing_ids = list(
+        ShareListing.objects.filter(cooperative__in=coops, status=ShareListing.Status.ACTIVE).values_list("id", flat=True)
+    )
+    return coops, sellers, buyers, listing_ids
+
+
+def _operations(args, coops, buyers, listing_ids):
+    from shares.models import ShareListing
+    from shares.services import (
+        buy_from_listing,
+        buy_from_marketplace,
+        buy_primary_shares_from_coop,
+        cancel_listing,
+        create_listing,
+    )
+
+    def marketplace(rng, buyer):
+        buy_from_marketplace(coop=rng.choice(coops), buyer=buyer, quantity=args.quantity, source="auto")
+
+    def listing(rng, buyer):
+        listing = ShareListing.objects.select_related("cooperative").get(id=rng.choice(listing_ids))
+        buy_from_listing(listing=listing, buyer=buyer, quantity=min(args.quantity, listing.quantity_available or 1))
+
+    def primary(rng, buyer):
+        buy_primary_shares_from_coop(coop=rng.choice(coops), buyer=buyer, quantity=args.quantity)
+
+    def new_listing(rng, buyer):
+        create_listing(coop=rng.choice(coops), seller=buyer, quantity=1)
+
+    ops = {"marketplace": marketplace, "listing": listing, "primary": primary, "create_listing": new_listing}
+    names, weights = list(MIX), list(MIX.values())
+
+    def mixed(rng, buyer):
+        ops[rng.choices(names, weights)[0]](rng, buyer)
+
+    first_coop_listings = list(
+        ShareListing.objects.filter(id__in=listing_ids, cooperative=coops[0]).values_list("id", flat=True)
+    )
+
+    def same_buyer(rng, buyer):
+        # Every entry point on one coop: they must take its locks in the same order
+        coop = coops[0]
+        pick = rng.randrange(5)
+        if pick == 0:
+            buy_primary_shares_from_coop(coop=coop, buyer=buyer, quantity=args.quantity)
+        elif pick == 1:
+            buy_from_marketplace(coop=coop, buyer=buyer, quantity=args.quantity, source="auto")
+        elif pick == 2:
+            listing = ShareListing.objects.select_related("cooperative").get(id=rng.choice(first_coop_listings))
+            buy_from_listing(listing=listing, buyer=buyer, quantity=min(args.quantity, listing.quantity_available or 1))
+        elif pick == 3:
+            create_listing(coop=coop, seller=buyer, quantity=1)
+        else:
+            own = ShareListing.objects.filter(cooperative=coop, seller=buyer, status=ShareListing.Status.ACTIVE).first()
+            if own is None:
+                raise ValueError("No own listing to cancel")
+            cancel_listing(listing=own, by_user=buyer)
+
+    ops["mixed"] = mixed
+    ops["same_buyer"] = same_buyer
+    return ops
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--coops", type=int, default=2)
+    parser.add_argument("--sellers", type=int, default=50)
+    parser.add_argument("--listings-per-seller", type=int, default=4)
+    parser.add_argument("--listing-size", type=int, default=5, help="Shares per seeded listing")
+    parser.add_argument("--primary", type=int, default=100_000, help="Primary inventory per coop")
+    parser.add_argument("--stripes", type=int, default=0, help="Stripe primary inventory across N slots")
+    parser.add_argument("--buyer-shares", type=int, default=20, help="Shares each buyer starts with (for create_listing)")
+    parser.add_argument("--workers", type=int, default=16, help="Concurrent buyer threads")
+    parser.add_argument("--iterations", type=int, default=50, help="Operations per worker per scenario")
+    parser.add_argument("--quantity", type=int, default=2, help="Shares per purchase")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--keep", action="store_true", help="Leave the seeded data in place")
+    args = parser.parse_args(argv)
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    setup_django()
+    from django.contrib.auth import get_user_model
+
+    from shares import liquidity
+    from shares.models import ShareTrade
+
+    tag = uuid.uuid4().hex[:8]
+    started = time.perf_counter()
+    coops, sellers, buyers, listing_ids = _seed(args, tag)
+    print(
+        f"seeded {len(coops)} coop(s), {len(sellers)} sellers, {len(listing_ids)} listings, "
+        f"{len(buyers)} buyers in {time.perf_counter() - started:.1f}s\n"
+    )
+
+    ops = _operations(args, coops, buyers, listing_ids)
+    expected = _share_totals(coops)
+    failures = []
+    try:
+        for name in scenarios:
+            operation = ops[name]
+            # same_buyer: workers 2n and 2n + 1 buy as the same user
+            buyer_of = (lambda worker: buyers[worker // 2]) if name == "same_buyer" else buyers.__getitem__
+            rngs = [random.Random(args.seed * 1000 + n) for n in range(args.workers)]
+            trades_before = ShareTrade.objects.filter(cooperative__in=coops).count()
+            deadlocks_before = _deadlocks()
+
+            with LockSampler() as sampler:
+                result = run_concurrently(
+                    workers=args.workers,
+                    iterations=args.iterations,
+                    operation=lambda worker, _i, op=operation, of=buyer_of: op(rngs[worker], of(worker)),
+                )
+
+            trades = ShareTrade.objects.filter(cooperative__in=coops).count() - trades_before
+            deadlocks = _deadlocks() - deadlocks_before
+            print(result.summary(name))
+            print(
+                f"{'':<28} {trades / result.elapsed if result.elapsed else 0:>9.1f} trades/s  "
+                f"{sampler.summary()}  deadlocks: {deadlocks}"
+            )
+
+            if deadlocks:
+                failures.append(f"{name}: {deadlocks} deadlock(s)")
+            actual = _share_totals(coops)
+            for coop in coops:
+                if actual[coop.id] != expected[coop.id]:
+                    failures.append(f"{name}: coop {coop.id} shares {expected[coop.id]} -> {actual[coop.id]}")
+                failures.extend(f"{name}: {line}" for line in liquidity.verify(coop.id))
+            print()
+    finally:
+        if not args.keep:
+            for coop in coops:
+                coop.delete()
+            get_user_model().objects.filter(id__in=[u.id for u in sellers + buyers]).delete()
+
+    if failures:
+        print("INVARIANT VIOLATIONS:")
+        for line in failures:
+            print(f"  {line}")
+        sys.exit(1)
+    print("no oversell or deadlock, liquidity book consistent")
+
+
+if __name__ == "__main__":
+    main()
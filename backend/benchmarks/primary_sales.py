@@ -0,0 +1,107 @@
+"""
+Concurrent primary-offering benchmark.
+
+Many buyers hammer one cooperative's primary inventory. Compares the old
+select_for_update flow (lock the coop row for the whole transaction) with
+shares.services.buy_primary_shares_from_coop (guarded UPDATE ... RETURNING as
+the first statement, so the coop row is held through the holding credit until
+commit), with and without striped slots.
+
+    python -m benchmarks.primary_sales --workers 32 --iterations 50 --stripes 16
+
+Data is committed while the benchmark runs (threads must see each other's
+writes) and deleted afterwards. Use a scratch database.
+"""
+import argparse
+import uuid
+
+from . import setup_django
+from ._harness import run_concurrently
+
+
+def _legacy_locked_purchase(*, coop_id: int, buyer, quantity: int) -> None:
+    """The pre-optimisation flow, kept here only as a baseline."""
+    from django.db import transaction
+    from django.db.models import F
+
+    from coops.models import Cooperative
+    from shares.models import ShareHolding, ShareTrade
+
+    with transaction.atomic():
+        coop = Cooperative.objects.select_for_update().get(id=coop_id)
+        if coop.available_primary_shares < quantity:
+            raise ValueError("Cooperative does not have enough shares available for sale")
+        coop.available_primary_shares = F("available_primary_shares") - quantity
+        coop.save(update_fields=["available_primary_shares"])
+        coop.refresh_from_db()
+        holding, _ = ShareHolding.objects.get_or_create(cooperative=coop, user=buyer, defaults={"quantity": 0})
+        holding.quantity = F("quantity") + quantity
+        holding.save(update_fields=["quantity"])
+        ShareTrade.objects.create(
+            cooperative=coop,
+            buyer=buyer,
+            seller=None,
+            quantity=quantity,
+            price_per_share=coop.price_per_share,
+            total_price=coop.price_per_share * quantity,
+        )
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--quantity", type=int, default=1)
+    parser.add_argument("--stripes", type=int, default=16, help="Slots for the striped run")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.contrib.auth import get_user_model
+
+    from coops.services import primary_available, set_primary_inventory
+    from shares.models import ShareHolding, ShareTrade
+    from shares.services import buy_primary_shares_from_coop
+    from tests.factories import CooperativeFactory
+
+    User = get_user_model()
+    tag = uuid.uuid4().hex[:8]
+    # Twice what the run buys, so we measure a live offering rather than its sell-out tail
+    total = 2 * args.workers * args.iterations * args.quantity
+
+    buyers = User.objects.bulk_create(
+        [User(username=f"bench_{tag}_{n}", password="!") for n in range(args.workers)]
+    )
+    coops = []
+    try:
+        print(f"{args.workers} workers x {args.iterations} purchases of {args.quantity} share(s)\n")
+        for label, stripes, purchase in (
+            ("select_for_update (old)", 0, lambda coop, buyer: _legacy_locked_purchase(
+                coop_id=coop.id, buyer=buyer, quantity=args.quantity)),
+            ("guarded UPDATE", 0, lambda coop, buyer: buy_primary_shares_from_coop(
+                coop=coop, buyer=buyer, quantity=args.quantity)),
+            (f"striped x{args.stripes}", args.stripes, lambda coop, buyer: buy_primary_shares_from_coop(
+                coop=coop, buyer=buyer, quantity=args.quantity)),
+        ):
+            coop = CooperativeFactory(name=f"bench_{tag}_{len(coops)}", available_primary_shares=total)
+            coops.append(coop)
+            if stripes:
+                set_primary_inventory(coop=coop, stripes=stripes)
+            result = run_concurrently(
+                workers=args.workers,
+                iterations=args.iterations,
+                operation=lambda worker, _i, coop=coop, purchase=purchase: purchase(coop, buyers[worker]),
+            )
+            print(result.summary(label))
+
+            coop.refresh_from_db()
+            sold = sum(ShareHolding.objects.filter(cooperative=coop).values_list("quantity", flat=True))
+            assert sold + primary_available(coop) == total, "oversold / lost shares"
+    finally:
+        ShareTrade.objects.filter(cooperative__in=coops).delete()
+        for coop in coops:
+            coop.delete()
+        User.objects.filter(id__in=[b.id for b in buyers]).delete()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Query-plan benchmark for the marketplace, trade-history and holding hot paths.
+
+Seeds a synthetic data set (1M trades / 100k listings by default) inside a
+transaction, runs EXPLAIN ANALYZE for every hot query with and without the
+indexes added in shares.0003, prints both plans and rolls everything back.
+
+    python -m benchmarks.query_plans --trades 1000000 --listings 100000
+
+Point POSTGRES_* at a scratch database: nothing is committed, but seeding
+takes locks and WAL like any bulk insert.
+"""
+import argparse
+import json
+import time
+
+from . import setup_django
+
+NEW_INDEXES = [
+    "holding_coop_quantity_idx",
+    "listing_active_fifo_idx",
+    "trade_buyer_recent_idx",
+    "trade_seller_recent_idx",
+    "trade_coop_recent_idx",
+]
+
+
+def _seed(cursor, *, users: int, coops: int, trades: int, listings: int, holdings: int) -> dict:
+    cursor.execute(
+        """
+        INSERT INTO auth_user (password, is_superuser, username, first_name, last_name, email, is_staff, is_active, date_joined)
+        SELECT '!', false, 'bench_user_' || g, '', '', '', false, true, now()
+        FROM generate_series(1, %s) AS g
+        """,
+        [users],
+    )
+    cursor.execute("SELECT min(id), max(id) FROM auth_user WHERE username LIKE 'bench_user_%%'")
+    user_min, user_max = cursor.fetchone()
+
+    cursor.execute(
+        """
+        INSERT INTO coops_cooperative (name, village, description, image, price_per_share, total_shares,
+                                       available_primary_shares, website, phone, created_at)
+        SELECT 'bench_coop_' || g, '', '', '', 1000, 1000000, 0, '', '', now()
+        FROM generate_series(1, %s) AS g
+        """,
+        [coops],
+    )
+    cursor.execute("SELECT min(id), max(id) FROM coops_cooperative WHERE name LIKE 'bench_coop_%%'")
+    coop_min, coop_max = cursor.fetchone()
+
+    ids = {"u0": user_min, "un": user_max - user_min + 1, "c0": coop_min, "cn": coop_max - coop_min + 1}
+
+    cursor.execute(
+        """
+        INSERT INTO shares_sharetrade (cooperative_id, buyer_id, seller_id, quantity, price_per_share, total_price, created_at)
+        SELECT c, b, CASE WHEN random() < 0.3 THEN NULL ELSE s END, q, 1000, q * 1000,
+               now() - random() * interval '365 days'
+        FROM (
+            SELECT %(c0)s + floor(random() * %(cn)s)::bigint AS c,
+                   %(u0)s + floor(random() * %(un)s)::bigint AS b,
+                   %(u0)s + floor(random() * %(un)s)::bigint AS s,
+                   1 + floor(random() * 50)::int AS q
+            FROM generate_series(1, %(n)s)
+        ) AS sub
+        """,
+        {**ids, "n": trades},
+    )
+
+    # Most listings in a mature market are closed; ~5% stay ACTIVE
+    cursor.execute(
+        """
+        INSERT INTO shares_sharelisting (cooperative_id, seller_id, quantity_available, status, price_per_share, created_at)
+        SELECT c, s,
+               CASE WHEN r < 0.05 THEN 1 + floor(random() * 100)::int
+                    WHEN r < 0.75 THEN 0
+                    ELSE floor(random() * 100)::int END,
+               CASE WHEN r < 0.05 THEN 'ACTIVE' WHEN r < 0.75 THEN 'SOLD_OUT' ELSE 'CANCELED' END,
+               1000,
+               now() - random() * interval '365 days'
+        FROM (
+            SELECT %(c0)s + floor(random() * %(cn)s)::bigint AS c,
+                   %(u0)s + floor(random() * %(un)s)::bigint AS s,
+                   random() AS r
+            FROM generate_series(1, %(n)s)
+        ) AS sub
+        """,
+        {**ids, "n": listings},
+    )
+
+    cursor.execute(
+        """
+        INSERT INTO shares_shareholding (cooperative_id, user_id, quantity)
+        SELECT %(c0)s + floor(random() * %(cn)s)::bigint,
+               %(u0)s + floor(random() * %(un)s)::bigint,
+               CASE WHEN random() < 0.2 THEN 0 ELSE 1 + floor(random() * 1000)::int END
+        FROM generate_series(1, %(n)s)
+        ON CONFLICT (cooperative_id, user_id) DO NOTHING
+        """,
+        {**ids, "n": holdings},
+    )
+
+    for table in ("auth_user", "coops_cooperative", "shares_sharetrade", "shares_sharelisting", "shares_shareholding"):
+        cursor.execute(f"ANALYZE {table}")
+    return ids
+
+
+def _hot_queries(ids: dict) -> dict:
+    from shares.models import ShareHolding, ShareListing, ShareTrade
+
+    coop_id, user_id = ids["c0"], ids["u0"]
+    return {
+        "active listings FIFO": ShareListing.objects
+            .filter(cooperative_id=coop_id, status=ShareListing.Status.ACTIVE)
+            .order_by("created_at", "id")[:200],
+        "trades by buyer": ShareTrade.objects.filter(buyer_id=user_id).order_by("-created_at")[:50],
+        "trades by seller": ShareTrade.objects.filter(seller_id=user_id).order_by("-created_at")[:50],
+        "trades by coop": ShareTrade.objects.filter(cooperative_id=coop_id).order_by("-created_at")[:50],
+        "top holdings": ShareHolding.objects
+            .filter(cooperative_id=coop_id, quantity__gt=0)
+            .order_by("-quantity")[:10],
+    }
+
+
+def _plan_nodes(plan: dict) -> list[str]:
+    label = plan["Node Type"]
+    if "Index Name" in plan:
+        label += f" on {plan['Index Name']}"
+    nodes = [label]
+    for child in plan.get("Plans", []):
+        nodes.extend(_plan_nodes(child))
+    return nodes
+
+
+def _explain(cursor, queryset) -> tuple[list[str], float]:
+    sql, params = queryset.query.sql_with_params()
+    cursor.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}", params)
+    raw = cursor.fetchone()[0]
+    doc = (json.loads(raw) if isinstance(raw, str) else raw)[0]
+    return _plan_nodes(doc["Plan"]), doc["Execution Time"]
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--coops", type=int, default=200)
+    parser.add_argument("--trades", type=int, default=1_000_000)
+    parser.add_argument("--listings", type=int, default=100_000)
+    parser.add_argument("--holdings", type=int, default=200_000)
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.db import connection, transaction
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        started = time.perf_counter()
+        ids = _seed(
+            cursor,
+            users=args.users,
+            coops=args.coops,
+            trades=args.trades,
+            listings=args.listings,
+            holdings=args.holdings,
+        )
+        print(f"seeded in {time.perf_counter() - started:.1f}s "
+              f"({args.trades} trades, {args.listings} listings, {args.holdings} holdings)\n")
+
+        queries = _hot_queries(ids)
+        after = {name: _explain(cursor, qs) for name, qs in queries.items()}
+
+        for name in NEW_INDEXES:
+            cursor.execute(f"DROP INDEX IF EXISTS {name}")
+        before = {name: _explain(cursor, qs) for name, qs in queries.items()}
+
+        for name in queries:
+            (b_nodes, b_ms), (a_nodes, a_ms) = before[name], after[name]
+            print(name)
+            print(f"  without indexes: {b_ms:9.2f} ms  {' -> '.join(b_nodes)}")
+            print(f"  with indexes:    {a_ms:9.2f} ms  {' -> '.join(a_nodes)}")
+
+        # Leave the database exactly as we found it
+        transaction.set_rollback(True)
+
+
+if __name__ == "__main__":
+    main()
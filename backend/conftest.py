@@ -0,0 +1,16 @@
+import pytest
+from django.core.cache import cache
+
+
+@pytest.fixture(autouse=True)
+def enforce_query_budgets(settings):
+    """Every request made through the test client must stay within its view's query budget."""
+    settings.QUERY_BUDGETS_ENFORCED = True
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    """Cached pages must not leak between tests (the database rolls back, the cache does not)."""
+    cache.clear()
+    yield
+    cache.clear()
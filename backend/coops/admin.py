@@ -1,8 +1,21 @@
 from django.contrib import admin
-from .models import Cooperative
+from .models import Cooperative, ExportJob, PrimaryShareSlot
 
 @admin.register(Cooperative)
 class CooperativeAdmin(admin.ModelAdmin):
-    list_display = ("name", "village", "price_per_share", "total_shares", "created_at")
+    list_display = ("name", "village", "price_per_share", "total_shares", "primary_stripes", "created_at")
     search_fields = ("name", "village")
-    list_filter = ("created_at",)
\ No newline at end of file
+    list_filter = ("created_at",)
+
+
+@admin.register(PrimaryShareSlot)
+class PrimaryShareSlotAdmin(admin.ModelAdmin):
+    list_display = ("cooperative", "slot", "available")
+    search_fields = ("cooperative__name",)
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ("cooperative", "kind", "status", "row_count", "created_at", "finished_at")
+    list_filter = ("kind", "status", "created_at")
+    search_fields = ("cooperative__name",)
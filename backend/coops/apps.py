@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CoopsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'coops'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (connects the page cache invalidation receivers)
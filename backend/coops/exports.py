@@ -0,0 +1,344 @@
+"""
+Board exports: row generators plus the background export-job pipeline.
+
+The views stream the same generators directly (taavonyar.csv_stream). Export
+jobs instead run them in a worker (`manage.py run_export_jobs`) into a
+gzip-compressed CSV under MEDIA_ROOT/<PRIVATE_MEDIA_DIR>/exports/, which is
+never URL-routed: files are only served by coops.views.download_export, and
+their names carry a random token rather than anything derived from coop data.
+Jobs are keyed by (cooperative, kind, data version): while nothing that feeds
+the export has changed, a new request is answered by the existing file without
+recomputing. Once a job finishes, the files of earlier jobs of the same kind
+for the coop are deleted, so stale copies of shareholder data don't pile up.
+
+The data version covers every holdings write (shares.ownership.changes: each
+trade and each share ledger movement comes with one) and the coop's own share
+settings, and reading it costs the same however many trades the coop has.
+Edits to shareholders' identity details do not change it; request a fresh
+direct download for those.
+
+A RUNNING job whose worker goes silent is re-claimed after STALE_AFTER. Each
+claim bumps the job's attempt, which names the attempt's temp file and guards
+its final status update, so a slow worker that is still alive can't clobber
+the file or the outcome of the attempt that replaced it.
+"""
+import gzip
+import hashlib
+import os
+import secrets
+from collections.abc import Iterator
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from accounts.models import Individual
+from shares import captable, leaderboard, ledger, ownership, volume
+from shares.models import ShareTrade, TradeVolumeBucket
+from taavonyar.csv_stream import EXPORT_CHUNK_SIZE, csv_chunks
+from .models import Cooperative, ExportJob
+from .services import primary_available
+
+# Relative to MEDIA_ROOT
+EXPORT_DIR = Path(settings.PRIVATE_MEDIA_DIR) / "exports"
+
+# A RUNNING job whose worker has been silent this long is assumed dead and re-queued
+STALE_AFTER = timedelta(minutes=30)
+
+
+def shareholder_info_rows(coop: Cooperative) -> Iterator[list]:
+    price = coop.price_per_share
+    holdings = (
+        leaderboard.standings(coop.id)
+        .filter(user__individual__isnull=False)
+        .values_list(
+            "user__individual__full_name",
+            "user__individual__national_number",
+            "user__individual__phone_number",
+            "user__individual__address",
+            "user__individual__post_id",
+            "quantity",
+        )
+    )
+
+    yield [
+        "full_name", "national_number", "phone_number", "address", "post_id",
+        "shares", "price_per_share", "share_worth_tooman"
+    ]
+    for *identity, quantity in holdings.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [*identity, quantity, price, quantity * price]
+
+
+def purchase_log_rows(coop: Cooperative) -> Iterator[list]:
+    trades = (
+        ShareTrade.objects
+        .filter(cooperative=coop)
+        .order_by("-created_at")
+        .values_list(
+            "created_at",
+            "buyer__username",
+            "buyer__individual__full_name",
+            "buyer__individual__national_number",
+            "seller_id",
+            "seller__username",
+            "seller__individual__full_name",
+            "seller__individual__national_number",
+            "quantity",
+            "price_per_share",
+            "total_price",
+        )
+    )
+
+    yield [
+        "created_at", "buyer_name", "buyer_national_id",
+        "seller_name", "seller_national_id",
+        "quantity", "price_per_share", "total_price"
+    ]
+    for (
+        created_at, buyer_username, buyer_name, buyer_national,
+        seller_id, seller_username, seller_name, seller_national,
+        quantity, price_per_share, total_price,
+    ) in trades.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        if seller_id is None:
+            seller_name = "COOP_PRIMARY"
+        yield [
+            created_at.isoformat(),
+            buyer_name or buyer_username,
+            buyer_national or "",
+            seller_name or seller_username,
+            seller_national or "",
+            quantity,
+            price_per_share,
+            total_price,
+        ]
+
+
+def share_summary_rows(coop: Cooperative) -> Iterator[list]:
+    holdings = leaderboard.standings(coop.id)
+    total_held = holdings.aggregate(total=Sum("quantity"))["total"] or 0
+    total_value = total_held * coop.price_per_share
+
+    # header/meta rows
+    yield ["cooperative_name", coop.name]
+    yield ["price_per_share", coop.price_per_share]
+    yield ["total_shares_defined", coop.total_shares]
+    yield ["available_primary_shares", primary_available(coop)]
+    yield ["total_held_shares", total_held]
+    yield ["total_held_value_tooman", total_value]
+    yield []
+
+    # detail section
+    details = (
+        holdings
+        .filter(user__individual__isnull=False)
+        .values_list("user__individual__full_name", "user__individual__national_number", "quantity")
+    )
+    yield ["shareholder_name", "national_number", "shares", "percentage_of_held_shares"]
+    for full_name, national_number, quantity in details.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        pct = (quantity / total_held * 100) if total_held else 0
+        yield [full_name, national_number, quantity, round(pct, 2)]
+
+
+def trade_volume_rows(coop: Cooperative) -> Iterator[list]:
+    """Monthly then daily buckets from the trade-volume rollups (O(buckets), not O(trades))."""
+    yield [
+        "period", "bucket_start", "trade_count", "share_count", "value_tooman",
+        "primary_shares", "secondary_shares", "primary_value_tooman", "secondary_value_tooman"
+    ]
+    for period in (TradeVolumeBucket.Period.MONTH, TradeVolumeBucket.Period.DAY):
+        for b in volume.series(coop.id, period=period):
+            yield [
+                period, b.bucket_start.isoformat(), b.trade_count, b.share_count, b.value,
+                b.primary_share_count, b.secondary_share_count, b.primary_value, b.secondary_value,
+            ]
+
+
+def cap_table_rows(coop: Cooperative, at: datetime, compare: datetime | None = None) -> Iterator[list]:
+    """
+    Ownership as of `at` (shares.ledger: nearest snapshot plus the ledger tail),
+    largest holders first. With `compare`, also what each holder owned then;
+    holders who have since sold out are listed with 0.
+    """
+    table = ledger.cap_table(coop, at)
+    total = int(table.owned.sum())
+    then = None
+    if compare is not None:
+        before = ledger.cap_table(coop, compare)
+        table = captable.align(table, captable.union(table.user_ids, before.user_ids))
+        then = captable.align(before, table.user_ids).owned
+    owned = table.owned
+    order = np.lexsort((table.user_ids, -(then if then is not None else owned), -owned))
+
+    yield ["as_of", at.isoformat()] + (["compared_with", compare.isoformat()] if compare else [])
+    yield (
+        ["full_name", "national_number", "held", "listed", "owned", "percentage_of_owned"]
+        + (["owned_then", "change"] if compare else [])
+    )
+
+    with connection.chunked_cursor() as cursor:
+        # Every name in one statement, in report order, fetched in chunks from a server-side cursor
+        cursor.execute(
+            f"""
+            SELECT COALESCE(i.full_name, u.username), COALESCE(i.national_number, '')
+            FROM unnest(%s::bigint[]) WITH ORDINALITY AS r(user_id, n)
+            JOIN {get_user_model()._meta.db_table} u ON u.id = r.user_id
+            LEFT JOIN {Individual._meta.db_table} i ON i.user_id = r.user_id
+            ORDER BY r.n
+            """,
+            [table.user_ids[order].tolist()],
+        )
+        rows = iter(order.tolist())
+        while names := cursor.fetchmany(EXPORT_CHUNK_SIZE):
+            for (name, national_number), i in zip(names, rows):
+                row = [
+                    name, national_number, int(table.held[i]), int(table.listed[i]), int(owned[i]),
+                    round(int(owned[i]) * 100 / total, 4) if total else 0,
+                ]
+                if then is not None:
+                    row += [int(then[i]), int(owned[i] - then[i])]
+                yield row
+
+
+# kind -> (file name stem, row generator)
+EXPORTS = {
+    ExportJob.Kind.SHAREHOLDERS: ("shareholder_info", shareholder_info_rows),
+    ExportJob.Kind.TRADES: ("share_purchase_logs", purchase_log_rows),
+    ExportJob.Kind.SUMMARY: ("coop_share_summary", share_summary_rows),
+    ExportJob.Kind.VOLUME: ("trade_volume", trade_volume_rows),
+}
+
+
+def export_filename(coop: Cooperative, kind: str) -> str:
+    return f"{coop.id}_{EXPORTS[kind][0]}.csv"
+
+
+def data_version(coop: Cooperative) -> str:
+    """A short marker that changes whenever anything an export reads changes."""
+    settings_marker = hashlib.sha1(
+        f"{coop.name}|{coop.price_per_share}|{coop.total_shares}|{primary_available(coop)}".encode()
+    ).hexdigest()[:10]
+    return f"h{ownership.changes(coop.id)}-{settings_marker}"
+
+
+def artifact_path(job: ExportJob) -> Path:
+    return Path(settings.MEDIA_ROOT) / job.file_path
+
+
+def request_export(*, coop: Cooperative, kind: str, user) -> ExportJob:
+    """
+    Queue an export of `kind` for `coop`, or return the job that already covers
+    the coop's current data version (DONE with its file on disk, or still in flight).
+    """
+    if kind not in EXPORTS:
+        raise ValueError("Unknown export")
+
+    version = data_version(coop)
+    existing = (
+        ExportJob.objects
+        .filter(cooperative=coop, kind=kind, data_version=version)
+        .exclude(status=ExportJob.Status.FAILED)
+        .order_by("-created_at")
+        .first()
+    )
+    if existing is not None:
+        if existing.status != ExportJob.Status.DONE or (existing.file_path and artifact_path(existing).exists()):
+            return existing
+
+    return ExportJob.objects.create(cooperative=coop, kind=kind, data_version=version, requested_by=user)
+
+
+@transaction.atomic
+def claim_next_job() -> ExportJob | None:
+    """Take the oldest queued (or abandoned) job; concurrent workers skip each other's rows."""
+    stale = timezone.now() - STALE_AFTER
+    job = (
+        ExportJob.objects
+        .select_for_update(skip_locked=True)
+        .filter(Q(status=ExportJob.Status.QUEUED) | Q(status=ExportJob.Status.RUNNING, started_at__lt=stale))
+        .order_by("created_at")
+        .first()
+    )
+    if job is None:
+        return None
+    job.status = ExportJob.Status.RUNNING
+    job.started_at = timezone.now()
+    job.attempt += 1
+    job.save(update_fields=["status", "started_at", "attempt"])
+    return job
+
+
+def _finish(job: ExportJob, **fields) -> bool:
+    """Record the attempt's outcome; False if the job has been re-claimed since."""
+    fields["finished_at"] = timezone.now()
+    for name, value in fields.items():
+        setattr(job, name, value)
+    # Only the latest claim of the job records its outcome
+    return bool(ExportJob.objects.filter(id=job.id, attempt=job.attempt).update(**fields))
+
+
+def _delete_superseded(job: ExportJob) -> None:
+    """Delete the files of the coop's earlier DONE jobs of the same kind."""
+    superseded = (
+        ExportJob.objects
+        .filter(cooperative_id=job.cooperative_id, kind=job.kind, status=ExportJob.Status.DONE)
+        .exclude(id=job.id)
+        .exclude(file_path="")
+        .filter(finished_at__lte=job.finished_at)
+    )
+    paths = dict(superseded.values_list("id", "file_path"))
+    # Unlinked from their jobs first, so nothing hands out a file being deleted
+    ExportJob.objects.filter(id__in=list(paths)).update(file_path="")
+    for relative in paths.values():
+        (Path(settings.MEDIA_ROOT) / relative).unlink(missing_ok=True)
+
+
+def run_job(job: ExportJob) -> None:
+    """Generate the job's artifact; marks the job DONE or FAILED."""
+    coop = job.cooperative
+    stem, rows = EXPORTS[job.kind]
+    tmp = None
+    own_transaction = not connection.in_atomic_block
+    try:
+        with transaction.atomic():
+            if own_transaction:
+                # One consistent snapshot for the version and every row of the file
+                with connection.cursor() as cursor:
+                    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+            version = data_version(coop)
+            # Unguessable: the name must not be derivable from public coop figures
+            relative = EXPORT_DIR / str(coop.id) / f"{stem}-{secrets.token_urlsafe(16)}.csv.gz"
+            target = Path(settings.MEDIA_ROOT) / relative
+            target.parent.mkdir(parents=True, exist_ok=True)
+
+            row_count = 0
+
+            def counted():
+                nonlocal row_count
+                for row in rows(coop):
+                    row_count += 1
+                    yield row
+
+            tmp = target.with_name(f".{target.name}.{job.id}-{job.attempt}.tmp")
+            with gzip.open(tmp, "wt", encoding="utf-8", newline="") as out:
+                for chunk in csv_chunks(counted()):
+                    out.write(chunk)
+            os.replace(tmp, target)
+    except Exception as e:
+        if tmp is not None:
+            tmp.unlink(missing_ok=True)
+        _finish(job, status=ExportJob.Status.FAILED, error=f"{type(e).__name__}: {e}")
+        raise
+
+    recorded = _finish(
+        job, status=ExportJob.Status.DONE, data_version=version, file_path=str(relative), row_count=row_count,
+    )
+    if not recorded:
+        # Re-claimed meanwhile: the latest attempt writes (and owns) its own file
+        target.unlink(missing_ok=True)
+        return
+    _delete_superseded(job)
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from coops.services import counters_drift, reconcile_counters
+from taavonyar.db import without_statement_timeout
+
+
+class Command(BaseCommand):
+    help = (
+        "Verify and/or repair the stored contribution and project counters of cooperatives. "
+        "Shareholder counts are checked by rebuild_ownership."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--coop", type=int, action="append", dest="coops", help="Cooperative id (repeatable). Defaults to all.")
+        parser.add_argument("--verify", action="store_true", help="Only report drift, do not repair.")
+
+    @without_statement_timeout
+    def handle(self, *args, coops=None, verify=False, **options):
+        drift = counters_drift(coops)
+
+        for coop_id, contributed, actual_contributed, active, actual_active, done, actual_done in drift:
+            self.stdout.write(
+                f"coop {coop_id}: contributed stored={contributed} actual={actual_contributed}, "
+                f"active projects stored={active} actual={actual_active}, "
+                f"done projects stored={done} actual={actual_done}"
+            )
+            if not verify:
+                reconcile_counters(coop_id)
+                self.stdout.write(self.style.SUCCESS(f"coop {coop_id}: reconciled"))
+
+        if verify and drift:
+            raise CommandError(f"{len(drift)} cooperative(s) have counter drift")
+        self.stdout.write(self.style.SUCCESS(f"{len(drift)} cooperative(s) with drift."))
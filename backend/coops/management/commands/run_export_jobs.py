@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from coops.exports import claim_next_job, run_job
+from taavonyar.db import without_statement_timeout
+
+
+class Command(BaseCommand):
+    help = "Export worker: generate queued board exports into gzip files under MEDIA_ROOT (see coops.exports)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Drain the queue and exit instead of polling.")
+        parser.add_argument("--sleep", type=float, default=2.0, help="Seconds between polls when the queue is empty.")
+
+    @without_statement_timeout
+    def handle(self, *args, once=False, sleep=2.0, **options):
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if once:
+                    break
+                time.sleep(sleep)
+                continue
+
+            started = time.monotonic()
+            try:
+                run_job(job)
+            except Exception as e:  # recorded on the job; keep serving the queue
+                self.stderr.write(f"export {job.id} ({job.kind}, coop {job.cooperative_id}) failed: {e}")
+                continue
+            self.stdout.write(
+                f"export {job.id} ({job.kind}, coop {job.cooperative_id}): "
+                f"{job.row_count} rows in {time.monotonic() - started:.1f}s"
+            )
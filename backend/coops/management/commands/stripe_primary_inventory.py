@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from coops.models import Cooperative
+from coops.services import primary_available, set_primary_inventory
+
+
+class Command(BaseCommand):
+    help = "Split (or merge back) a cooperative's primary inventory across N slot rows for hot offerings."
+
+    def add_arguments(self, parser):
+        parser.add_argument("coop_id", type=int)
+        parser.add_argument("stripes", type=int, help="Number of slots; 0 turns striping off.")
+
+    def handle(self, *args, coop_id, stripes, **options):
+        try:
+            coop = Cooperative.objects.get(id=coop_id)
+        except Cooperative.DoesNotExist as e:
+            raise CommandError(f"Cooperative {coop_id} does not exist") from e
+
+        try:
+            set_primary_inventory(coop=coop, stripes=stripes)
+        except ValueError as e:
+            raise CommandError(str(e)) from e
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{coop.name}: {primary_available(coop)} primary shares across {coop.primary_stripes or 'no'} stripe(s)"
+        ))
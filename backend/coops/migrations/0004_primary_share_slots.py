@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-17 12:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coops', '0003_cooperative_available_primary_shares'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cooperative',
+            name='primary_stripes',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='PrimaryShareSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.PositiveSmallIntegerField()),
+                ('available', models.PositiveIntegerField(default=0)),
+                ('cooperative', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='primary_slots', to='coops.cooperative')),
+            ],
+            options={
+                'unique_together': {('cooperative', 'slot')},
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.4 on 2026-10-17 13:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coops', '0004_primary_share_slots'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('SHAREHOLDERS', 'Shareholder info'), ('TRADES', 'Share purchase logs'), ('SUMMARY', 'Coop share summary')], max_length=20)),
+                ('data_version', models.CharField(max_length=100)),
+                ('status', models.CharField(choices=[('QUEUED', 'Queued'), ('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='QUEUED', max_length=20)),
+                ('file_path', models.CharField(blank=True, max_length=300)),
+                ('row_count', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('cooperative', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to='coops.cooperative')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'QUEUED')), fields=['created_at'], name='exportjob_queue_idx'), models.Index(fields=['cooperative', 'kind', 'data_version'], name='exportjob_artifact_idx')],
+            },
+        ),
+    ]
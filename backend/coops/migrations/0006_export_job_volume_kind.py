@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-17 13:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coops', '0005_export_jobs'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exportjob',
+            name='kind',
+            field=models.CharField(choices=[('SHAREHOLDERS', 'Shareholder info'), ('TRADES', 'Share purchase logs'), ('SUMMARY', 'Coop share summary'), ('VOLUME', 'Trade volume')], max_length=20),
+        ),
+    ]
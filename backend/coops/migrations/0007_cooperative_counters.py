@@ -0,0 +1,47 @@
+# Generated by Django 5.1.4 on 2026-10-17 14:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coops', '0006_export_job_volume_kind'),
+        # The backfill reads projects and contributions
+        ('projects', '0005_distribution_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cooperative',
+            name='active_project_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='cooperative',
+            name='contributed_total',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='cooperative',
+            name='done_project_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE coops_cooperative AS c
+                SET contributed_total = COALESCE((
+                        SELECT SUM(x.amount)
+                        FROM projects_contribution x JOIN projects_project p ON p.id = x.project_id
+                        WHERE p.cooperative_id = c.id
+                    ), 0),
+                    active_project_count = (
+                        SELECT COUNT(*) FROM projects_project p WHERE p.cooperative_id = c.id AND p.status = 'ACTIVE'
+                    ),
+                    done_project_count = (
+                        SELECT COUNT(*) FROM projects_project p WHERE p.cooperative_id = c.id AND p.status = 'DONE'
+                    );
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
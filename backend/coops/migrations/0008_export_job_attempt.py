@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-17 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coops', '0007_cooperative_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='attempt',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 
 class Cooperative(models.Model):
@@ -12,6 +13,16 @@ class Cooperative(models.Model):
     price_per_share = models.PositiveBigIntegerField(default=0)
     total_shares = models.PositiveIntegerField(default=0)
     available_primary_shares = models.PositiveIntegerField(default=0)
+    # 0 = primary inventory lives in available_primary_shares.
+    # N > 0 = inventory is striped across N PrimaryShareSlot rows (see coops.services).
+    primary_stripes = models.PositiveSmallIntegerField(default=0)
+
+    # Maintained by projects.services; reconcile_coop_counters repairs drift.
+    # The shareholder count lives in shares.ownership (kept off this row, which
+    # primary sales update).
+    contributed_total = models.PositiveBigIntegerField(default=0)  # Tooman
+    active_project_count = models.PositiveIntegerField(default=0)
+    done_project_count = models.PositiveIntegerField(default=0)
 
     # Optional presentation fields
     website = models.URLField(blank=True)
@@ -21,3 +32,68 @@ class Cooperative(models.Model):
 
     def __str__(self) -> str:
         return self.name
+
+
+class PrimaryShareSlot(models.Model):
+    """One stripe of a cooperative's primary inventory, so concurrent buyers don't all hit one row."""
+
+    cooperative = models.ForeignKey(Cooperative, on_delete=models.CASCADE, related_name="primary_slots")
+    slot = models.PositiveSmallIntegerField()
+    available = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("cooperative", "slot")
+
+    def __str__(self) -> str:
+        return f"{self.cooperative.name} slot {self.slot}: {self.available}"
+
+
+class ExportJob(models.Model):
+    """A board export generated by the export worker (see coops.exports) into a gzip file under MEDIA_ROOT."""
+
+    class Kind(models.TextChoices):
+        SHAREHOLDERS = "SHAREHOLDERS", "Shareholder info"
+        TRADES = "TRADES", "Share purchase logs"
+        SUMMARY = "SUMMARY", "Coop share summary"
+        VOLUME = "VOLUME", "Trade volume"
+
+    class Status(models.TextChoices):
+        QUEUED = "QUEUED", "Queued"
+        RUNNING = "RUNNING", "Running"
+        DONE = "DONE", "Done"
+        FAILED = "FAILED", "Failed"
+
+    cooperative = models.ForeignKey(Cooperative, on_delete=models.CASCADE, related_name="export_jobs")
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    # The coop's data version when queued; a DONE job is reusable while it still matches
+    data_version = models.CharField(max_length=100)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.QUEUED)
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="+",
+    )
+
+    # Path relative to MEDIA_ROOT; cleared once a newer job of the same kind replaces the file
+    file_path = models.CharField(max_length=300, blank=True)
+    row_count = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Claim token: bumped on every claim, so a worker that was given up on
+    # (STALE_AFTER) can tell its job has been re-claimed and keeps its files apart
+    attempt = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Worker queue: oldest QUEUED first
+            models.Index(fields=["created_at"], condition=models.Q(status="QUEUED"), name="exportjob_queue_idx"),
+            models.Index(fields=["cooperative", "kind", "data_version"], name="exportjob_artifact_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.cooperative.name} {self.kind} ({self.status})"
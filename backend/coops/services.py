@@ -1,6 +1,15 @@
+import random
 import uuid
 
+from django.db import connection, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
 from accounts.models import BoardMember, Shareholder
+from projects.models import Contribution, Project
+from shares import marketplace
+from .models import Cooperative, PrimaryShareSlot
+from .signals import invalidate_coop
 
 
 def _new_boardmember_id() -> str:
@@ -34,3 +43,187 @@ def add_board_member_by_shareholder_id(*, acting_user, shareholder_id: str) -> B
         boardmember_id=_new_boardmember_id(),
         status=BoardMember.AuthorityStatus.ACCEPTED,
     )
+
+
+def primary_available(coop: Cooperative) -> int:
+    """Primary shares the cooperative can still sell (plain column plus any striped slots)."""
+    available = int(coop.available_primary_shares)
+    if coop.primary_stripes:
+        striped = PrimaryShareSlot.objects.filter(cooperative=coop).aggregate(total=Sum("available"))["total"]
+        available += int(striped or 0)
+    return available
+
+
+def primary_available_by_coop(coops) -> dict[int, int]:
+    """primary_available() for many cooperatives with at most one extra query."""
+    totals = {c.id: int(c.available_primary_shares) for c in coops}
+    striped_ids = [c.id for c in coops if c.primary_stripes]
+    if striped_ids:
+        rows = (
+            PrimaryShareSlot.objects
+            .filter(cooperative_id__in=striped_ids)
+            .values("cooperative_id")
+            .annotate(total=Sum("available"))
+            .values_list("cooperative_id", "total")
+        )
+        for coop_id, total in rows:
+            totals[coop_id] += int(total or 0)
+    return totals
+
+
+def take_striped_primary(*, coop_id: int, stripes: int, quantity: int) -> int | None:
+    """
+    Take `quantity` primary shares from a striped cooperative.
+    Returns the coop's price_per_share, or None when there is not enough inventory.
+    Must run inside the caller's transaction.
+
+    1. one random slot, if it is unlocked and can cover the quantity,
+    2. otherwise any unlocked slot that can cover it,
+    3. otherwise lock every slot in slot order and take across them.
+    Steps 1-2 never wait (SKIP LOCKED), so buyers don't queue behind each other.
+    """
+    slot_table = PrimaryShareSlot._meta.db_table
+    coop_table = Cooperative._meta.db_table
+    take_one_slot = f"""
+        UPDATE {slot_table} AS s
+        SET available = s.available - %(quantity)s
+        FROM {coop_table} AS c
+        WHERE c.id = s.cooperative_id AND s.id = (
+            SELECT id FROM {slot_table}
+            WHERE cooperative_id = %(coop_id)s AND available >= %(quantity)s {{slot_filter}}
+            ORDER BY available DESC
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING c.price_per_share
+    """
+    params = {"coop_id": coop_id, "quantity": quantity, "slot": random.randrange(stripes)}
+
+    # A failed attempt can still leave a row locked (READ COMMITTED re-check);
+    # roll such locks back before the ordered sweep or sweepers could deadlock.
+    sid = transaction.savepoint()
+    with connection.cursor() as cursor:
+        cursor.execute(take_one_slot.format(slot_filter="AND slot = %(slot)s"), params)
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute(take_one_slot.format(slot_filter=""), params)
+            row = cursor.fetchone()
+    if row is not None:
+        transaction.savepoint_commit(sid)
+        marketplace.invalidate()
+        return row[0]
+    transaction.savepoint_rollback(sid)
+
+    # No single slot can cover it: sweep. Locking in slot order keeps sweepers deadlock-free.
+    slots = list(PrimaryShareSlot.objects.select_for_update().filter(cooperative_id=coop_id).order_by("slot"))
+    if sum(s.available for s in slots) < quantity:
+        return None
+
+    remaining = quantity
+    touched = []
+    for s in slots:
+        if remaining == 0:
+            break
+        take = min(s.available, remaining)
+        if take:
+            s.available -= take
+            remaining -= take
+            touched.append(s)
+    PrimaryShareSlot.objects.bulk_update(touched, ["available"])
+    marketplace.invalidate()
+    return Cooperative.objects.values_list("price_per_share", flat=True).get(id=coop_id)
+
+
+@transaction.atomic
+def set_primary_inventory(*, coop: Cooperative, total: int | None = None, stripes: int | None = None) -> None:
+    """
+    Set the cooperative's primary inventory to `total` (default: keep the current amount),
+    spread evenly over `stripes` slots (default: keep the current stripe count; 0 = no striping).
+    Runs with the coop row and all its slots locked, so in-flight buyers finish first.
+    """
+    locked = Cooperative.objects.select_for_update().get(id=coop.id)
+    slots = list(PrimaryShareSlot.objects.select_for_update().filter(cooperative=locked).order_by("slot"))
+
+    if total is None:
+        total = int(locked.available_primary_shares) + sum(s.available for s in slots)
+    if stripes is None:
+        stripes = locked.primary_stripes
+    if total < 0 or stripes < 0:
+        raise ValueError("Primary inventory and stripe count must be >= 0")
+
+    if stripes:
+        base, extra = divmod(total, stripes)
+        PrimaryShareSlot.objects.bulk_create(
+            [
+                PrimaryShareSlot(cooperative=locked, slot=n, available=base + (1 if n < extra else 0))
+                for n in range(stripes)
+            ],
+            update_conflicts=True,
+            unique_fields=["cooperative", "slot"],
+            update_fields=["available"],
+        )
+        column = 0
+    else:
+        column = total
+    PrimaryShareSlot.objects.filter(cooperative=locked, slot__gte=stripes).delete()
+
+    Cooperative.objects.filter(id=locked.id).update(available_primary_shares=column, primary_stripes=stripes)
+    marketplace.invalidate()
+    invalidate_coop(locked.id)
+    coop.available_primary_shares = column
+    coop.primary_stripes = stripes
+
+
+def _actual_counters() -> dict:
+    contributed = (
+        Contribution.objects
+        .filter(project__cooperative=OuterRef("pk"))
+        .values("project__cooperative")
+        .annotate(total=Sum("amount"))
+        .values("total")
+    )
+    projects = Project.objects.filter(cooperative=OuterRef("pk")).values("cooperative")
+    return {
+        "actual_contributed": Coalesce(Subquery(contributed), Value(0)),
+        "actual_active": Coalesce(Subquery(
+            projects.annotate(n=Count("id", filter=Q(status=Project.Status.ACTIVE))).values("n")
+        ), Value(0)),
+        "actual_done": Coalesce(Subquery(
+            projects.annotate(n=Count("id", filter=Q(status=Project.Status.DONE))).values("n")
+        ), Value(0)),
+    }
+
+
+def counters_drift(coop_ids: list[int] | None = None) -> list[tuple[int, int, int, int, int, int, int]]:
+    """
+    (id, stored contributed, actual contributed, stored active, actual active, stored done, actual done)
+    of the cooperatives whose stored counters disagree with their projects and contributions.
+    """
+    coops = Cooperative.objects.all() if coop_ids is None else Cooperative.objects.filter(id__in=coop_ids)
+    return list(
+        coops
+        .annotate(**_actual_counters())
+        .exclude(
+            contributed_total=F("actual_contributed"),
+            active_project_count=F("actual_active"),
+            done_project_count=F("actual_done"),
+        )
+        .order_by("id")
+        .values_list(
+            "id", "contributed_total", "actual_contributed",
+            "active_project_count", "actual_active", "done_project_count", "actual_done",
+        )
+    )
+
+
+@transaction.atomic
+def reconcile_counters(coop_id: int) -> None:
+    """Recompute one cooperative's contribution and project counters."""
+    # Writers update this row last in their transactions: the lock waits for them
+    coop = Cooperative.objects.select_for_update(no_key=True).get(id=coop_id)
+    counters = _actual_counters()
+    actual = Cooperative.objects.filter(id=coop_id).annotate(**counters).values(*counters).get()
+    coop.contributed_total = actual["actual_contributed"]
+    coop.active_project_count = actual["actual_active"]
+    coop.done_project_count = actual["actual_done"]
+    coop.save(update_fields=["contributed_total", "active_project_count", "done_project_count"])
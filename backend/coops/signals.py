@@ -0,0 +1,41 @@
+"""
+Cache invalidation for the public cooperative pages (see taavonyar.cache).
+
+coop:<id> covers everything shown about one cooperative (profile, primary
+inventory, shareholder count); "coops" covers the cooperative list.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from shares.models import ShareHolding
+from shares.signals import holdings_changed
+from taavonyar.cache import bump_version
+from .models import Cooperative
+
+COOPS = "coops"
+
+
+def coop_namespace(coop_id: int) -> str:
+    return f"coop:{coop_id}"
+
+
+def invalidate_coop(coop_id: int) -> None:
+    bump_version(coop_namespace(coop_id))
+
+
+@receiver(post_save, sender=Cooperative)
+@receiver(post_delete, sender=Cooperative)
+def _cooperative_changed(sender, instance, **kwargs):
+    invalidate_coop(instance.id)
+    bump_version(COOPS)
+
+
+@receiver(post_save, sender=ShareHolding)
+@receiver(post_delete, sender=ShareHolding)
+def _holding_saved(sender, instance, **kwargs):
+    invalidate_coop(instance.cooperative_id)
+
+
+@receiver(holdings_changed)
+def _holdings_changed(sender, coop_id, **kwargs):
+    invalidate_coop(coop_id)
@@ -0,0 +1,80 @@
+import pytest
+from django.core.management import CommandError, call_command
+from django.urls import reverse
+
+from accounts.models import BoardMember
+from coops.models import Cooperative
+from coops.services import counters_drift
+from projects.distribution import claim_next_job, request_distribution, run_job
+from projects.models import Project
+from projects.services import contribute_to_project
+from shares.services import buy_primary_shares_from_coop
+from tests.factories import ContributionFactory, CooperativeFactory, IndividualFactory, ProjectFactory, UserFactory
+
+
+pytestmark = pytest.mark.django_db
+
+
+def _counters(coop):
+    return Cooperative.objects.values_list(
+        "contributed_total", "active_project_count", "done_project_count"
+    ).get(id=coop.id)
+
+
+def test_counters_follow_contributions_and_status_changes(client):
+    coop = CooperativeFactory()
+    project = ProjectFactory(cooperative=coop)
+    ProjectFactory(cooperative=coop, status=Project.Status.DRAFT)
+    assert _counters(coop) == (0, 1, 0)
+
+    contribute_to_project(project=project, user=UserFactory(), amount=300)
+    contribute_to_project(project=project, user=UserFactory(), amount=200)
+    assert _counters(coop) == (500, 1, 0)
+
+    request_distribution(project=project, user=None)
+    assert _counters(coop) == (500, 0, 0)
+    run_job(claim_next_job())
+    assert _counters(coop) == (500, 0, 1)
+
+    me = IndividualFactory()
+    BoardMember.objects.create(
+        individual=me, cooperative=coop, boardmember_id="BM-1", status=BoardMember.AuthorityStatus.ACCEPTED,
+    )
+    client.force_login(me.user)
+    client.post(reverse("projects:board_project_edit", args=[project.id]), {"title": "Renamed", "status": "ACTIVE"})
+    assert _counters(coop) == (500, 0, 1)  # DONE projects stay DONE
+
+    project.delete()
+    assert _counters(coop)[1:] == (0, 0)
+    assert counters_drift([coop.id]) == [(coop.id, 500, 0, 0, 0, 0, 0)]
+
+
+def test_coop_page_reads_the_counters(client):
+    coop = CooperativeFactory(available_primary_shares=10)
+    project = ProjectFactory(cooperative=coop)
+    contribute_to_project(project=project, user=UserFactory(), amount=700)
+    buy_primary_shares_from_coop(coop=coop, buyer=UserFactory(), quantity=2)
+    buy_primary_shares_from_coop(coop=coop, buyer=UserFactory(), quantity=3)
+
+    content = client.get(reverse("coops:coop_detail", args=[coop.id])).content.decode()
+    assert "Shareholders: <b>2</b>" in content
+    assert "Total contributions: <b>700</b>" in content
+    assert "Active Projects (1)" in content
+
+
+def test_reconcile_command_reports_and_repairs_drift():
+    coop = CooperativeFactory()
+    project = ProjectFactory(cooperative=coop)
+    contribute_to_project(project=project, user=UserFactory(), amount=100)
+    # Written behind the services' back
+    ContributionFactory(project=project, amount=50)
+    Project.objects.filter(id=project.id).update(status=Project.Status.DONE)
+    untouched = ProjectFactory().cooperative
+
+    with pytest.raises(CommandError, match="1 cooperative"):
+        call_command("reconcile_coop_counters", "--verify")
+    assert counters_drift([untouched.id]) == []
+
+    call_command("reconcile_coop_counters")
+    assert _counters(coop) == (150, 0, 1)
+    call_command("reconcile_coop_counters", "--verify")
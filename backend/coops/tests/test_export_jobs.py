@@ -0,0 +1,123 @@
+import csv
+import gzip
+import pytest
+from django.utils import timezone
+
+from coops.exports import STALE_AFTER, artifact_path, claim_next_job, data_version, request_export, run_job
+from coops.models import ExportJob
+from shares import ownership
+from shares.services import buy_primary_shares_from_coop
+from tests.factories import CooperativeFactory, HoldingFactory, IndividualFactory, UserFactory
+
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    return tmp_path
+
+
+def test_worker_writes_gzip_artifact_and_reuses_it_until_data_changes():
+    coop = CooperativeFactory(price_per_share=10, available_primary_shares=5)
+    board = UserFactory()
+    HoldingFactory(cooperative=coop, user=IndividualFactory(full_name="Holder").user, quantity=2)
+
+    job = request_export(coop=coop, kind=ExportJob.Kind.SHAREHOLDERS, user=board)
+    assert job.status == ExportJob.Status.QUEUED
+    # Asking again while it is queued does not queue a duplicate
+    assert request_export(coop=coop, kind=ExportJob.Kind.SHAREHOLDERS, user=board) == job
+
+    claimed = claim_next_job()
+    assert claimed == job
+    assert claim_next_job() is None
+    run_job(claimed)
+
+    claimed.refresh_from_db()
+    assert claimed.status == ExportJob.Status.DONE
+    assert claimed.row_count == 2
+    with gzip.open(artifact_path(claimed), "rt", newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[1][0] == "Holder"
+
+    # Same data: served from the existing artifact
+    assert request_export(coop=coop, kind=ExportJob.Kind.SHAREHOLDERS, user=board) == claimed
+
+    # A trade changes the data version: a new job is queued
+    buy_primary_shares_from_coop(coop=coop, buyer=UserFactory(), quantity=1)
+    fresh = request_export(coop=coop, kind=ExportJob.Kind.SHAREHOLDERS, user=board)
+    assert fresh != claimed
+    assert fresh.status == ExportJob.Status.QUEUED
+
+
+def test_version_counts_holdings_writes_without_reading_trades(django_assert_num_queries):
+    coop = CooperativeFactory(available_primary_shares=5)
+    user = UserFactory()
+    buy_primary_shares_from_coop(coop=coop, buyer=user, quantity=1)
+    first = data_version(coop)
+
+    # Folding the deltas in (or recounting the figures) keeps the count
+    ownership.compact_deltas(coop.id)
+    assert data_version(coop) == first
+    ownership.rebuild(coop.id)
+    assert data_version(coop) == first
+
+    buy_primary_shares_from_coop(coop=coop, buyer=user, quantity=1)
+    # One bounded read, whatever the number of trades
+    with django_assert_num_queries(1):
+        second = data_version(coop)
+    assert second != first
+
+
+def test_reclaimed_job_keeps_the_outcome_of_the_latest_attempt(media_root):
+    coop = CooperativeFactory()
+    HoldingFactory(cooperative=coop, quantity=2)
+    request_export(coop=coop, kind=ExportJob.Kind.SHAREHOLDERS, user=UserFactory())
+    slow = claim_next_job()
+    ExportJob.objects.filter(id=slow.id).update(started_at=timezone.now() - STALE_AFTER * 2)
+    again = claim_next_job()
+    assert (again.id, slow.attempt, again.attempt) == (slow.id, 1, 2)
+
+    # The worker that was given up on finishes late: the job stays with the new attempt, its file is dropped
+    run_job(slow)
+    again.refresh_from_db()
+    assert again.status == ExportJob.Status.RUNNING
+    assert not list(media_root.rglob("*.csv.gz"))
+
+    run_job(again)
+    again.refresh_from_db()
+    assert again.status == ExportJob.Status.DONE
+    assert artifact_path(again).exists()
+    assert not list(media_root.rglob("*.tmp"))
+
+
+def test_artifacts_are_private_unguessable_and_replaced(settings, media_root):
+    coop = CooperativeFactory(available_primary_shares=5)
+    board = UserFactory()
+    HoldingFactory(cooperative=coop, quantity=2)
+
+    old = request_export(coop=coop, kind=ExportJob.Kind.SHAREHOLDERS, user=board)
+    run_job(claim_next_job())
+    old.refresh_from_db()
+    path = artifact_path(old)
+    assert path.is_relative_to(media_root / settings.PRIVATE_MEDIA_DIR)
+    assert old.data_version not in path.name
+
+    # A newer export of the same kind removes the old file; other kinds are left alone
+    request_export(coop=coop, kind=ExportJob.Kind.SUMMARY, user=board)
+    run_job(claim_next_job())
+    buy_primary_shares_from_coop(coop=coop, buyer=UserFactory(), quantity=1)
+    new = request_export(coop=coop, kind=ExportJob.Kind.SHAREHOLDERS, user=board)
+    run_job(claim_next_job())
+
+    old.refresh_from_db()
+    new.refresh_from_db()
+    assert old.file_path == "" and not path.exists()
+    assert artifact_path(new).exists()
+    assert len(list(media_root.rglob("*.csv.gz"))) == 2
+
+
+def test_unknown_kind_is_rejected():
+    with pytest.raises(ValueError):
+        request_export(coop=CooperativeFactory(), kind="NOPE", user=UserFactory())
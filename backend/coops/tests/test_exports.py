@@ -0,0 +1,109 @@
+import csv
+import io
+from datetime import timedelta
+
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import BoardMember
+from shares.models import ShareLedgerEntry, ShareTrade
+from tests.factories import CooperativeFactory, HoldingFactory, IndividualFactory, UserFactory
+
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def board_client(client):
+    coop = CooperativeFactory(name="Saffron", price_per_share=100)
+    board = IndividualFactory()
+    BoardMember.objects.create(
+        individual=board,
+        cooperative=coop,
+        boardmember_id="BM-EXPORT",
+        status=BoardMember.AuthorityStatus.ACCEPTED,
+    )
+    client.force_login(board.user)
+    return client, coop
+
+
+def _read(response) -> list[list[str]]:
+    assert response.streaming
+    body = b"".join(response.streaming_content).decode()
+    return list(csv.reader(io.StringIO(body)))
+
+
+def test_shareholder_info_streams_holders_with_identity(board_client):
+    client, coop = board_client
+    holder = IndividualFactory(full_name="Mina")
+    HoldingFactory(cooperative=coop, user=holder.user, quantity=3)
+    HoldingFactory(cooperative=coop, user=UserFactory(), quantity=9)  # no Individual: skipped
+
+    rows = _read(client.get(reverse("coops:export_shareholders_csv")))
+
+    assert rows[0][0] == "full_name"
+    assert rows[1:] == [["Mina", holder.national_number, "09120000000", "Test Address", "1234567890", "3", "100", "300"]]
+
+
+def test_purchase_logs_name_primary_sales_and_fall_back_to_username(board_client):
+    client, coop = board_client
+    buyer = UserFactory(username="no_identity")
+    seller = IndividualFactory(full_name="Seller")
+    ShareTrade.objects.create(cooperative=coop, buyer=buyer, seller=None, quantity=2, price_per_share=100, total_price=200)
+    ShareTrade.objects.create(
+        cooperative=coop, buyer=buyer, seller=seller.user, quantity=1, price_per_share=100, total_price=100
+    )
+
+    rows = _read(client.get(reverse("coops:export_trades_csv")))
+
+    assert [row[1:5] for row in rows[1:]] == [
+        ["no_identity", "", "Seller", seller.national_number],
+        ["no_identity", "", "COOP_PRIMARY", ""],
+    ]
+
+
+def test_summary_streams_meta_then_details(board_client):
+    client, coop = board_client
+    HoldingFactory(cooperative=coop, user=IndividualFactory(full_name="A").user, quantity=3)
+    HoldingFactory(cooperative=coop, user=IndividualFactory(full_name="B").user, quantity=1)
+
+    rows = _read(client.get(reverse("coops:export_summary_csv")))
+
+    assert rows[4] == ["total_held_shares", "4"]
+    assert [row[0] for row in rows[8:]] == ["A", "B"]
+    assert rows[8][3] == "75.0"
+
+
+def test_cap_table_as_of_a_date_compares_with_an_earlier_one(board_client):
+    client, coop = board_client
+    mina, reza = IndividualFactory(full_name="Mina"), IndividualFactory(full_name="Reza")
+    today = timezone.localdate()
+
+    def entry(user, delta, days_ago, bucket=ShareLedgerEntry.Bucket.HELD):
+        ShareLedgerEntry.objects.create(
+            cooperative=coop, user=user.user, bucket=bucket, kind=ShareLedgerEntry.Kind.PURCHASE, delta=delta,
+            created_at=timezone.now() - timedelta(days=days_ago),
+        )
+
+    entry(mina, 6, 10)
+    entry(reza, 2, 10)
+    entry(mina, -1, 3)
+    entry(mina, 1, 3, bucket=ShareLedgerEntry.Bucket.LISTED)
+    entry(reza, -2, 3)
+
+    rows = _read(client.get(reverse("coops:export_cap_table_csv"), {
+        "at": f"{today - timedelta(days=1)}", "compare": f"{today - timedelta(days=5)}",
+    }))
+    assert rows[1][-2:] == ["owned_then", "change"]
+    assert [row[0:1] + row[2:] for row in rows[2:]] == [
+        ["Mina", "5", "1", "6", "100.0", "6", "0"],
+        ["Reza", "0", "0", "0", "0.0", "2", "-2"],
+    ]
+
+    rows = _read(client.get(reverse("coops:export_cap_table_csv"), {"at": f"{today - timedelta(days=5)}"}))
+    assert [row[0] for row in rows[2:]] == ["Mina", "Reza"]
+    assert rows[2][-1] == "75.0"
+
+    response = client.get(reverse("coops:export_cap_table_csv"), {"at": "yesterday"})
+    assert response.status_code == 302
@@ -0,0 +1,76 @@
+import pytest
+from django.urls import reverse
+
+from accounts.models import BoardMember
+from coops.models import PrimaryShareSlot
+from coops.services import primary_available, set_primary_inventory
+from shares.models import ShareHolding
+from shares.services import buy_from_marketplace, buy_primary_shares_from_coop
+from tests.factories import CooperativeFactory, IndividualFactory, UserFactory
+
+
+pytestmark = pytest.mark.django_db
+
+
+def _slots(coop):
+    return list(PrimaryShareSlot.objects.filter(cooperative=coop).order_by("slot").values_list("available", flat=True))
+
+
+def test_striping_spreads_inventory_and_keeps_total():
+    coop = CooperativeFactory(available_primary_shares=10)
+
+    set_primary_inventory(coop=coop, stripes=4)
+
+    coop.refresh_from_db()
+    assert coop.available_primary_shares == 0
+    assert _slots(coop) == [3, 3, 2, 2]
+    assert primary_available(coop) == 10
+
+    set_primary_inventory(coop=coop, total=7)
+    assert _slots(coop) == [2, 2, 2, 1]
+
+    set_primary_inventory(coop=coop, stripes=0)
+    coop.refresh_from_db()
+    assert coop.available_primary_shares == 7
+    assert _slots(coop) == []
+
+
+def test_striped_purchases_sweep_slots_and_never_oversell():
+    coop = CooperativeFactory(price_per_share=100, available_primary_shares=10)
+    set_primary_inventory(coop=coop, stripes=4)
+    buyer = UserFactory()
+
+    buy_primary_shares_from_coop(coop=coop, buyer=buyer, quantity=2)
+    # 8 left spread so that no single slot can cover 5: forces the sweep
+    trade = buy_primary_shares_from_coop(coop=coop, buyer=buyer, quantity=5)
+    assert trade.total_price == 500
+
+    with pytest.raises(ValueError):
+        buy_primary_shares_from_coop(coop=coop, buyer=buyer, quantity=4)
+
+    trades = buy_from_marketplace(coop=coop, buyer=buyer, quantity=3, source="primary")
+    assert [t.quantity for t in trades] == [3]
+
+    assert primary_available(coop) == 0
+    assert ShareHolding.objects.get(cooperative=coop, user=buyer).quantity == 10
+
+
+def test_profile_edit_keeps_inventory_sold_while_the_form_was_open(client):
+    coop = CooperativeFactory(price_per_share=100, available_primary_shares=10)
+    set_primary_inventory(coop=coop, stripes=2)
+    me = IndividualFactory()
+    BoardMember.objects.create(
+        individual=me, cooperative=coop, boardmember_id="BM-1", status=BoardMember.AuthorityStatus.ACCEPTED,
+    )
+    client.force_login(me.user)
+    url = reverse("coops:board_coop_edit")
+    form = {"name": "Renamed", "available_primary_shares": "10", "available_primary_shares_shown": "10"}
+
+    buy_primary_shares_from_coop(coop=coop, buyer=UserFactory(), quantity=3)
+    client.post(url, form)
+    coop.refresh_from_db()
+    assert (coop.name, primary_available(coop)) == ("Renamed", 7)
+
+    client.post(url, {**form, "available_primary_shares": "20"})
+    assert primary_available(coop) == 20
+    assert _slots(coop) == [10, 10]
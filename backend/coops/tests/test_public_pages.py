@@ -0,0 +1,108 @@
+import pytest
+from django.test import override_settings
+from django.urls import reverse
+
+from projects.services import contribute_to_project
+from shares.services import buy_primary_shares_from_coop
+from taavonyar import cache as page_cache
+from tests.factories import CooperativeFactory, ProjectFactory, UserFactory
+
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def refresh_now(monkeypatch):
+    monkeypatch.setattr(page_cache, "REFRESH_INTERVAL", 0)
+
+
+def test_anonymous_pages_are_served_from_the_cache(client, django_assert_num_queries):
+    project = ProjectFactory()
+    urls = [
+        reverse("coops:coop_list"),
+        reverse("coops:coop_detail", args=[project.cooperative_id]),
+        reverse("projects:project_list"),
+        reverse("projects:project_detail", args=[project.id]),
+    ]
+    first = [client.get(url).content for url in urls]
+
+    with django_assert_num_queries(0):
+        again = [client.get(url).content for url in urls]
+    assert again == first
+
+
+def test_contribution_invalidates_project_and_coop_pages(client, refresh_now, django_capture_on_commit_callbacks):
+    project = ProjectFactory(goal_amount=10_000)
+    coop_url = reverse("coops:coop_detail", args=[project.cooperative_id])
+    project_url = reverse("projects:project_detail", args=[project.id])
+    assert b"<b>0</b> Tooman" in client.get(coop_url).content
+    assert b">0</span> Tooman" in client.get(project_url).content
+
+    with django_capture_on_commit_callbacks(execute=True):
+        contribute_to_project(project=project, user=UserFactory(), amount=2500)
+
+    assert b"<b>2500</b> Tooman" in client.get(coop_url).content
+    assert b">2500</span> Tooman" in client.get(project_url).content
+
+
+def test_primary_sale_invalidates_coop_page(client, refresh_now, django_capture_on_commit_callbacks):
+    coop = CooperativeFactory(price_per_share=10, available_primary_shares=10)
+    url = reverse("coops:coop_detail", args=[coop.id])
+    assert b"Shareholders: <b>0</b>" in client.get(url).content
+
+    # Holdings are credited with raw SQL: invalidation comes from holdings_changed
+    with django_capture_on_commit_callbacks(execute=True):
+        buy_primary_shares_from_coop(coop=coop, buyer=UserFactory(), quantity=3)
+
+    content = client.get(url).content
+    assert b"Shareholders: <b>1</b>" in content
+    assert b'fw-semibold">7</span>' in content
+
+
+def test_outdated_page_is_served_until_refresh_interval(client, monkeypatch, django_capture_on_commit_callbacks):
+    project = ProjectFactory()
+    url = reverse("projects:project_detail", args=[project.id])
+    client.get(url)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        contribute_to_project(project=project, user=UserFactory(), amount=700)
+    assert b">0</span> Tooman" in client.get(url).content
+
+    monkeypatch.setattr(page_cache, "REFRESH_INTERVAL", 0)
+    assert b">700</span> Tooman" in client.get(url).content
+
+
+def test_only_one_request_recomputes_an_outdated_entry(refresh_now, monkeypatch):
+    versions = {"ns": 1}
+    monkeypatch.setattr(page_cache, "current_versions", lambda namespaces: dict(versions))
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert page_cache.stale_while_revalidate("k", compute, namespaces=["ns"]) == 1
+    versions["ns"] = 2
+    # Another request holds the refresh lock: the previous value is served
+    page_cache.cache.add("k:refresh", 1)
+    assert page_cache.stale_while_revalidate("k", compute, namespaces=["ns"]) == 1
+    page_cache.cache.delete("k:refresh")
+    assert page_cache.stale_while_revalidate("k", compute, namespaces=["ns"]) == 2
+    assert page_cache.stale_while_revalidate("k", compute, namespaces=["ns"]) == 2
+    assert len(calls) == 2
+
+
+def test_signed_in_users_get_the_live_page(client):
+    project = ProjectFactory()
+    url = reverse("projects:project_detail", args=[project.id])
+    assert b"csrfmiddlewaretoken" not in client.get(url).content
+
+    client.force_login(UserFactory())
+    assert b"csrfmiddlewaretoken" in client.get(url).content
+
+
+def test_deploy_check_wants_a_shared_cache():
+    assert [w.id for w in page_cache.check_shared_cache(None)] == ["taavonyar.W001"]
+    redis = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": "redis://cache:6379/0"}}
+    with override_settings(CACHES=redis):
+        assert page_cache.check_shared_cache(None) == []
@@ -13,6 +13,10 @@ urlpatterns = [
     path("board/export/shareholders/", export_shareholder_info_csv, name="export_shareholders_csv"),
     path("board/export/trades/", export_share_purchase_logs_csv, name="export_trades_csv"),
     path("board/export/summary/", export_coop_share_summary_csv, name="export_summary_csv"),
+    path("board/export/volume/", export_trade_volume_csv, name="export_volume_csv"),
+    path("board/export/cap-table/", export_cap_table_csv, name="export_cap_table_csv"),
+    path("board/exports/", board_exports, name="board_exports"),
+    path("board/exports/<int:job_id>/download/", download_export, name="download_export"),
 
 
 ]
@@ -1,21 +1,41 @@
+from datetime import date, datetime, time
+
 from django.shortcuts import render, get_object_or_404, redirect
-from django.db.models import Sum, Count
-from .models import Cooperative
+from django.utils import timezone
+from django.db import transaction
+from django.db.models import Count
+from .models import Cooperative, ExportJob
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from accounts.models import BoardMember
-from django.http import HttpResponse, Http404
-import csv
-from shares.models import ShareHolding
-from shares.models import ShareTrade
-from .services import add_board_member_by_shareholder_id
-
-
+from django.http import FileResponse, Http404
+from .services import add_board_member_by_shareholder_id, primary_available, set_primary_inventory
+from taavonyar.csv_stream import stream_csv
+from taavonyar.cache import cache_public_page
+from taavonyar.query_budget import query_budget
+from shares import ownership
+from .signals import COOPS, coop_namespace
+from .exports import (
+    artifact_path,
+    cap_table_rows,
+    export_filename,
+    purchase_log_rows,
+    request_export,
+    share_summary_rows,
+    shareholder_info_rows,
+    trade_volume_rows,
+)
+
+
+@query_budget(6)
+@cache_public_page(lambda: [COOPS])
 def coop_list(request):
     coops = Cooperative.objects.order_by("name")
     return render(request, "coops/coop_list.html", {"coops": coops})
 
 
+@query_budget(10)
+@cache_public_page(lambda coop_id: [coop_namespace(coop_id)])
 def coop_detail(request, coop_id: int):
     coop = get_object_or_404(Cooperative, id=coop_id)
 
@@ -23,13 +43,8 @@ def coop_detail(request, coop_id: int):
     active_projects = projects.filter(status="ACTIVE")
     done_projects = projects.filter(status="DONE")
 
-    # Basic stats (safe even if empty)
-    total_contributions = coop.projects.aggregate(
-        total=Sum("contributions__amount")
-    )["total"] or 0
-
-    # Approx shareholder count = count of holdings with quantity > 0
-    shareholder_count = coop.holdings.filter(quantity__gt=0).count()
+    # Stored counters (projects.services, shares.ownership): no aggregation per view
+    holders, _, _ = ownership.figures(coop.id)
 
     return render(
         request,
@@ -38,13 +53,15 @@ def coop_detail(request, coop_id: int):
             "coop": coop,
             "active_projects": active_projects,
             "done_projects": done_projects,
-            "total_contributions": total_contributions,
-            "shareholder_count": shareholder_count,
+            "total_contributions": coop.contributed_total,
+            "shareholder_count": holders,
+            "primary_available": primary_available(coop),
         },
     )
 
 
-
+# Striped coops: the inventory write upserts the slots too
+@query_budget(11)
 @login_required
 def board_coop_edit(request):
     # Must be accepted board member
@@ -69,17 +86,28 @@ def board_coop_edit(request):
         # share settings
         coop.price_per_share = int(request.POST.get("price_per_share") or coop.price_per_share)
         coop.total_shares = int(request.POST.get("total_shares") or coop.total_shares)
-        coop.available_primary_shares = int(request.POST.get("available_primary_shares") or coop.available_primary_shares)
+        # Sales go on while the form is open: the inventory is only set when the
+        # board changed the number it was shown, never echoed back as is
+        primary_total = (request.POST.get("available_primary_shares") or "").strip()
+        primary_changed = primary_total and primary_total != request.POST.get("available_primary_shares_shown")
 
         # image upload (optional)
         if "image" in request.FILES:
             coop.image = request.FILES["image"]
 
-        coop.save()
+        # Primary inventory is written (and its stripes rebalanced) under lock by
+        # set_primary_inventory, never by a plain save of a possibly stale value.
+        with transaction.atomic():
+            coop.save(update_fields=[
+                "name", "village", "description", "phone", "website",
+                "price_per_share", "total_shares", "image",
+            ])
+            if primary_changed:
+                set_primary_inventory(coop=coop, total=int(primary_total))
         messages.success(request, "Cooperative profile updated.")
         return redirect("coops:board_coop_edit")
 
-    return render(request, "coops/board_coop_edit.html", {"coop": coop})
+    return render(request, "coops/board_coop_edit.html", {"coop": coop, "primary_available": primary_available(coop)})
 
 
 def _require_accepted_board(user) -> BoardMember:
@@ -91,6 +119,7 @@ def _require_accepted_board(user) -> BoardMember:
     return board
 
 
+@query_budget(5)
 @login_required
 def add_board_member(request):
     if request.method != "POST":
@@ -117,122 +146,96 @@ def add_board_member(request):
 
 
 
+@query_budget(6)
 @login_required
 def export_shareholder_info_csv(request):
     board = _require_accepted_board(request.user)
     coop = board.cooperative
+    return stream_csv(export_filename(coop, ExportJob.Kind.SHAREHOLDERS), shareholder_info_rows(coop))
 
-    holdings = (
-        ShareHolding.objects
-        .select_related("user__individual", "cooperative")
-        .filter(cooperative=coop, quantity__gt=0)
-        .order_by("-quantity")
-    )
-
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = f'attachment; filename="{coop.id}_shareholder_info.csv"'
-    writer = csv.writer(response)
-
-    writer.writerow([
-        "full_name", "national_number", "phone_number", "address", "post_id",
-        "shares", "price_per_share", "share_worth_tooman"
-    ])
-
-    for h in holdings:
-        ind = getattr(h.user, "individual", None)
-        if not ind:
-            continue
-        worth = h.quantity * coop.price_per_share
-        writer.writerow([
-            ind.full_name,
-            ind.national_number,
-            ind.phone_number,
-            ind.address,
-            ind.post_id,
-            h.quantity,
-            coop.price_per_share,
-            worth,
-        ])
-
-    return response
 
+@query_budget(6)
+@login_required
+def export_share_purchase_logs_csv(request):
+    board = _require_accepted_board(request.user)
+    coop = board.cooperative
+    return stream_csv(export_filename(coop, ExportJob.Kind.TRADES), purchase_log_rows(coop))
 
 
+@query_budget(7)
 @login_required
-def export_share_purchase_logs_csv(request):
+def export_coop_share_summary_csv(request):
     board = _require_accepted_board(request.user)
     coop = board.cooperative
+    return stream_csv(export_filename(coop, ExportJob.Kind.SUMMARY), share_summary_rows(coop))
 
-    trades = (
-        ShareTrade.objects
-        .select_related("buyer__individual", "seller__individual")
-        .filter(cooperative=coop)
-        .order_by("-created_at")
-    )
 
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = f'attachment; filename="{coop.id}_share_purchase_logs.csv"'
-    writer = csv.writer(response)
+@query_budget(7)
+@login_required
+def export_trade_volume_csv(request):
+    board = _require_accepted_board(request.user)
+    coop = board.cooperative
+    return stream_csv(export_filename(coop, ExportJob.Kind.VOLUME), trade_volume_rows(coop))
 
-    writer.writerow([
-        "created_at", "buyer_name", "buyer_national_id",
-        "seller_name", "seller_national_id",
-        "quantity", "price_per_share", "total_price"
-    ])
 
-    for t in trades:
-        buyer_ind = getattr(t.buyer, "individual", None)
-        seller_ind = getattr(t.seller, "individual", None) if t.seller else None
+def _end_of_day(value: str):
+    """The last instant of an ISO date in the current time zone."""
+    return timezone.make_aware(datetime.combine(date.fromisoformat(value), time.max))
 
-        writer.writerow([
-            t.created_at.isoformat(),
-            buyer_ind.full_name if buyer_ind else t.buyer.username,
-            buyer_ind.national_number if buyer_ind else "",
-            seller_ind.full_name if seller_ind else ("COOP_PRIMARY" if t.seller is None else str(t.seller)),
-            seller_ind.national_number if seller_ind else "",
-            t.quantity,
-            t.price_per_share,
-            t.total_price,
-        ])
 
-    return response
+@query_budget(10)
+@login_required
+def export_cap_table_csv(request):
+    board = _require_accepted_board(request.user)
+    coop = board.cooperative
+    try:
+        at = _end_of_day(request.GET["at"]) if request.GET.get("at") else timezone.now()
+        compare = _end_of_day(request.GET["compare"]) if request.GET.get("compare") else None
+    except ValueError:
+        messages.error(request, "Dates must look like 2025-03-21.")
+        return redirect("coops:board_exports")
+    return stream_csv(f"{coop.id}_cap_table_{at:%Y-%m-%d}.csv", cap_table_rows(coop, at, compare))
 
 
+@query_budget(9)
 @login_required
-def export_coop_share_summary_csv(request):
+def board_exports(request):
     board = _require_accepted_board(request.user)
     coop = board.cooperative
 
-    holdings = (
-        ShareHolding.objects
-        .select_related("user__individual")
-        .filter(cooperative=coop, quantity__gt=0)
-        .order_by("-quantity")
+    if request.method == "POST":
+        try:
+            job = request_export(coop=coop, kind=request.POST.get("kind", ""), user=request.user)
+        except ValueError as e:
+            messages.error(request, f"Could not queue export: {e}")
+        else:
+            if job.status == ExportJob.Status.DONE:
+                messages.success(request, f"{job.get_kind_display()} is up to date and ready to download.")
+            else:
+                messages.success(request, f"{job.get_kind_display()} queued. This page shows when it is ready.")
+        return redirect("coops:board_exports")
+
+    jobs = ExportJob.objects.filter(cooperative=coop).order_by("-created_at")[:20]
+    return render(
+        request,
+        "coops/board_exports.html",
+        {"coop": coop, "jobs": jobs, "kinds": ExportJob.Kind.choices},
     )
 
-    total_held = holdings.aggregate(total=Sum("quantity"))["total"] or 0
-    total_value = total_held * coop.price_per_share
-
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = f'attachment; filename="{coop.id}_coop_share_summary.csv"'
-    writer = csv.writer(response)
-
-    # header/meta rows
-    writer.writerow(["cooperative_name", coop.name])
-    writer.writerow(["price_per_share", coop.price_per_share])
-    writer.writerow(["total_shares_defined", coop.total_shares])
-    writer.writerow(["available_primary_shares", coop.available_primary_shares])
-    writer.writerow(["total_held_shares", total_held])
-    writer.writerow(["total_held_value_tooman", total_value])
-    writer.writerow([])
-
-    # detail section
-    writer.writerow(["shareholder_name", "national_number", "shares", "percentage_of_held_shares"])
-    for h in holdings:
-        ind = getattr(h.user, "individual", None)
-        if not ind:
-            continue
-        pct = (h.quantity / total_held * 100) if total_held else 0
-        writer.writerow([ind.full_name, ind.national_number, h.quantity, round(pct, 2)])
-
-    return response
\ No newline at end of file
+
+@query_budget(7)
+@login_required
+def download_export(request, job_id: int):
+    board = _require_accepted_board(request.user)
+    job = get_object_or_404(
+        ExportJob, id=job_id, cooperative=board.cooperative, status=ExportJob.Status.DONE
+    )
+    path = artifact_path(job)
+    if not job.file_path or not path.exists():
+        raise Http404("Export file is no longer available")
+    return FileResponse(
+        path.open("rb"),
+        as_attachment=True,
+        filename=f"{export_filename(job.cooperative, job.kind)}.gz",
+        content_type="application/gzip",
+    )
@@ -0,0 +1,68 @@
+"""
+Largest-remainder share allocation, in exact integer arithmetic.
+
+Each contribution gets floor(amount * shares / total) shares; the shares left
+over go one each to the largest remainders (amount * shares mod total), ties to
+the larger contribution and then to the earlier one. No floats are involved,
+so the order of remainders is exact however large the amounts are.
+
+Everything runs on NumPy arrays: a million contributions allocate in tens of
+milliseconds. When amount * shares could overflow int64 the products are
+taken as Python integers instead, which is slower but still exact.
+"""
+import numpy as np
+
+_INT64_MAX = np.iinfo(np.int64).max
+
+
+def allocate(amounts, shares_to_distribute: int) -> np.ndarray:
+    """Shares per contribution (int64 array, same order as `amounts`); they sum to `shares_to_distribute`."""
+    amounts = np.asarray(amounts, dtype=np.int64)
+    n = len(amounts)
+    total = int(amounts.sum()) if n else 0
+    if total <= 0 or shares_to_distribute == 0:
+        return np.zeros(n, dtype=np.int64)
+
+    if int(amounts.max()) * shares_to_distribute <= _INT64_MAX:
+        products = amounts * shares_to_distribute
+    else:
+        products = amounts.astype(object) * shares_to_distribute
+    # Both results fit int64: floors <= shares, remainders < total
+    floors = (products // total).astype(np.int64)
+    remainders = (products % total).astype(np.int64)
+
+    remaining = shares_to_distribute - int(floors.sum())
+    if remaining == 0:
+        return floors
+
+    # The `remaining` largest remainders: everything above the cut-off value,
+    # then as many as still needed of those equal to it, by amount desc, position asc
+    cutoff = np.partition(remainders, n - remaining)[n - remaining]
+    above = np.flatnonzero(remainders > cutoff)
+    tied = np.flatnonzero(remainders == cutoff)
+    tied = tied[np.lexsort((tied, -amounts[tied]))][: remaining - len(above)]
+
+    floors[above] += 1
+    floors[tied] += 1
+    return floors
+
+
+def sum_by_user(user_ids, *columns) -> tuple[np.ndarray, ...]:
+    """(distinct user ids, then each column summed per user), in user id order."""
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    if len(user_ids) == 0:
+        return tuple(np.zeros(0, dtype=np.int64) for _ in range(1 + len(columns)))
+
+    order = np.argsort(user_ids)
+    sorted_ids = user_ids[order]
+    starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+    # reduceat keeps int64, so sums stay exact
+    sums = tuple(np.add.reduceat(np.asarray(c, dtype=np.int64)[order], starts) for c in columns)
+    return (sorted_ids[starts], *sums)
+
+
+def totals_by_user(user_ids, amounts, allocations) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(user ids, amounts, shares) summed per user, most shares first and then by user id."""
+    users, amount, shares = sum_by_user(user_ids, amounts, allocations)
+    by_shares = np.lexsort((users, -shares))
+    return users[by_shares], amount[by_shares], shares[by_shares]
@@ -0,0 +1,30 @@
+"""
+The cooperative's project counters (Cooperative.active_project_count and
+done_project_count), moved by F() deltas exactly when a project's status does.
+
+Creation and deletion are counted by the receivers in projects.signals, so
+every way of creating a project is covered. Status changes call
+track_status_change() next to the save, with the old status read under the
+project row lock. `manage.py reconcile_coop_counters` repairs drift.
+"""
+from django.db.models import F
+
+from coops.models import Cooperative
+from .models import Project
+
+# Cooperative counter per project status it counts
+STATUS_COUNTERS = {
+    Project.Status.ACTIVE: "active_project_count",
+    Project.Status.DONE: "done_project_count",
+}
+
+
+def track_status_change(*, coop_id: int, old: str | None, new: str | None) -> None:
+    """Move the counters for a project going from `old` to `new` status (None: created / deleted)."""
+    changes = {}
+    for status, field in STATUS_COUNTERS.items():
+        delta = (new == status) - (old == status)
+        if delta:
+            changes[field] = F(field) + delta
+    if changes:
+        Cooperative.objects.filter(id=coop_id).update(**changes)
@@ -0,0 +1,173 @@
+"""
+Background share distribution for projects marked done.
+
+request_distribution() moves the project to DISTRIBUTING, which closes it to
+new contributions, and queues a DistributionJob. The worker
+(`manage.py run_distribution_jobs`) first freezes the allocation plan onto the
+job: every contribution's shares, computed once by projects.allocation. It
+then applies the plan DISTRIBUTION_BATCH contributions at a time. Each chunk
+credits the holdings, records allocated_shares and advances the job's cursor
+in one short transaction, so a crash loses at most the chunk in flight and a
+restarted worker resumes from the cursor without crediting anything twice.
+The last chunk marks the project DONE. Once the ledger has settled past the
+finish (shares.ledger.SNAPSHOT_LAG), the worker snapshots the cap table as it
+stood right after the distribution (snapshot_finished()).
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from shares import ledger
+from .counters import track_status_change
+from .models import DistributionJob, Project
+from .services import DISTRIBUTION_BATCH, allocations_for, apply_allocations
+
+# A RUNNING job whose worker has been silent this long is assumed dead and re-claimed
+STALE_AFTER = timedelta(minutes=10)
+
+
+def _pack(ids, user_ids, shares) -> bytes:
+    return np.array([ids, user_ids, shares], dtype=np.int64).reshape(3, -1).tobytes()
+
+
+def _unpack(plan) -> np.ndarray:
+    return np.frombuffer(bytes(plan), dtype=np.int64).reshape(3, -1)
+
+
+@transaction.atomic
+def request_distribution(*, project: Project, user) -> DistributionJob:
+    """Close the project and queue its distribution; returns the existing job if one is under way."""
+    # The lock contribute_to_project takes: no contribution slips in after this
+    status = Project.objects.select_for_update(no_key=True).filter(id=project.id).values_list("status", flat=True).get()
+    if status == Project.Status.DISTRIBUTING:
+        return project.distribution_job
+    if status not in (Project.Status.ACTIVE, Project.Status.DRAFT):
+        raise ValueError("Project cannot be marked done from this status")
+    # A project reopened before DONE stopped being editable: its shares were given out once already
+    if DistributionJob.objects.filter(project_id=project.id).exists():
+        raise ValueError("This project's shares have already been distributed")
+
+    project.status = Project.Status.DISTRIBUTING
+    project.save(update_fields=["status"])
+    track_status_change(coop_id=project.cooperative_id, old=status, new=project.status)
+    return DistributionJob.objects.create(project=project, requested_by=user)
+
+
+@transaction.atomic
+def claim_next_job() -> DistributionJob | None:
+    """Take the oldest queued (or abandoned) job; concurrent workers skip each other's rows."""
+    stale = timezone.now() - STALE_AFTER
+    job = (
+        DistributionJob.objects
+        .defer("plan")
+        .select_for_update(skip_locked=True)
+        .filter(Q(status=DistributionJob.Status.QUEUED) | Q(status=DistributionJob.Status.RUNNING, heartbeat_at__lt=stale))
+        .order_by("created_at")
+        .first()
+    )
+    if job is None:
+        return None
+    job.status = DistributionJob.Status.RUNNING
+    job.started_at = job.heartbeat_at = timezone.now()
+    job.save(update_fields=["status", "started_at", "heartbeat_at"])
+    return job
+
+
+@transaction.atomic
+def _freeze_plan(job: DistributionJob) -> np.ndarray:
+    locked = DistributionJob.objects.select_for_update().get(id=job.id)
+    if locked.plan is not None:
+        return _unpack(locked.plan)
+
+    ids, user_ids, _, shares = allocations_for(locked.project)
+    locked.plan = _pack(ids, user_ids, shares)
+    locked.total = len(ids)
+    locked.heartbeat_at = timezone.now()
+    locked.save(update_fields=["plan", "total", "heartbeat_at"])
+    return _unpack(locked.plan)
+
+
+@transaction.atomic
+def _apply_chunk(job: DistributionJob, plan: np.ndarray, *, credit: bool) -> bool:
+    """Apply the next chunk of the plan; True once the whole plan is applied."""
+    locked = DistributionJob.objects.defer("plan").select_related("project").select_for_update().get(id=job.id)
+    if locked.status == DistributionJob.Status.DONE or (
+        locked.cursor >= locked.total and locked.project.status != Project.Status.DISTRIBUTING
+    ):
+        # Another worker re-claimed the job while this one was still alive and finished it first
+        job.cursor, job.total, job.status = locked.cursor, locked.total, locked.status
+        return True
+    start = locked.cursor
+    end = min(start + DISTRIBUTION_BATCH, locked.total)
+    ids, user_ids, shares = plan[:, start:end]
+    apply_allocations(locked.project, ids.tolist(), user_ids, shares, credit=credit)
+
+    locked.cursor = end
+    locked.heartbeat_at = timezone.now()
+    fields = ["cursor", "heartbeat_at"]
+    finished = end == locked.total
+    if finished:
+        # DISTRIBUTING projects can't be edited, so that is still the status
+        locked.project.status = Project.Status.DONE
+        locked.project.save(update_fields=["status"])
+        track_status_change(coop_id=locked.project.cooperative_id, old=Project.Status.DISTRIBUTING, new=Project.Status.DONE)
+        locked.status = DistributionJob.Status.DONE
+        locked.finished_at = locked.heartbeat_at
+        fields += ["status", "finished_at"]
+    locked.save(update_fields=fields)
+    job.cursor, job.total, job.status = locked.cursor, locked.total, locked.status
+    return finished
+
+
+def run_job(job: DistributionJob) -> None:
+    """Freeze the plan if needed and apply it from the job's cursor; marks the job DONE or FAILED."""
+    if DistributionJob.objects.filter(id=job.id, status=DistributionJob.Status.DONE).exists():
+        return
+    try:
+        plan = _freeze_plan(job)
+        # Like the inline path: holdings are only touched when there are shares to give
+        credit = bool(plan[2].any())
+        while not _apply_chunk(job, plan, credit=credit):
+            pass
+    except Exception as e:
+        # Applied chunks stay applied; a retry continues from the cursor
+        DistributionJob.objects.filter(id=job.id).update(
+            status=DistributionJob.Status.FAILED, error=f"{type(e).__name__}: {e}", finished_at=timezone.now()
+        )
+        raise
+
+
+def retry_failed() -> int:
+    """Re-queue failed jobs; returns how many."""
+    return DistributionJob.objects.filter(status=DistributionJob.Status.FAILED).update(
+        status=DistributionJob.Status.QUEUED, error="", finished_at=None
+    )
+
+
+def snapshot_finished() -> int:
+    """Snapshot the cap table at the finish of each settled DONE distribution; returns how many were taken."""
+    taken = 0
+    while True:
+        with transaction.atomic():
+            job = (
+                DistributionJob.objects
+                .defer("plan")
+                .select_related("project__cooperative")
+                .select_for_update(skip_locked=True, of=("self",))
+                .filter(
+                    status=DistributionJob.Status.DONE,
+                    snapshot__isnull=True,
+                    finished_at__lte=timezone.now() - ledger.SNAPSHOT_LAG,
+                )
+                .order_by("finished_at")
+                .first()
+            )
+            if job is None:
+                return taken
+            # Every chunk's ledger entries are stamped before finished_at
+            job.snapshot = ledger.take_snapshot(job.project.cooperative, at=job.finished_at)
+            job.save(update_fields=["snapshot"])
+            taken += 1
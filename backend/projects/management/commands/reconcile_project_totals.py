@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from projects.services import reconcile_totals, totals_drift
+from taavonyar.db import without_statement_timeout
+
+
+class Command(BaseCommand):
+    help = "Verify and/or repair the stored contribution totals of projects."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--project", type=int, action="append", dest="projects", help="Project id (repeatable). Defaults to all.")
+        parser.add_argument("--verify", action="store_true", help="Only report drift, do not repair.")
+
+    @without_statement_timeout
+    def handle(self, *args, projects=None, verify=False, **options):
+        drift = totals_drift(projects)
+
+        for project_id, total, actual_total, contributors, actual_contributors in drift:
+            self.stdout.write(
+                f"project {project_id}: total stored={total} actual={actual_total}, "
+                f"contributors stored={contributors} actual={actual_contributors}"
+            )
+            if not verify:
+                reconcile_totals(project_id)
+                self.stdout.write(self.style.SUCCESS(f"project {project_id}: reconciled"))
+
+        if verify and drift:
+            raise CommandError(f"{len(drift)} project(s) have contribution total drift")
+        self.stdout.write(self.style.SUCCESS(f"{len(drift)} project(s) with drift."))
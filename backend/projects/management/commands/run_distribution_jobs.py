@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from projects.distribution import claim_next_job, retry_failed as retry_failed_jobs, run_job, snapshot_finished
+from taavonyar.db import without_statement_timeout
+
+
+class Command(BaseCommand):
+    help = "Distribution worker: credit the shares of projects marked done, in resumable chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Drain the queue and exit instead of polling.")
+        parser.add_argument("--sleep", type=float, default=2.0, help="Seconds between polls when the queue is empty.")
+        parser.add_argument("--retry-failed", action="store_true", help="Re-queue failed jobs first; they resume where they stopped.")
+
+    @without_statement_timeout
+    def handle(self, *args, once=False, sleep=2.0, retry_failed=False, **options):
+        if retry_failed:
+            self.stdout.write(f"re-queued {retry_failed_jobs()} failed job(s)")
+
+        while True:
+            job = claim_next_job()
+            if job is None:
+                # Idle: snapshot the cap tables of settled distributions
+                snapshots = snapshot_finished()
+                if snapshots:
+                    self.stdout.write(f"took {snapshots} post-distribution cap table snapshot(s)")
+                if once:
+                    break
+                time.sleep(sleep)
+                continue
+
+            started = time.monotonic()
+            try:
+                run_job(job)
+            except Exception as e:  # recorded on the job; keep serving the queue
+                self.stderr.write(f"distribution {job.id} (project {job.project_id}) failed at {job.cursor}/{job.total}: {e}")
+                continue
+            self.stdout.write(
+                f"distribution {job.id} (project {job.project_id}): "
+                f"{job.total} contributions in {time.monotonic() - started:.1f}s"
+            )
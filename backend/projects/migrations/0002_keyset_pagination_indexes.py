@@ -0,0 +1,22 @@
+# Generated by Django 5.1.4 on 2026-10-17 13:07
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the indexes without blocking writes on large tables
+    atomic = False
+
+    dependencies = [
+        ('projects', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='contribution',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='contribution_user_recent_idx'),
+        ),
+    ]
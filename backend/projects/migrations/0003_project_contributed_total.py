@@ -0,0 +1,37 @@
+# Generated by Django 5.1.4 on 2026-10-17 13:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0002_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='contributed_total',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='contributor_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        # Backfill from the contributions that already exist
+        migrations.RunSQL(
+            sql="""
+                UPDATE projects_project p
+                SET contributed_total = c.total, contributor_count = c.contributors
+                FROM (
+                    SELECT project_id, SUM(amount) AS total, COUNT(DISTINCT user_id) AS contributors
+                    FROM projects_contribution
+                    GROUP BY project_id
+                ) c
+                WHERE c.project_id = p.id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
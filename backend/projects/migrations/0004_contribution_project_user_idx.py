@@ -0,0 +1,22 @@
+# Generated by Django 5.1.4 on 2026-10-17 13:53
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the index without blocking writes on large tables
+    atomic = False
+
+    dependencies = [
+        ('projects', '0003_project_contributed_total'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='contribution',
+            index=models.Index(fields=['project', 'user'], name='contribution_project_user_idx'),
+        ),
+    ]
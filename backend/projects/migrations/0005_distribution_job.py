@@ -0,0 +1,41 @@
+# Generated by Django 5.1.4 on 2026-10-17 13:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0004_contribution_project_user_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='project',
+            name='status',
+            field=models.CharField(choices=[('DRAFT', 'Draft'), ('ACTIVE', 'Active'), ('DISTRIBUTING', 'Distributing'), ('DONE', 'Done'), ('CANCELED', 'Canceled')], default='DRAFT', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='DistributionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('QUEUED', 'Queued'), ('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='QUEUED', max_length=20)),
+                ('plan', models.BinaryField(null=True)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('cursor', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='distribution_job', to='projects.project')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'QUEUED')), fields=['created_at'], name='distributionjob_queue_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.4 on 2026-10-17 14:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0005_distribution_job'),
+        ('shares', '0009_packed_holding_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='distributionjob',
+            name='snapshot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='shares.holdingsnapshot'),
+        ),
+    ]
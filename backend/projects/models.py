@@ -6,6 +6,8 @@ class Project(models.Model):
     class Status(models.TextChoices):
         DRAFT = "DRAFT", "Draft"
         ACTIVE = "ACTIVE", "Active"
+        # Marked done; the distribution worker is crediting the shares
+        DISTRIBUTING = "DISTRIBUTING", "Distributing"
         DONE = "DONE", "Done"
         CANCELED = "CANCELED", "Canceled"
 
@@ -25,6 +27,10 @@ class Project(models.Model):
     status = models.CharField(max_length=20, choices=Status.choices, default=Status.DRAFT)
     is_fully_funded = models.BooleanField(default=False)
 
+    # Maintained by contribute_to_project; reconcile_project_totals repairs drift
+    contributed_total = models.PositiveBigIntegerField(default=0)  # Tooman
+    contributor_count = models.PositiveIntegerField(default=0)
+
     created_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.PROTECT,
@@ -38,8 +44,7 @@ class Project(models.Model):
 
     @property
     def total_contributed(self) -> int:
-        agg = self.contributions.aggregate(total=models.Sum("amount"))
-        return int(agg["total"] or 0)
+        return self.contributed_total
 
 
 class Contribution(models.Model):
@@ -52,5 +57,68 @@ class Contribution(models.Model):
     # set when project is DONE (distribution)
     allocated_shares = models.PositiveIntegerField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Shareholder dashboard keyset pages
+            models.Index(fields=["user", "-created_at", "-id"], name="contribution_user_recent_idx"),
+            # "Has this user contributed to the project before?" on every contribution
+            models.Index(fields=["project", "user"], name="contribution_project_user_idx"),
+        ]
+
     def __str__(self) -> str:
         return f"{self.user} -> {self.project} : {self.amount} Tooman"
+
+
+class DistributionJob(models.Model):
+    """A project's share distribution, applied in chunks by the distribution worker (see projects.distribution)."""
+
+    class Status(models.TextChoices):
+        QUEUED = "QUEUED", "Queued"
+        RUNNING = "RUNNING", "Running"
+        DONE = "DONE", "Done"
+        FAILED = "FAILED", "Failed"
+
+    project = models.OneToOneField(Project, on_delete=models.CASCADE, related_name="distribution_job")
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.QUEUED)
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="+",
+    )
+
+    # The frozen allocation: contribution ids, user ids and shares as packed int64 arrays
+    plan = models.BinaryField(null=True, editable=False)
+    # Contributions in the plan, and how many of them (in plan order) are applied
+    total = models.PositiveIntegerField(default=0)
+    cursor = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Last chunk applied; a RUNNING job silent for long is re-claimed
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # The cap table right after this distribution, taken once the ledger has settled.
+    # shares.ledger.prune_snapshots keeps these, so the worker never re-takes one.
+    snapshot = models.ForeignKey(
+        "shares.HoldingSnapshot",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="distribution_jobs",
+    )
+
+    class Meta:
+        indexes = [
+            # Worker queue: oldest QUEUED first
+            models.Index(fields=["created_at"], condition=models.Q(status="QUEUED"), name="distributionjob_queue_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.project.title} distribution ({self.status})"
+
+    @property
+    def percent(self) -> int:
+        return self.cursor * 100 // self.total if self.total else 0
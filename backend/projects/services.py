@@ -1,10 +1,20 @@
-from django.db import transaction
-from django.db.models import Sum
-
+import numpy as np
+from django.db import connection, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from coops.models import Cooperative
+from . import allocation
+from .counters import track_status_change
 from .models import Project, Contribution
-from shares.models import ShareHolding
+from .signals import PROJECTS
+from shares import holdings
+from shares.models import ShareLedgerEntry
+from taavonyar.cache import bump_version
+from taavonyar.perf import timed_service
 
 
+@timed_service
 @transaction.atomic
 def contribute_to_project(*, project: Project, user, amount: int) -> Contribution:
     if project.status != Project.Status.ACTIVE:
@@ -12,67 +22,153 @@ def contribute_to_project(*, project: Project, user, amount: int) -> Contributio
     if amount <= 0:
         raise ValueError("Amount must be > 0")
 
-    c = Contribution.objects.create(project=project, user=user, amount=amount)
+    # Contributions to one project queue on its row (NO KEY: the contribution
+    # insert below only needs KEY SHARE on it), so the first-contribution check
+    # can't race, reconcile_totals() sees no half-applied deltas and nothing is
+    # added once distribution has started.
+    status = Project.objects.select_for_update(no_key=True).filter(id=project.id).values_list("status", flat=True).get()
+    if status != Project.Status.ACTIVE:
+        raise ValueError("Project is not active")
+    first = not Contribution.objects.filter(project=project, user=user).exists()
 
-    # auto update fully funded flag
-    total = project.contributions.aggregate(total=Sum("amount"))["total"] or 0
-    if total >= project.goal_amount and not project.is_fully_funded:
+    c = Contribution.objects.create(project=project, user=user, amount=amount)
+    Project.objects.filter(id=project.id).update(
+        contributed_total=F("contributed_total") + amount,
+        contributor_count=F("contributor_count") + int(first),
+    )
+    project.contributed_total += amount
+    project.contributor_count += int(first)
+
+    # auto update fully funded flag, only on the contribution that crosses the goal
+    crossed = (
+        Project.objects
+        .filter(id=project.id, is_fully_funded=False, contributed_total__gte=F("goal_amount"))
+        .update(is_fully_funded=True)
+    )
+    if crossed:
         project.is_fully_funded = True
-        project.save(update_fields=["is_fully_funded"])
+        bump_version(PROJECTS)  # .update() skips post_save; the list shows the funded badge
+
+    # Last: the coop row is shared by all its projects, so hold its lock only until commit
+    Cooperative.objects.filter(id=project.cooperative_id).update(contributed_total=F("contributed_total") + amount)
 
     return c
 
 
+# Rows per holdings upsert / allocated_shares update during distribution
+DISTRIBUTION_BATCH = 5000
+
+
+def allocations_for(project: Project):
+    """(contribution ids, user ids, amounts, shares) of the project's contributions, by id."""
+    rows = list(project.contributions.order_by("id").values_list("id", "user_id", "amount"))
+    ids = [r[0] for r in rows]
+    user_ids = [r[1] for r in rows]
+    amounts = [r[2] for r in rows]
+    return ids, user_ids, amounts, allocation.allocate(amounts, project.shares_to_distribute)
+
+
+def preview_distribution(*, project: Project) -> list[tuple[int, int, int]]:
+    """(user id, amount contributed, shares) that marking the project DONE now would give; writes nothing."""
+    _, user_ids, amounts, allocations = allocations_for(project)
+    users, amount, shares = allocation.totals_by_user(user_ids, amounts, allocations)
+    return list(zip(users.tolist(), amount.tolist(), shares.tolist()))
+
+
+def _set_allocated_shares(contribution_ids: list[int], shares: list[int]) -> None:
+    table = Contribution._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {table} AS c
+            SET allocated_shares = v.shares
+            FROM unnest(%(ids)s::bigint[], %(shares)s::integer[]) AS v(id, shares)
+            WHERE c.id = v.id
+            """,
+            {"ids": contribution_ids, "shares": shares},
+        )
+
+
+def apply_allocations(project: Project, contribution_ids, user_ids, shares, *, credit: bool) -> None:
+    """
+    Record allocated_shares for these contributions and, when `credit`, add the
+    shares (summed per user) to the holdings. `credit` is false when the project
+    distributes nothing at all; then allocated_shares = 0 is still recorded, for traceability.
+    """
+    if credit:
+        users, per_user = allocation.sum_by_user(user_ids, shares)
+        holdings.credit_many(
+            coop_id=project.cooperative_id,
+            credits=dict(zip(users.tolist(), per_user.tolist())),
+            kind=ShareLedgerEntry.Kind.DISTRIBUTION,
+        )
+    _set_allocated_shares(list(contribution_ids), np.asarray(shares).tolist())
+
+
+@timed_service
 @transaction.atomic
 def mark_project_done_and_distribute_shares(*, project: Project) -> None:
-    if project.status == Project.Status.DONE:
+    """
+    Mark the project DONE and credit its contributors' holdings.
+
+    Set-based: contributions are read once, shares are summed per user and
+    written with one holdings upsert and one allocated_shares UPDATE per
+    DISTRIBUTION_BATCH rows, instead of statements per contribution.
+    Runs in the caller's transaction; projects.distribution does the same
+    work in resumable chunks for projects too large for one request.
+    """
+    # The project row lock (the one contribute_to_project takes) keeps new
+    # contributions out, so the contribution rows themselves need no locks.
+    status = Project.objects.select_for_update(no_key=True).filter(id=project.id).values_list("status", flat=True).get()
+    if status == Project.Status.DONE:
         return
-    if project.status not in (Project.Status.ACTIVE, Project.Status.DRAFT):
+    if status not in (Project.Status.ACTIVE, Project.Status.DRAFT):
         raise ValueError("Project cannot be marked done from this status")
 
-    contributions = list(project.contributions.select_for_update())
-    total_contributed = sum(c.amount for c in contributions)
+    ids, user_ids, _, allocations = allocations_for(project)
+    credit = bool(allocations.any())
 
     # Mark done even if no contributions (manual rule), but then nobody gets shares.
     project.status = Project.Status.DONE
     project.save(update_fields=["status"])
-
-    if total_contributed <= 0 or project.shares_to_distribute == 0:
-        # set allocated_shares = 0 for traceability if desired
-        for c in contributions:
-            c.allocated_shares = 0
-            c.save(update_fields=["allocated_shares"])
-        return
-
-    # Proportional allocation with integer shares.
-    # We will distribute remaining rounding shares to biggest contributors first (fair + deterministic).
-    raw_allocations = []
-    for c in contributions:
-        exact = (c.amount / total_contributed) * project.shares_to_distribute
-        floor_shares = int(exact)
-        remainder = exact - floor_shares
-        raw_allocations.append((c, floor_shares, remainder))
-
-    allocated = sum(x[1] for x in raw_allocations)
-    remaining = project.shares_to_distribute - allocated
-
-    # sort by remainder desc, then by contribution desc to break ties
-    raw_allocations.sort(key=lambda t: (t[2], t[0].amount), reverse=True)
-
-    # give +1 share to top 'remaining' contributors
-    for i in range(remaining):
-        c, floor_shares, rem = raw_allocations[i]
-        raw_allocations[i] = (c, floor_shares + 1, rem)
-
-    # apply allocations: update holdings and record on Contribution
-    for c, shares, _ in raw_allocations:
-        holding, _ = ShareHolding.objects.get_or_create(
-            cooperative=project.cooperative,
-            user=c.user,
-            defaults={"quantity": 0},
+    track_status_change(coop_id=project.cooperative_id, old=status, new=project.status)
+
+    for start in range(0, len(ids), DISTRIBUTION_BATCH):
+        end = start + DISTRIBUTION_BATCH
+        apply_allocations(project, ids[start:end], user_ids[start:end], allocations[start:end], credit=credit)
+
+
+def totals_drift(project_ids: list[int] | None = None) -> list[tuple[int, int, int, int, int]]:
+    """
+    (id, stored total, actual total, stored contributors, actual contributors)
+    of the projects whose stored contribution figures disagree with their contributions.
+    """
+    actual = (
+        Contribution.objects
+        .filter(project=OuterRef("pk"))
+        .values("project")
+        .annotate(total=Sum("amount"), contributors=Count("user", distinct=True))
+    )
+    projects = Project.objects.all() if project_ids is None else Project.objects.filter(id__in=project_ids)
+    return list(
+        projects
+        .annotate(
+            actual_total=Coalesce(Subquery(actual.values("total")), Value(0)),
+            actual_contributors=Coalesce(Subquery(actual.values("contributors")), Value(0)),
         )
-        holding.quantity += shares
-        holding.save(update_fields=["quantity"])
+        .exclude(contributed_total=F("actual_total"), contributor_count=F("actual_contributors"))
+        .order_by("id")
+        .values_list("id", "contributed_total", "actual_total", "contributor_count", "actual_contributors")
+    )
 
-        c.allocated_shares = shares
-        c.save(update_fields=["allocated_shares"])
+
+@transaction.atomic
+def reconcile_totals(project_id: int) -> None:
+    """Recompute one project's contribution figures (and funded flag) from its contributions."""
+    # Same lock as contribute_to_project: contributions wait for the rebuilt values
+    project = Project.objects.select_for_update(no_key=True).get(id=project_id)
+    agg = project.contributions.aggregate(total=Sum("amount"), contributors=Count("user", distinct=True))
+    project.contributed_total = agg["total"] or 0
+    project.contributor_count = agg["contributors"]
+    project.is_fully_funded = project.contributed_total >= project.goal_amount
+    project.save(update_fields=["contributed_total", "contributor_count", "is_fully_funded"])
@@ -0,0 +1,49 @@
+"""
+Cache invalidation for the public project pages (see taavonyar.cache).
+
+project:<id> covers one project's page; "projects" covers the project list.
+Projects and their contributions also show on their cooperative's page.
+Creating and deleting projects also moves the cooperative's project counters
+(see projects.counters).
+"""
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from coops.signals import invalidate_coop
+from taavonyar.cache import bump_version
+from .counters import track_status_change
+from .models import Contribution, Project
+
+PROJECTS = "projects"
+
+
+def project_namespace(project_id: int) -> str:
+    return f"project:{project_id}"
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def _project_changed(sender, instance, **kwargs):
+    bump_version(project_namespace(instance.id))
+    bump_version(PROJECTS)
+    invalidate_coop(instance.cooperative_id)
+
+
+@receiver(post_save, sender=Project)
+def _project_created(sender, instance, created, **kwargs):
+    if created:
+        track_status_change(coop_id=instance.cooperative_id, old=None, new=instance.status)
+
+
+@receiver(pre_delete, sender=Project)
+def _project_deleted(sender, instance, **kwargs):
+    # The stored status, not the instance's: it may have been loaded long ago
+    status = Project.objects.filter(id=instance.id).values_list("status", flat=True).first()
+    track_status_change(coop_id=instance.cooperative_id, old=status, new=None)
+
+
+@receiver(post_save, sender=Contribution)
+@receiver(post_delete, sender=Contribution)
+def _contribution_changed(sender, instance, **kwargs):
+    bump_version(project_namespace(instance.project_id))
+    invalidate_coop(instance.project.cooperative_id)
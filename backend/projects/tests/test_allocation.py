@@ -0,0 +1,45 @@
+import numpy as np
+
+from projects.allocation import allocate, totals_by_user
+
+
+def test_shares_are_proportional_and_sum_to_the_total():
+    assert allocate([50, 30, 20], 10).tolist() == [5, 3, 2]
+    assert allocate([1, 1, 1], 2).tolist() == [1, 1, 0]  # tie on remainder and amount: earlier first
+    assert allocate([1, 2, 2], 2).tolist() == [0, 1, 1]
+    assert allocate([], 10).tolist() == []
+    assert allocate([0, 0], 10).tolist() == [0, 0]
+    assert allocate([5, 5], 0).tolist() == [0, 0]
+
+
+def test_remainders_are_compared_exactly():
+    # The first remainder is larger by 1/total of a share, too little for float
+    # division to tell apart, which handed the extra share to the larger amount
+    amounts = [265851816237220, 382004467779267, 352143715983527]
+    assert allocate(amounts, 1_000_003).tolist() == [265853, 382005, 352145]
+
+
+def test_products_beyond_int64_fall_back_to_exact_integers():
+    amounts = [10**15, 10**15 + 7, 3]
+    shares = 4_000_000_000
+    total = sum(amounts)
+    result = allocate(amounts, shares).tolist()
+    assert sum(result) == shares
+    assert [a * shares // total for a in amounts] == [r - (1 if r * total > a * shares else 0) for r, a in zip(result, amounts)]
+
+
+def test_large_allocation_is_vectorized():
+    rng = np.random.default_rng(19)
+    amounts = rng.integers(1, 10**9, 200_000)
+    result = allocate(amounts, 1_000_003)
+    assert result.sum() == 1_000_003
+    # Nobody is more than one share away from their exact proportion
+    exact = amounts * 1_000_003 / amounts.sum()
+    assert np.all(np.abs(result - exact) < 1)
+
+
+def test_totals_by_user_sums_and_orders_by_shares():
+    users, amounts, shares = totals_by_user([7, 3, 7, 5], [10, 20, 30, 5], [1, 2, 3, 2])
+    assert users.tolist() == [7, 3, 5]
+    assert amounts.tolist() == [40, 20, 5]
+    assert shares.tolist() == [4, 2, 2]
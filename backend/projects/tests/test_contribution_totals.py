@@ -0,0 +1,75 @@
+import pytest
+from django.core.management import CommandError, call_command
+from django.urls import reverse
+
+from accounts.models import BoardMember
+from projects import views
+from projects.models import Project
+from projects.services import contribute_to_project, totals_drift
+from tests.factories import ContributionFactory, IndividualFactory, ProjectFactory, UserFactory
+
+
+pytestmark = pytest.mark.django_db
+
+
+def test_contributions_maintain_totals_and_cross_the_goal_once():
+    project = ProjectFactory(goal_amount=1000)
+    alice, bob = UserFactory(), UserFactory()
+
+    contribute_to_project(project=project, user=alice, amount=400)
+    contribute_to_project(project=project, user=alice, amount=300)
+    assert not project.is_fully_funded
+
+    contribute_to_project(project=project, user=bob, amount=300)
+    assert (project.contributed_total, project.contributor_count, project.is_fully_funded) == (1000, 2, True)
+
+    project.refresh_from_db()
+    assert (project.contributed_total, project.contributor_count, project.is_fully_funded) == (1000, 2, True)
+    assert totals_drift() == []
+
+
+def test_contributing_does_not_scan_earlier_contributions(django_assert_num_queries):
+    project = ProjectFactory(goal_amount=10**9)
+    ContributionFactory.create_batch(50, project=project)
+    user = UserFactory()
+
+    # savepoint, lock, first-contribution check, insert, total update, funded check, coop total, release
+    with django_assert_num_queries(8):
+        contribute_to_project(project=project, user=user, amount=10)
+
+
+def test_board_edit_keeps_funded_flag_set_by_a_concurrent_contribution(client, monkeypatch):
+    project = ProjectFactory(goal_amount=1000, status=Project.Status.ACTIVE)
+    me = IndividualFactory()
+    BoardMember.objects.create(
+        individual=me, cooperative=project.cooperative, boardmember_id="BM-1",
+        status=BoardMember.AuthorityStatus.ACCEPTED,
+    )
+    client.force_login(me.user)
+
+    # The view reads the project, then a contribution reaching the goal commits
+    stale = Project.objects.get(id=project.id)
+    monkeypatch.setattr(views, "get_object_or_404", lambda *args, **kwargs: stale)
+    contribute_to_project(project=project, user=UserFactory(), amount=1000)
+
+    client.post(reverse("projects:board_project_edit", args=[project.id]), {"title": "Renamed", "status": "ACTIVE"})
+
+    project.refresh_from_db()
+    assert (project.title, project.contributed_total, project.is_fully_funded) == ("Renamed", 1000, True)
+
+
+def test_reconcile_command_reports_and_repairs_drift():
+    project = ProjectFactory(goal_amount=500)
+    contribute_to_project(project=project, user=UserFactory(), amount=100)
+    # Written behind the service's back (e.g. an admin import)
+    ContributionFactory(project=project, amount=400)
+    untouched = ProjectFactory()
+
+    with pytest.raises(CommandError, match="1 project"):
+        call_command("reconcile_project_totals", "--verify")
+    assert totals_drift([untouched.id]) == []
+
+    call_command("reconcile_project_totals")
+    project = Project.objects.get(id=project.id)
+    assert (project.contributed_total, project.contributor_count, project.is_fully_funded) == (500, 2, True)
+    call_command("reconcile_project_totals", "--verify")
@@ -1,9 +1,11 @@
+import random
+
 import pytest
 
 from projects.services import mark_project_done_and_distribute_shares
 from projects.models import Project
 from shares.models import ShareHolding
-from tests.factories import CooperativeFactory, ProjectFactory, UserFactory
+from tests.factories import ContributionFactory, CooperativeFactory, HoldingFactory, ProjectFactory, UserFactory
 from projects.models import Contribution
 
 
@@ -42,3 +44,50 @@ def test_proportional_distribution_rounding_is_fair():
     assert (h1 + h2 + h3) == 10
     # Expected exact proportions: 5,3,2
     assert (h1, h2, h3) == (5, 3, 2)
+
+
+def _reference_allocations(contributions, shares_to_distribute):
+    # Largest remainder in plain Python integers: remainder desc, amount desc, id asc
+    total = sum(c.amount for c in contributions)
+    shares = {c.id: c.amount * shares_to_distribute // total for c in contributions}
+    remaining = shares_to_distribute - sum(shares.values())
+    ranked = sorted(contributions, key=lambda c: (-(c.amount * shares_to_distribute % total), -c.amount, c.id))
+    for c in ranked[:remaining]:
+        shares[c.id] += 1
+    return shares
+
+
+def test_bulk_distribution_matches_exact_allocations(monkeypatch):
+    from projects import services
+
+    # Several batches, and users with more than one contribution
+    monkeypatch.setattr(services, "DISTRIBUTION_BATCH", 7)
+    rng = random.Random(18)
+    coop = CooperativeFactory()
+    project = ProjectFactory(cooperative=coop, shares_to_distribute=997)
+    users = UserFactory.create_batch(12)
+    HoldingFactory(cooperative=coop, user=users[0], quantity=5)
+    contributions = [
+        Contribution.objects.create(project=project, user=rng.choice(users), amount=rng.choice([1, 7, 100, 333, 1000]))
+        for _ in range(40)
+    ]
+    expected = _reference_allocations(list(Contribution.objects.filter(project=project).order_by("id")), 997)
+
+    mark_project_done_and_distribute_shares(project=project)
+
+    assert dict(Contribution.objects.filter(project=project).values_list("id", "allocated_shares")) == expected
+    per_user = {}
+    for c in contributions:
+        per_user[c.user_id] = per_user.get(c.user_id, 0) + expected[c.id]
+    per_user[users[0].id] = per_user.get(users[0].id, 0) + 5
+    assert dict(ShareHolding.objects.filter(cooperative=coop).values_list("user_id", "quantity")) == per_user
+
+
+def test_distribution_statement_count_does_not_grow_with_contributions(django_assert_num_queries):
+    project = ProjectFactory(shares_to_distribute=100)
+    ContributionFactory.create_batch(60, project=project)
+
+    # savepoint, lock, read, status, coop counters, holdings upsert, allocations, release
+    with django_assert_num_queries(8):
+        mark_project_done_and_distribute_shares(project=project)
+    assert Contribution.objects.filter(project=project, allocated_shares__isnull=True).count() == 0
@@ -0,0 +1,151 @@
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import BoardMember
+from coops.models import Cooperative
+from projects import distribution
+from projects.allocation import allocate
+from projects.distribution import claim_next_job, request_distribution, retry_failed, run_job
+from projects.models import Contribution, DistributionJob, Project
+from projects.services import contribute_to_project
+from shares.models import ShareHolding
+from tests.factories import ContributionFactory, IndividualFactory, ProjectFactory, UserFactory
+
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def project(monkeypatch):
+    monkeypatch.setattr(distribution, "DISTRIBUTION_BATCH", 4)
+    project = ProjectFactory(shares_to_distribute=101)
+    users = UserFactory.create_batch(4)
+    for n in range(10):
+        ContributionFactory(project=project, user=users[n % 4], amount=10 + n)
+    return project
+
+
+def _expected_holdings(project):
+    contributions = list(project.contributions.order_by("id"))
+    per_user = {}
+    for c, shares in zip(contributions, allocate([c.amount for c in contributions], project.shares_to_distribute)):
+        per_user[c.user_id] = per_user.get(c.user_id, 0) + int(shares)
+    return per_user
+
+
+def _holdings(project):
+    return dict(ShareHolding.objects.filter(cooperative=project.cooperative).values_list("user_id", "quantity"))
+
+
+def test_job_closes_the_project_and_applies_the_plan_in_chunks(project):
+    expected = _expected_holdings(project)
+
+    job = request_distribution(project=project, user=UserFactory())
+    assert Project.objects.get(id=project.id).status == Project.Status.DISTRIBUTING
+    assert request_distribution(project=project, user=UserFactory()) == job
+    with pytest.raises(ValueError):
+        contribute_to_project(project=Project.objects.get(id=project.id), user=UserFactory(), amount=5)
+
+    claimed = claim_next_job()
+    assert claimed == job
+    assert claim_next_job() is None
+    run_job(claimed)
+
+    job.refresh_from_db()
+    assert (job.status, job.cursor, job.total) == (DistributionJob.Status.DONE, 10, 10)
+    assert Project.objects.get(id=project.id).status == Project.Status.DONE
+    assert _holdings(project) == expected
+    assert not Contribution.objects.filter(project=project, allocated_shares__isnull=True).exists()
+
+
+def test_failed_job_resumes_from_its_cursor_without_double_credit(project, monkeypatch):
+    expected = _expected_holdings(project)
+    job = request_distribution(project=project, user=None)
+
+    apply = distribution.apply_allocations
+    calls = []
+
+    def crash_on_second_chunk(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError("worker died")
+        return apply(*args, **kwargs)
+
+    monkeypatch.setattr(distribution, "apply_allocations", crash_on_second_chunk)
+    with pytest.raises(RuntimeError):
+        run_job(claim_next_job())
+
+    job.refresh_from_db()
+    assert (job.status, job.cursor) == (DistributionJob.Status.FAILED, 4)
+    assert "worker died" in job.error
+    assert Project.objects.get(id=project.id).status == Project.Status.DISTRIBUTING
+
+    assert retry_failed() == 1
+    run_job(claim_next_job())
+
+    job.refresh_from_db()
+    assert (job.status, job.cursor) == (DistributionJob.Status.DONE, 10)
+    assert _holdings(project) == expected
+
+
+def test_reclaimed_job_is_finished_and_counted_once(project):
+    expected = _expected_holdings(project)
+    job = request_distribution(project=project, user=None)
+    first = claim_next_job()
+    plan = distribution._freeze_plan(first)
+    distribution._apply_chunk(first, plan, credit=True)
+
+    # The first worker is slow, not dead: a second one re-claims the job and finishes it
+    DistributionJob.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - distribution.STALE_AFTER * 2)
+    run_job(claim_next_job())
+    assert distribution._apply_chunk(first, plan, credit=True) is True
+    run_job(first)
+
+    assert _holdings(project) == expected
+    assert Cooperative.objects.get(id=project.cooperative_id).done_project_count == 1
+
+
+def test_done_project_is_not_reopened_or_distributed_again(client, project):
+    me = IndividualFactory()
+    BoardMember.objects.create(
+        individual=me, cooperative=project.cooperative, boardmember_id="BM-1",
+        status=BoardMember.AuthorityStatus.ACCEPTED,
+    )
+    client.force_login(me.user)
+    client.post(reverse("projects:project_mark_done", args=[project.id]))
+    run_job(claim_next_job())
+    expected = _holdings(project)
+
+    client.post(reverse("projects:board_project_edit", args=[project.id]), {"title": "Again", "status": "ACTIVE"})
+    assert Project.objects.get(id=project.id).status == Project.Status.DONE
+
+    # Reopened behind the form's back (or before DONE stopped being editable)
+    Project.objects.filter(id=project.id).update(status=Project.Status.ACTIVE)
+    response = client.post(reverse("projects:project_mark_done", args=[project.id]))
+    assert response.status_code == 302
+    with pytest.raises(ValueError, match="already been distributed"):
+        request_distribution(project=Project.objects.get(id=project.id), user=None)
+    assert claim_next_job() is None
+    assert _holdings(project) == expected
+
+
+def test_dashboard_shows_progress_and_locks_editing(client, project):
+    me = IndividualFactory()
+    BoardMember.objects.create(
+        individual=me, cooperative=project.cooperative, boardmember_id="BM-1",
+        status=BoardMember.AuthorityStatus.ACCEPTED,
+    )
+    client.force_login(me.user)
+
+    client.post(reverse("projects:project_mark_done", args=[project.id]))
+    job = claim_next_job()
+    distribution._freeze_plan(job)
+    distribution._apply_chunk(job, distribution._unpack(DistributionJob.objects.get(id=job.id).plan), credit=True)
+
+    content = client.get(reverse("projects:board_dashboard")).content
+    assert b"Distributing: 4 of 10 contributions" in content
+
+    response = client.post(reverse("projects:board_project_edit", args=[project.id]), {"title": "X", "status": "ACTIVE"})
+    assert response.url == reverse("projects:board_dashboard")
+    assert Project.objects.get(id=project.id).status == Project.Status.DISTRIBUTING
@@ -0,0 +1,50 @@
+import pytest
+from django.urls import reverse
+
+from accounts.models import BoardMember
+from projects.models import Contribution, Project
+from shares.models import ShareHolding
+from tests.factories import ContributionFactory, IndividualFactory, ProjectFactory
+
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def board_client(client):
+    me = IndividualFactory()
+    project = ProjectFactory(shares_to_distribute=10)
+    BoardMember.objects.create(
+        individual=me, cooperative=project.cooperative, boardmember_id="BM-1",
+        status=BoardMember.AuthorityStatus.ACCEPTED,
+    )
+    client.force_login(me.user)
+    return client, project
+
+
+def test_preview_shows_per_user_allocations_without_distributing(board_client):
+    client, project = board_client
+    alice, bob = IndividualFactory(full_name="Alice"), IndividualFactory(full_name="Bob")
+    ContributionFactory(project=project, user=alice.user, amount=50)
+    ContributionFactory(project=project, user=bob.user, amount=30)
+    ContributionFactory(project=project, user=alice.user, amount=20)
+
+    response = client.get(reverse("projects:board_project_preview", args=[project.id]))
+
+    rows = [(r["user"].individual.full_name, r["amount"], r["shares"]) for r in response.context["rows"]]
+    assert rows == [("Alice", 70, 7), ("Bob", 30, 3)]
+    project.refresh_from_db()
+    assert project.status == Project.Status.ACTIVE
+    assert not ShareHolding.objects.exists()
+    assert not Contribution.objects.filter(allocated_shares__isnull=False).exists()
+
+
+def test_preview_is_limited_to_own_undistributed_projects(board_client):
+    client, project = board_client
+    other = ProjectFactory()
+    assert client.get(reverse("projects:board_project_preview", args=[other.id])).status_code == 302
+
+    project.status = Project.Status.DONE
+    project.save()
+    response = client.get(reverse("projects:board_project_preview", args=[project.id]))
+    assert response.url == reverse("projects:board_dashboard")
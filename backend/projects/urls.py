@@ -2,7 +2,7 @@ from django.urls import path
 from .views import (
     project_list, project_detail, contribute,
     board_dashboard, mark_done,
-    board_project_create, board_project_edit,
+    board_project_create, board_project_edit, board_project_preview,
 )
 
 app_name = "projects"
@@ -16,5 +16,6 @@ urlpatterns = [
     path("board/", board_dashboard, name="board_dashboard"),
     path("board/create/", board_project_create, name="board_project_create"),
     path("board/<int:project_id>/edit/", board_project_edit, name="board_project_edit"),
+    path("board/<int:project_id>/preview/", board_project_preview, name="board_project_preview"),
     path("<int:project_id>/mark-done/", mark_done, name="project_mark_done"),
 ]
@@ -1,14 +1,29 @@
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, get_object_or_404, redirect
-from django.db.models import Sum
 from django.contrib import messages
+from django.db import transaction
 from accounts.models import Individual, BoardMember
 from .models import Project
-from .services import contribute_to_project, mark_project_done_and_distribute_shares
+from .distribution import request_distribution
+from .counters import track_status_change
+from .services import contribute_to_project, preview_distribution
 import json
+from datetime import timedelta
 from django.core.serializers.json import DjangoJSONEncoder
-from shares.models import ShareHolding
-
+from shares.models import TradeVolumeBucket
+from shares import ownership, volume
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from django.core.paginator import Paginator
+from coops.services import primary_available
+from taavonyar.cache import cache_public_page
+from taavonyar.query_budget import query_budget
+from coops.signals import COOPS
+from .signals import PROJECTS, project_namespace
+
+
+@query_budget(6)
+@cache_public_page(lambda: [PROJECTS, COOPS])
 def project_list(request):
     qs = Project.objects.select_related("cooperative").order_by("-created_at")
     coop_id = request.GET.get("coop")
@@ -17,12 +32,14 @@ def project_list(request):
     return render(request, "projects/project_list.html", {"projects": qs})
 
 
+@query_budget(7)
+@cache_public_page(lambda project_id: [project_namespace(project_id), COOPS])
 def project_detail(request, project_id: int):
     project = get_object_or_404(Project.objects.select_related("cooperative"), id=project_id)
-    total = project.contributions.aggregate(total=Sum("amount"))["total"] or 0
-    return render(request, "projects/project_detail.html", {"project": project, "total_contributed": total})
+    return render(request, "projects/project_detail.html", {"project": project, "total_contributed": project.contributed_total})
 
 
+@query_budget(9)
 @login_required
 def contribute(request, project_id: int):
     project = get_object_or_404(Project, id=project_id)
@@ -33,6 +50,15 @@ def contribute(request, project_id: int):
     return redirect("projects:project_detail", project_id=project.id)
 
 
+# DISTRIBUTING is only entered through mark_done and left by the distribution worker, which
+# sets DONE. A DONE project's shares are given out, so it stays DONE: distributing it again
+# would credit every contribution twice.
+EDITABLE_STATUSES = [
+    (value, label) for value, label in Project.Status.choices
+    if value not in (Project.Status.DISTRIBUTING, Project.Status.DONE)
+]
+
+
 def _require_board_member(user) -> BoardMember:
     if not hasattr(user, "individual"):
         raise PermissionError("User has no Individual profile")
@@ -48,6 +74,7 @@ def _require_board_member(user) -> BoardMember:
     return board
 
 
+@query_budget(11)
 @login_required
 def board_dashboard(request):
     try:
@@ -56,40 +83,40 @@ def board_dashboard(request):
         return redirect("accounts:dashboard")
 
     coop = board.cooperative
-    projects = coop.projects.order_by("-created_at")
-
-    top_shareholders = (
-        ShareHolding.objects
-        .select_related("user__individual")
-        .filter(cooperative=coop, quantity__gt=0)
-        .order_by("-quantity")[:10]
-    )
-
-    holdings = (
-        ShareHolding.objects
-        .select_related("user__individual")
-        .filter(cooperative=coop, quantity__gt=0)
-        .order_by("-quantity")
-    )
-    total_held = sum(h.quantity for h in holdings) or 0
-
-    share_labels = []
-    share_values = []
-    for h in holdings:
-        ind = getattr(h.user, "individual", None)
-        share_labels.append(ind.full_name if ind else h.user.username)
-        share_values.append(float((h.quantity / total_held * 100) if total_held else 0))
+    projects = coop.projects.select_related("distribution_job").defer("distribution_job__plan").order_by("-created_at")
+
+    # Top holders plus one "others" slice, from the precomputed figures
+    ownership_figures = ownership.distribution(coop)
+    share_labels = [h["name"] for h in ownership_figures["top"]]
+    share_values = [h["percent"] for h in ownership_figures["top"]]
+    if ownership_figures["others_held"]:
+        share_labels.append(f"Others ({ownership_figures['others_holders']})")
+        share_values.append(ownership_figures["others_percent"])
 
     project_labels = []
     project_funded_pct = []
     project_status = []
     for p in projects:
-        contributed = p.total_contributed
+        contributed = p.contributed_total
         pct = float((contributed / p.goal_amount * 100) if p.goal_amount else 0)
         project_labels.append(p.title)
         project_funded_pct.append(round(pct, 2))
         project_status.append(p.status)
 
+    # Trade volume from the rollups: 12 monthly buckets + 30 daily ones, never the trades table
+    today = timezone.localdate()
+    first_month = (today.replace(day=1) - timedelta(days=335)).replace(day=1)
+    monthly = volume.series(coop.id, period=TradeVolumeBucket.Period.MONTH, since=first_month)
+    volume_labels = [b.bucket_start.strftime("%Y-%m") for b in monthly]
+    volume_primary = [b.primary_share_count for b in monthly]
+    volume_secondary = [b.secondary_share_count for b in monthly]
+    recent = volume.series(coop.id, period=TradeVolumeBucket.Period.DAY, since=today - timedelta(days=29))
+    volume_30d = {
+        "trades": sum(b.trade_count for b in recent),
+        "shares": sum(b.share_count for b in recent),
+        "value": sum(b.value for b in recent),
+    }
+
     return render(request, "projects/board_dashboard.html", {
         "coop": coop,
         "projects": projects,
@@ -98,11 +125,18 @@ def board_dashboard(request):
         "project_labels_json": project_labels,
         "project_funded_pct_json": project_funded_pct,
         "project_status_json": project_status,
-        "top_shareholders": top_shareholders,
+        "top_shareholders": ownership_figures["top"],
+        "ownership": ownership_figures,
+        "primary_available": primary_available(coop),
+        "volume_labels_json": volume_labels,
+        "volume_primary_json": volume_primary,
+        "volume_secondary_json": volume_secondary,
+        "volume_30d": volume_30d,
     })
 
 
 
+@query_budget(10)
 @login_required
 def mark_done(request, project_id: int):
     if request.method != "POST":
@@ -117,12 +151,54 @@ def mark_done(request, project_id: int):
 
     # board member can only mark projects of their own coop
     if project.cooperative_id != board.cooperative_id:
-        return redirect("board_dashboard")
+        return redirect("projects:board_dashboard")
+
+    # Distributed by the worker in chunks; the dashboard shows its progress
+    try:
+        request_distribution(project=project, user=request.user)
+    except ValueError as e:
+        messages.error(request, str(e))
+    else:
+        messages.success(request, "Project marked done. Shares are being distributed.")
+    return redirect("projects:board_dashboard")
+
+
+PREVIEW_PER_PAGE = 50
+
+
+@query_budget(8)
+@login_required
+def board_project_preview(request, project_id: int):
+    """Read-only: what marking the project DONE would give each contributor right now."""
+    try:
+        board = _require_board_member(request.user)
+    except PermissionError:
+        return redirect("accounts:dashboard")
+
+    project = get_object_or_404(Project, id=project_id)
+    if project.cooperative_id != board.cooperative_id:
+        return redirect("projects:board_dashboard")
+    if project.status in (Project.Status.DISTRIBUTING, Project.Status.DONE):
+        messages.info(request, "This project has already been distributed.")
+        return redirect("projects:board_dashboard")
 
-    mark_project_done_and_distribute_shares(project=project)
-    return redirect("board_dashboard")
+    allocations = preview_distribution(project=project)
+    page = Paginator(allocations, PREVIEW_PER_PAGE).get_page(request.GET.get("page"))
+    users = get_user_model().objects.select_related("individual").in_bulk([user_id for user_id, _, _ in page])
+
+    return render(request, "projects/board_project_preview.html", {
+        "project": project,
+        "page": page,
+        "rows": [
+            {"user": users[user_id], "amount": amount, "shares": shares}
+            for user_id, amount, shares in page
+        ],
+        "contributors": len(allocations),
+        "total_contributed": sum(amount for _, amount, _ in allocations),
+    })
 
 
+@query_budget(6)
 @login_required
 def board_project_create(request):
     try:
@@ -139,19 +215,21 @@ def board_project_create(request):
         goal_amount = int(request.POST.get("goal_amount") or "0")
         shares_to_distribute = int(request.POST.get("shares_to_distribute") or "0")
         status = request.POST.get("status") or Project.Status.DRAFT
+        if status not in dict(EDITABLE_STATUSES):
+            status = Project.Status.DRAFT
 
         if not title:
             messages.error(request, "Title is required.")
-            return render(request, "projects/board_project_form.html", {"coop": coop, "project": None, "status_choices": Project.Status.choices})
+            return render(request, "projects/board_project_form.html", {"coop": coop, "project": None, "status_choices": EDITABLE_STATUSES})
 
         if goal_amount <= 0:
             messages.error(request, "Goal amount must be greater than 0.")
-            return render(request, "projects/board_project_form.html", {"coop": coop, "project": None, "status_choices": Project.Status.choices})
+            return render(request, "projects/board_project_form.html", {"coop": coop, "project": None, "status_choices": EDITABLE_STATUSES})
 
 
         if shares_to_distribute <= 0:
             messages.error(request, "Shares to distribute must be greater than 0.")
-            return render(request, "projects/board_project_form.html", {"coop": coop, "project": None, "status_choices": Project.Status.choices})
+            return render(request, "projects/board_project_form.html", {"coop": coop, "project": None, "status_choices": EDITABLE_STATUSES})
 
 
         p = Project.objects.create(
@@ -171,10 +249,11 @@ def board_project_create(request):
         messages.success(request, "Project created.")
         return redirect("projects:board_dashboard")
 
-    return render(request, "projects/board_project_form.html", {"coop": coop, "project": None, "status_choices": Project.Status.choices})
+    return render(request, "projects/board_project_form.html", {"coop": coop, "project": None, "status_choices": EDITABLE_STATUSES})
 
 
 
+@query_budget(8)
 @login_required
 def board_project_edit(request, project_id: int):
     try:
@@ -189,24 +268,48 @@ def board_project_edit(request, project_id: int):
         messages.error(request, "You can only edit projects of your own cooperative.")
         return redirect("projects:board_dashboard")
 
+    if project.status == Project.Status.DISTRIBUTING:
+        messages.error(request, "This project's shares are being distributed; it can't be edited now.")
+        return redirect("projects:board_dashboard")
+
     if request.method == "POST":
         project.title = (request.POST.get("title") or "").strip()
         project.description = (request.POST.get("description") or "").strip()
         project.goal_amount = int(request.POST.get("goal_amount") or project.goal_amount)
         project.shares_to_distribute = int(request.POST.get("shares_to_distribute") or project.shares_to_distribute)
-        project.status = request.POST.get("status") or project.status
-
-        # recompute fully-funded flag (optional but sensible)
-        total = project.total_contributed
-        project.is_fully_funded = total >= project.goal_amount
+        status = request.POST.get("status")
+        if status in dict(EDITABLE_STATUSES):
+            project.status = status
 
         if "image" in request.FILES:
             project.image = request.FILES["image"]
 
-        project.save()
+        with transaction.atomic():
+            # The status and total as of now, under the lock marking done and
+            # contributing take, so the cooperative's project counters move from
+            # the right bucket and a contribution committed meanwhile counts
+            old_status, contributed_total = (
+                Project.objects.select_for_update(no_key=True)
+                .filter(id=project.id)
+                .values_list("status", "contributed_total")
+                .get()
+            )
+            if old_status == Project.Status.DISTRIBUTING:
+                messages.error(request, "This project's shares are being distributed; it can't be edited now.")
+                return redirect("projects:board_dashboard")
+            if old_status == Project.Status.DONE:
+                project.status = old_status
+            # recompute fully-funded flag (optional but sensible)
+            project.contributed_total = contributed_total
+            project.is_fully_funded = contributed_total >= project.goal_amount
+            # Not the contribution counters: those only move by F() deltas
+            project.save(update_fields=[
+                "title", "description", "goal_amount", "shares_to_distribute", "status", "is_fully_funded", "image",
+            ])
+            track_status_change(coop_id=project.cooperative_id, old=old_status, new=project.status)
         messages.success(request, "Project updated.")
         return redirect("projects:board_dashboard")
 
-    return render(request, "projects/board_project_form.html", {"coop": board.cooperative, "project": project, "status_choices": Project.Status.choices})
+    return render(request, "projects/board_project_form.html", {"coop": board.cooperative, "project": project, "status_choices": EDITABLE_STATUSES})
 
 
@@ -1,5 +1,13 @@
 from django.contrib import admin
-from .models import ShareHolding, ShareListing, ShareTrade
+from .models import (
+    CooperativeLiquidity,
+    HoldingSnapshot,
+    SellerLiquidity,
+    ShareHolding,
+    ShareLedgerEntry,
+    ShareListing,
+    ShareTrade,
+)
 
 
 @admin.register(ShareHolding)
@@ -7,6 +15,17 @@ class ShareHoldingAdmin(admin.ModelAdmin):
     list_display = ("cooperative", "user", "quantity")
     search_fields = ("cooperative__name", "user__username")
 
+    # Read-only: quantities change through shares.holdings only, which keeps the
+    # ledger, snapshots, ownership figures and leaderboard in step with them
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 
 @admin.register(ShareListing)
 class ShareListingAdmin(admin.ModelAdmin):
@@ -20,3 +39,44 @@ class ShareTradeAdmin(admin.ModelAdmin):
     list_display = ("cooperative", "buyer", "seller", "quantity", "price_per_share", "total_price", "created_at")
     list_filter = ("created_at",)
     search_fields = ("cooperative__name", "buyer__username", "seller__username")
+
+
+
+@admin.register(CooperativeLiquidity)
+class CooperativeLiquidityAdmin(admin.ModelAdmin):
+    list_display = ("cooperative", "listed_quantity")
+    search_fields = ("cooperative__name",)
+
+
+@admin.register(SellerLiquidity)
+class SellerLiquidityAdmin(admin.ModelAdmin):
+    list_display = ("cooperative", "seller", "listed_quantity")
+    search_fields = ("cooperative__name", "seller__username")
+
+
+@admin.register(ShareLedgerEntry)
+class ShareLedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ("cooperative", "user", "bucket", "kind", "delta", "created_at")
+    list_filter = ("bucket", "kind", "created_at")
+    search_fields = ("cooperative__name", "user__username")
+
+    # Append-only: entries are written by shares.holdings / shares.liquidity only
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(HoldingSnapshot)
+class HoldingSnapshotAdmin(admin.ModelAdmin):
+    list_display = ("cooperative", "taken_at", "holders", "created_at")
+    search_fields = ("cooperative__name",)
+    exclude = ("positions",)
+
+    def get_queryset(self, request):
+        # The packed positions run to megabytes for large coops
+        return super().get_queryset(request).defer("positions")
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SharesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'shares'
+
+    def ready(self):
+        from . import marketplace  # noqa: F401  (connects the cache invalidation receivers)
@@ -0,0 +1,119 @@
+"""
+Cap tables in array form: a cooperative's positions at one moment.
+
+A CapTable is three aligned int64 arrays, user ids (sorted, unique) and each
+user's held and listed shares, so a 1M-holder coop costs 24 MB in memory and
+as a HoldingSnapshot.positions blob (before TOAST compression) instead of a
+million rows. Lookups are binary searches. Diffs, merges and percentages are
+vectorised over the whole table.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+
+class CapTable(NamedTuple):
+    user_ids: np.ndarray
+    held: np.ndarray
+    listed: np.ndarray
+
+    @property
+    def owned(self) -> np.ndarray:
+        """Shares owned per user: held plus reserved in active listings."""
+        return self.held + self.listed
+
+    @property
+    def holders(self) -> int:
+        return len(self.user_ids)
+
+    @property
+    def nbytes(self) -> int:
+        return self.user_ids.nbytes + self.held.nbytes + self.listed.nbytes
+
+    def percentages(self) -> np.ndarray:
+        """Each user's share of everything owned, in percent."""
+        owned = self.owned
+        total = int(owned.sum())
+        return owned * 100 / total if total else np.zeros(len(owned))
+
+    def position(self, user_id: int) -> tuple[int, int]:
+        """(held, listed) of one user; (0, 0) when absent."""
+        i = int(np.searchsorted(self.user_ids, user_id))
+        if i < len(self.user_ids) and self.user_ids[i] == user_id:
+            return int(self.held[i]), int(self.listed[i])
+        return 0, 0
+
+
+EMPTY = CapTable(np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.int64))
+
+
+def pack(table: CapTable) -> bytes:
+    return np.stack([table.user_ids, table.held, table.listed]).astype(np.int64, copy=False).tobytes()
+
+
+def unpack(blob) -> CapTable:
+    if not blob:
+        return EMPTY
+    user_ids, held, listed = np.frombuffer(bytes(blob), dtype=np.int64).reshape(3, -1)
+    return CapTable(user_ids, held, listed)
+
+
+def _contains(sorted_ids: np.ndarray, user_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Where each of `user_ids` sits in `sorted_ids`, and whether it is there."""
+    at = np.searchsorted(sorted_ids, user_ids)
+    found = at < len(sorted_ids)
+    found[found] = sorted_ids[at[found]] == user_ids[found]
+    return at, found
+
+
+def union(sorted_ids: np.ndarray, other: np.ndarray) -> np.ndarray:
+    """Sorted union of two sorted, unique id arrays. np.union1d re-sorts and dedupes both, ~30x slower at 1M."""
+    _, found = _contains(sorted_ids, other)
+    return np.insert(sorted_ids, np.searchsorted(sorted_ids, other[~found]), other[~found])
+
+
+def merge(table: CapTable, user_ids, held_deltas, listed_deltas) -> CapTable:
+    """`table` plus per-user deltas (ids in any order, repeats allowed); users left with nothing drop out."""
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    ids = union(table.user_ids, np.unique(user_ids))
+    held = np.zeros(len(ids), dtype=np.int64)
+    listed = np.zeros(len(ids), dtype=np.int64)
+    base = np.searchsorted(ids, table.user_ids)
+    held[base] = table.held
+    listed[base] = table.listed
+    at = np.searchsorted(ids, user_ids)
+    np.add.at(held, at, np.asarray(held_deltas, dtype=np.int64))
+    np.add.at(listed, at, np.asarray(listed_deltas, dtype=np.int64))
+    keep = (held != 0) | (listed != 0)
+    return CapTable(ids[keep], held[keep], listed[keep])
+
+
+class CapTableDiff(NamedTuple):
+    """Users whose owned shares differ between two tables, with both amounts."""
+
+    user_ids: np.ndarray
+    before: np.ndarray
+    after: np.ndarray
+
+    @property
+    def change(self) -> np.ndarray:
+        return self.after - self.before
+
+
+def align(table: CapTable, user_ids) -> CapTable:
+    """The positions of `user_ids` (sorted, unique) in `table`; users it doesn't have get zeros."""
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    at, found = _contains(table.user_ids, user_ids)
+    held = np.zeros(len(user_ids), dtype=np.int64)
+    listed = np.zeros(len(user_ids), dtype=np.int64)
+    held[found] = table.held[at[found]]
+    listed[found] = table.listed[at[found]]
+    return CapTable(user_ids, held, listed)
+
+
+def diff(before: CapTable, after: CapTable) -> CapTableDiff:
+    """Owned shares that changed from `before` to `after`, users in id order."""
+    ids = union(before.user_ids, after.user_ids)
+    then, now = align(before, ids).owned, align(after, ids).owned
+    changed = then != now
+    return CapTableDiff(ids[changed], then[changed], now[changed])
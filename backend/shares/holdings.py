@@ -0,0 +1,174 @@
+"""
+Holding ledger API: the only place that changes ShareHolding.quantity.
+
+Every call is a single statement that returns the new quantity, so services
+never need get_or_create + save + refresh_from_db round trips. The same
+statement appends the matching HELD entry to the share ledger, tagged with
+`kind` (a ShareLedgerEntry.Kind), the change's OwnershipDelta row (see
+shares.ownership) and its LeaderboardDelta rows (see shares.leaderboard), and
+sends shares.signals.holdings_changed.
+Call inside the service's transaction.
+
+The statement also counts the coop's pending OwnershipDelta rows (one per
+write since the last compaction). The write that finds ownership.COMPACT_AFTER
+of them folds both kinds of deltas in once its transaction commits, so they
+stay bounded however the figures are read, or whether they are at all.
+"""
+from django.db import connection, transaction
+
+from . import ownership
+from .leaderboard import update_path_sql
+from .models import LeaderboardDelta, OwnershipDelta, ShareHolding, ShareLedgerEntry
+from .signals import holdings_changed
+
+
+def credit(*, coop_id: int, user_id: int, quantity: int, kind: str) -> int:
+    """Add `quantity` shares to the user's holding (creating it if needed); returns the new quantity."""
+    return credit_many(coop_id=coop_id, credits={user_id: quantity}, kind=kind)[user_id]
+
+
+def credit_many(*, coop_id: int, credits: dict[int, int], kind: str) -> dict[int, int]:
+    """Credit several users of one cooperative in one upsert; returns {user_id: new quantity}."""
+    if any(qty < 0 for qty in credits.values()):
+        raise ValueError("Credit quantity must be >= 0")
+    if not credits:
+        return {}
+
+    table = ShareHolding._meta.db_table
+    ledger = ShareLedgerEntry._meta.db_table
+    deltas = OwnershipDelta._meta.db_table
+    ranks = LeaderboardDelta._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH credit AS (
+                SELECT * FROM unnest(%(users)s::bigint[], %(quantities)s::integer[]) AS v(user_id, quantity)
+            ),
+            entries AS (
+                INSERT INTO {ledger} (cooperative_id, user_id, bucket, kind, delta, created_at)
+                SELECT %(coop)s, user_id, %(bucket)s, %(kind)s, quantity, now()
+                FROM credit
+                WHERE quantity > 0
+            ),
+            credited AS (
+                INSERT INTO {table} (cooperative_id, user_id, quantity)
+                SELECT %(coop)s, user_id, quantity FROM credit
+                ON CONFLICT (cooperative_id, user_id)
+                DO UPDATE SET quantity = {table}.quantity + EXCLUDED.quantity
+                RETURNING user_id, quantity
+            ),
+            ownership AS (
+                INSERT INTO {deltas} (cooperative_id, holders, total_held, sum_squares)
+                SELECT
+                    %(coop)s,
+                    SUM((h.quantity > 0)::int - (h.quantity - c.quantity > 0)::int),
+                    SUM(c.quantity),
+                    SUM(h.quantity::numeric * h.quantity - (h.quantity - c.quantity)::numeric * (h.quantity - c.quantity))
+                FROM credited h JOIN credit c USING (user_id)
+                HAVING SUM(c.quantity) > 0
+            ),
+            leaderboard AS (
+                INSERT INTO {ranks} (cooperative_id, node, holders)
+                SELECT %(coop)s, path.node, SUM(moved.holders)
+                FROM (
+                    SELECT h.quantity, 1 AS holders
+                    FROM credited h JOIN credit c USING (user_id)
+                    WHERE c.quantity > 0
+                    UNION ALL
+                    SELECT h.quantity - c.quantity, -1
+                    FROM credited h JOIN credit c USING (user_id)
+                    WHERE c.quantity > 0 AND h.quantity > c.quantity
+                ) AS moved
+                CROSS JOIN LATERAL ({update_path_sql("moved.quantity")}) AS path
+                GROUP BY path.node
+                HAVING SUM(moved.holders) <> 0
+            )
+            SELECT user_id, quantity, (SELECT COUNT(*) FROM {deltas} WHERE cooperative_id = %(coop)s)
+            FROM credited
+            """,
+            {
+                "coop": coop_id,
+                "users": list(credits.keys()),
+                "quantities": list(credits.values()),
+                "bucket": ShareLedgerEntry.Bucket.HELD,
+                "kind": kind,
+            },
+        )
+        rows = cursor.fetchall()
+    updated = {user_id: quantity for user_id, quantity, _ in rows}
+    _compact_when_due(coop_id, rows[0][2] if rows else 0)
+    holdings_changed.send(sender=ShareHolding, coop_id=coop_id, user_ids=list(updated))
+    return updated
+
+
+def debit(*, coop_id: int, user_id: int, quantity: int, kind: str) -> int:
+    """
+    Remove `quantity` shares from the user's holding; returns the new quantity.
+    The UPDATE is guarded, so a holding can never go negative; raises ValueError
+    when the user does not hold enough (including when there is no holding at all).
+    """
+    table = ShareHolding._meta.db_table
+    ledger = ShareLedgerEntry._meta.db_table
+    deltas = OwnershipDelta._meta.db_table
+    ranks = LeaderboardDelta._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH debited AS (
+                UPDATE {table}
+                SET quantity = quantity - %(quantity)s
+                WHERE cooperative_id = %(coop)s AND user_id = %(user)s AND quantity >= %(quantity)s
+                RETURNING quantity
+            ),
+            entries AS (
+                INSERT INTO {ledger} (cooperative_id, user_id, bucket, kind, delta, created_at)
+                SELECT %(coop)s, %(user)s, %(bucket)s, %(kind)s, -(%(quantity)s), now()
+                FROM debited
+            ),
+            ownership AS (
+                INSERT INTO {deltas} (cooperative_id, holders, total_held, sum_squares)
+                SELECT
+                    %(coop)s,
+                    (quantity > 0)::int - (quantity + %(quantity)s > 0)::int,
+                    -(%(quantity)s),
+                    quantity::numeric * quantity - (quantity + %(quantity)s)::numeric * (quantity + %(quantity)s)
+                FROM debited
+                WHERE %(quantity)s > 0
+            ),
+            leaderboard AS (
+                INSERT INTO {ranks} (cooperative_id, node, holders)
+                SELECT %(coop)s, path.node, SUM(moved.holders)
+                FROM (
+                    SELECT quantity + %(quantity)s AS quantity, -1 AS holders FROM debited WHERE %(quantity)s > 0
+                    UNION ALL
+                    SELECT quantity, 1 FROM debited WHERE %(quantity)s > 0 AND quantity > 0
+                ) AS moved
+                CROSS JOIN LATERAL ({update_path_sql("moved.quantity")}) AS path
+                GROUP BY path.node
+                HAVING SUM(moved.holders) <> 0
+            )
+            SELECT quantity, (SELECT COUNT(*) FROM {deltas} WHERE cooperative_id = %(coop)s)
+            FROM debited
+            """,
+            {
+                "coop": coop_id,
+                "user": user_id,
+                "quantity": quantity,
+                "bucket": ShareLedgerEntry.Bucket.HELD,
+                "kind": kind,
+            },
+        )
+        row = cursor.fetchone()
+    if row is None:
+        raise ValueError("Not enough shares")
+    _compact_when_due(coop_id, row[1])
+    holdings_changed.send(sender=ShareHolding, coop_id=coop_id, user_ids=[user_id])
+    return row[0]
+
+
+def _compact_when_due(coop_id: int, pending: int) -> None:
+    if pending >= ownership.COMPACT_AFTER:
+        # After commit, in its own transaction; robust: a failed compaction must not
+        # fail the write, and the next write past the threshold tries again. A
+        # lambda, not a partial: robust callbacks are logged by __qualname__
+        transaction.on_commit(lambda: ownership.compact_deltas(coop_id), robust=True)
@@ -0,0 +1,191 @@
+"""
+Shareholder leaderboard of a cooperative: top holders and any member's rank.
+
+The order is quantity descending, then user id, so it is total and stable
+(standings()). Top-N reads the first N rows of the (cooperative, -quantity)
+holdings index: O(N) whatever the coop's size.
+
+Ranks are competition ranks ("1, 2, 2, 4"): 1 + the number of holders with
+more shares. Counting those from the index costs O(rank), so each coop also
+keeps a Fenwick tree over quantities 1..ROOT in LeaderboardNode rows. Node n
+counts the holders whose quantity lies in (n - lowbit(n), n]. The holders
+with at most q shares are the sum of the <= LEVELS nodes on q's prefix path.
+Node ROOT covers everyone, so a rank reads at most LEVELS + 1 nodes.
+
+Every holdings statement (shares.holdings) appends LeaderboardDelta rows: -1
+along the old quantity's update path and +1 along the new one's, netted per
+node. Those are plain inserts, like OwnershipDelta, so writers never wait on
+the upper nodes every change shares. Readers add a node's pending deltas to it.
+The writer that finds ownership.COMPACT_AFTER writes pending folds both kinds
+of deltas in after it commits (shares.holdings), so a node has at most about
+that many pending deltas and a rank reads O(LEVELS * COMPACT_AFTER) rows at
+worst, however many holders the coop has.
+`manage.py rebuild_leaderboard` verifies or recomputes the trees.
+"""
+from django.db import connection, transaction
+
+from .models import LeaderboardDelta, LeaderboardNode, ShareHolding
+
+# ShareHolding.quantity is a 32-bit integer: the tree covers 1..2**31
+LEVELS = 32
+ROOT = 2 ** (LEVELS - 1)
+
+
+def update_path_sql(quantity: str) -> str:
+    """SELECT of the nodes covering the SQL expression `quantity` (what a Fenwick add touches)."""
+    q = f"(({quantity})::bigint - 1)"
+    return (
+        f"SELECT ((({q} >> b) + 1) << b) AS node FROM generate_series(0, {LEVELS - 1}) AS b "
+        f"WHERE (({q} >> b) + 1) & 1 = 1"
+    )
+
+
+def _prefix_path_sql(quantity: str) -> str:
+    """SELECT of the nodes whose sum is the holders with at most `quantity` shares."""
+    q = f"({quantity})::bigint"
+    return f"SELECT (({q} >> b) << b) AS node FROM generate_series(0, {LEVELS - 1}) AS b WHERE ({q} >> b) & 1 = 1"
+
+
+def standings(coop_id: int):
+    """The cooperative's non-empty holdings in leaderboard order."""
+    return ShareHolding.objects.filter(cooperative_id=coop_id, quantity__gt=0).order_by("-quantity", "user_id")
+
+
+def competition_ranks(quantities: list[int]) -> list[int]:
+    """Ranks of a leaderboard prefix, given its quantities in standings() order."""
+    ranks = []
+    for position, quantity in enumerate(quantities):
+        ranks.append(ranks[-1] if position and quantity == quantities[position - 1] else position + 1)
+    return ranks
+
+
+def ranks(user_id: int, coop_ids: list[int] | None = None) -> dict[int, int]:
+    """{coop_id: rank} of every (or each listed) cooperative the user holds shares in, in one query."""
+    nodes = LeaderboardNode._meta.db_table
+    deltas = LeaderboardDelta._meta.db_table
+    coop_filter = "AND cooperative_id = ANY(%(coops)s)" if coop_ids is not None else ""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH mine AS (
+                SELECT cooperative_id, quantity FROM {ShareHolding._meta.db_table}
+                WHERE user_id = %(user)s AND quantity > 0 {coop_filter}
+            ),
+            wanted AS (
+                SELECT m.cooperative_id, p.node, p.sign
+                FROM mine m
+                CROSS JOIN LATERAL (
+                    SELECT %(root)s::bigint AS node, 1 AS sign
+                    UNION ALL
+                    SELECT node, -1 FROM ({_prefix_path_sql("m.quantity")}) AS prefix
+                ) AS p
+            )
+            SELECT
+                w.cooperative_id,
+                1 + SUM(w.sign * (
+                    COALESCE(n.holders, 0)
+                    + COALESCE((
+                        SELECT SUM(d.holders) FROM {deltas} d
+                        WHERE d.cooperative_id = w.cooperative_id AND d.node = w.node
+                    ), 0)
+                ))
+            FROM wanted w
+            LEFT JOIN {nodes} n ON n.cooperative_id = w.cooperative_id AND n.node = w.node
+            GROUP BY w.cooperative_id
+            """,
+            {"user": user_id, "coops": coop_ids, "root": ROOT},
+        )
+        return {coop_id: int(rank) for coop_id, rank in cursor.fetchall()}
+
+
+def rank(coop_id: int, user_id: int) -> int | None:
+    """The user's rank in the cooperative, None when they hold no shares there."""
+    return ranks(user_id, [coop_id]).get(coop_id)
+
+
+@transaction.atomic
+def compact(coop_id: int) -> None:
+    """Fold the coop's pending deltas into its LeaderboardNode rows."""
+    nodes = LeaderboardNode._meta.db_table
+    deltas = LeaderboardDelta._meta.db_table
+    with connection.cursor() as cursor:
+        # As in ownership.compact, the DELETE makes a concurrent compaction skip these rows
+        cursor.execute(
+            f"""
+            WITH folded AS (
+                DELETE FROM {deltas} WHERE cooperative_id = %(coop)s
+                RETURNING node, holders
+            )
+            INSERT INTO {nodes} (cooperative_id, node, holders)
+            SELECT %(coop)s, node, SUM(holders) FROM folded GROUP BY node
+            ON CONFLICT (cooperative_id, node) DO UPDATE SET holders = {nodes}.holders + EXCLUDED.holders
+            """,
+            {"coop": coop_id},
+        )
+
+
+def _tree_from_holdings_sql() -> str:
+    # Grouped by quantity first: the paths are expanded per distinct quantity, not per holder
+    return f"""
+        SELECT path.node, SUM(h.holders)::int AS holders
+        FROM (
+            SELECT quantity, COUNT(*) AS holders FROM {ShareHolding._meta.db_table}
+            WHERE cooperative_id = %(coop)s AND quantity > 0
+            GROUP BY quantity
+        ) AS h
+        CROSS JOIN LATERAL ({update_path_sql("h.quantity")}) AS path
+        GROUP BY path.node
+    """
+
+
+def verify(coop_id: int) -> list[str]:
+    """Compare the coop's tree with its holdings; returns human readable drift lines."""
+    nodes = LeaderboardNode._meta.db_table
+    deltas = LeaderboardDelta._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH kept AS (
+                SELECT node, SUM(holders) AS holders FROM (
+                    SELECT node, holders FROM {nodes} WHERE cooperative_id = %(coop)s
+                    UNION ALL
+                    SELECT node, holders FROM {deltas} WHERE cooperative_id = %(coop)s
+                ) AS t
+                GROUP BY node
+            ),
+            actual AS ({_tree_from_holdings_sql()})
+            SELECT COUNT(*), MIN(COALESCE(k.node, a.node))
+            FROM kept k FULL JOIN actual a USING (node)
+            WHERE COALESCE(k.holders, 0) <> COALESCE(a.holders, 0)
+            """,
+            {"coop": coop_id},
+        )
+        differing, first = cursor.fetchone()
+    if not differing:
+        return []
+    return [f"coop {coop_id} leaderboard: {differing} node(s) differ from the holdings, first at node {first}"]
+
+
+@transaction.atomic
+def rebuild(coop_id: int) -> None:
+    """Recompute a cooperative's tree from its holdings."""
+    nodes = LeaderboardNode._meta.db_table
+    deltas = LeaderboardDelta._meta.db_table
+    with connection.cursor() as cursor:
+        # One statement, one snapshot (see ownership.rebuild). Nodes the holdings
+        # no longer reach are zeroed rather than deleted: a DELETE and an upsert
+        # of the same rows cannot share a statement.
+        cursor.execute(
+            f"""
+            WITH dropped AS (
+                DELETE FROM {deltas} WHERE cooperative_id = %(coop)s
+            ),
+            actual AS ({_tree_from_holdings_sql()})
+            INSERT INTO {nodes} (cooperative_id, node, holders)
+            SELECT %(coop)s, node, COALESCE(a.holders, 0)
+            FROM actual a
+            FULL JOIN (SELECT node FROM {nodes} WHERE cooperative_id = %(coop)s) AS k USING (node)
+            ON CONFLICT (cooperative_id, node) DO UPDATE SET holders = EXCLUDED.holders
+            """,
+            {"coop": coop_id},
+        )
@@ -0,0 +1,109 @@
+"""
+Point-in-time holdings from the append-only share ledger.
+
+Entries are written by shares.holdings and shares.liquidity; this module only
+reads them. Positions at time T are the nearest HoldingSnapshot at or before T
+plus the ledger entries between that snapshot and T, summed in the database,
+so cap_table()/as_of() cost one snapshot read plus one grouped scan of the
+tail no matter how long the ledger gets. Snapshots are packed arrays
+(shares.captable), so reading one is a single blob however many holders the
+coop has. Take snapshots regularly (`manage.py snapshot_holdings`); the
+distribution worker also takes one after each project's shares are credited.
+"""
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from coops.models import Cooperative
+from . import captable
+from .captable import CapTable
+from .models import HoldingSnapshot, ShareLedgerEntry
+
+# Entries are stamped with their transaction's start time, so a long transaction
+# can commit an entry older than "now". Snapshots stay this far behind the clock
+# so they never seal a window that can still receive entries.
+SNAPSHOT_LAG = timedelta(minutes=5)
+
+
+class Position(NamedTuple):
+    held: int
+    listed: int
+
+    @property
+    def total(self) -> int:
+        """Shares owned: held plus reserved in active listings."""
+        return self.held + self.listed
+
+
+def cap_table(coop: Cooperative, at: datetime) -> CapTable:
+    """Every user's non-empty position in `coop` at `at`, as arrays (shares.captable)."""
+    snapshot = (
+        HoldingSnapshot.objects
+        .filter(cooperative_id=coop.id, taken_at__lte=at)
+        .order_by("-taken_at")
+        .first()
+    )
+
+    table = captable.EMPTY
+    entries = ShareLedgerEntry.objects.filter(cooperative_id=coop.id, created_at__lte=at)
+    if snapshot is not None:
+        table = captable.unpack(snapshot.positions)
+        entries = entries.filter(created_at__gt=snapshot.taken_at)
+
+    tail = np.array(
+        entries.values_list("user_id").annotate(
+            held=Sum("delta", filter=Q(bucket=ShareLedgerEntry.Bucket.HELD), default=0),
+            listed=Sum("delta", filter=Q(bucket=ShareLedgerEntry.Bucket.LISTED), default=0),
+        ).order_by(),
+        dtype=np.int64,
+    )
+    if not len(tail):
+        return table
+    return captable.merge(table, tail[:, 0], tail[:, 1], tail[:, 2])
+
+
+def as_of(coop: Cooperative, at: datetime) -> dict[int, Position]:
+    """Every user's non-empty position in `coop` at `at`, as {user_id: Position}."""
+    table = cap_table(coop, at)
+    return {
+        user_id: Position(held, listed)
+        for user_id, held, listed in zip(table.user_ids.tolist(), table.held.tolist(), table.listed.tolist())
+    }
+
+
+@transaction.atomic
+def take_snapshot(coop: Cooperative, *, at: datetime | None = None) -> HoldingSnapshot:
+    """
+    Compact the ledger of `coop` up to `at` (default: now minus SNAPSHOT_LAG)
+    into a snapshot. Built from the previous snapshot plus the new entries,
+    so each run only reads the movements since the last one.
+    """
+    at = at or timezone.now() - SNAPSHOT_LAG
+    existing = HoldingSnapshot.objects.filter(cooperative_id=coop.id, taken_at=at).first()
+    if existing is not None:
+        return existing
+
+    table = cap_table(coop, at)
+    return HoldingSnapshot.objects.create(
+        cooperative_id=coop.id, taken_at=at, holders=table.holders, positions=captable.pack(table)
+    )
+
+
+def prune_snapshots(coop: Cooperative, *, keep: int) -> int:
+    """
+    Delete all but the newest `keep` snapshots of `coop`; returns how many were
+    deleted. Snapshots a distribution job points at are the cap table after
+    that distribution and are never pruned (nor counted towards `keep`).
+    """
+    stale = (
+        HoldingSnapshot.objects
+        .filter(cooperative_id=coop.id, distribution_jobs__isnull=True)
+        .order_by("-taken_at")
+        .values_list("id", flat=True)[keep:]
+    )
+    _, deleted = HoldingSnapshot.objects.filter(id__in=list(stale)).delete()
+    return deleted.get(HoldingSnapshot._meta.label, 0)
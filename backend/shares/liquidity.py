@@ -0,0 +1,211 @@
+"""
+Secondary-market liquidity book.
+
+Keeps the quantity offered in ACTIVE listings per cooperative and per seller,
+so "how much can this buyer get from the secondary market" is a lookup and a
+subtraction instead of a Sum() over every active listing.
+
+All writers must call these helpers inside the same transaction that changes
+the listings (see shares.services). Each change also appends the matching
+LISTED entry to the share ledger, tagged with `kind` (a ShareLedgerEntry.Kind),
+and invalidates the cached marketplace pages on commit.
+"""
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from . import marketplace
+from .models import CooperativeLiquidity, SellerLiquidity, ShareLedgerEntry, ShareListing
+
+
+def listing_added(*, coop_id: int, seller_id: int, quantity: int, kind: str) -> None:
+    """Record `quantity` newly offered by `seller_id` in `coop_id`."""
+    if quantity <= 0:
+        return
+
+    coop_table = CooperativeLiquidity._meta.db_table
+    seller_table = SellerLiquidity._meta.db_table
+    ledger = ShareLedgerEntry._meta.db_table
+    with connection.cursor() as cursor:
+        # Seller row first, then the coop row: the same order as listings_reduced,
+        # so a listing being created and one being bought can't deadlock.
+        cursor.execute(
+            f"""
+            WITH entries AS (
+                INSERT INTO {ledger} (cooperative_id, user_id, bucket, kind, delta, created_at)
+                VALUES (%(coop)s, %(seller)s, %(bucket)s, %(kind)s, %(quantity)s, now())
+            )
+            INSERT INTO {seller_table} (cooperative_id, seller_id, listed_quantity)
+            VALUES (%(coop)s, %(seller)s, %(quantity)s)
+            ON CONFLICT (cooperative_id, seller_id)
+            DO UPDATE SET listed_quantity = {seller_table}.listed_quantity + EXCLUDED.listed_quantity
+            """,
+            {
+                "coop": coop_id,
+                "seller": seller_id,
+                "quantity": quantity,
+                "bucket": ShareLedgerEntry.Bucket.LISTED,
+                "kind": kind,
+            },
+        )
+        cursor.execute(
+            f"""
+            INSERT INTO {coop_table} (cooperative_id, listed_quantity)
+            VALUES (%s, %s)
+            ON CONFLICT (cooperative_id)
+            DO UPDATE SET listed_quantity = {coop_table}.listed_quantity + EXCLUDED.listed_quantity
+            """,
+            [coop_id, quantity],
+        )
+    marketplace.invalidate()
+
+
+def listings_reduced(*, coop_id: int, reductions: dict[int, int], kind: str) -> None:
+    """
+    Record that sellers' active listed quantity went down (sold or canceled).
+    `reductions` maps seller_id -> quantity removed from the book.
+    """
+    reductions = {seller_id: qty for seller_id, qty in reductions.items() if qty > 0}
+    if not reductions:
+        return
+
+    coop_table = CooperativeLiquidity._meta.db_table
+    seller_table = SellerLiquidity._meta.db_table
+    ledger = ShareLedgerEntry._meta.db_table
+    with connection.cursor() as cursor:
+        # Seller rows in seller_id order (as rebuild() takes them), then the coop row
+        cursor.execute(
+            f"""
+            WITH v AS (
+                SELECT * FROM unnest(%(sellers)s::bigint[], %(quantities)s::bigint[]) AS v(seller_id, qty)
+            ),
+            entries AS (
+                INSERT INTO {ledger} (cooperative_id, user_id, bucket, kind, delta, created_at)
+                SELECT %(coop)s, seller_id, %(bucket)s, %(kind)s, -qty, now()
+                FROM v
+            ),
+            locked AS MATERIALIZED (
+                SELECT id FROM {seller_table}
+                WHERE cooperative_id = %(coop)s AND seller_id IN (SELECT seller_id FROM v)
+                ORDER BY seller_id
+                FOR UPDATE
+            )
+            UPDATE {seller_table} AS s
+            SET listed_quantity = s.listed_quantity - v.qty
+            FROM v
+            WHERE s.cooperative_id = %(coop)s AND s.seller_id = v.seller_id AND s.id IN (SELECT id FROM locked)
+            """,
+            {
+                "coop": coop_id,
+                "sellers": list(reductions.keys()),
+                "quantities": list(reductions.values()),
+                "bucket": ShareLedgerEntry.Bucket.LISTED,
+                "kind": kind,
+            },
+        )
+        cursor.execute(
+            f"""
+            UPDATE {coop_table}
+            SET listed_quantity = listed_quantity - %s
+            WHERE cooperative_id = %s
+            """,
+            [sum(reductions.values()), coop_id],
+        )
+    marketplace.invalidate()
+
+
+def secondary_available(*, coop_id: int, exclude_seller_id: int | None = None) -> int:
+    """Active listed quantity in a cooperative, optionally excluding one seller's own listings."""
+    total = (
+        CooperativeLiquidity.objects
+        .filter(cooperative_id=coop_id)
+        .values_list("listed_quantity", flat=True)
+        .first()
+        or 0
+    )
+    if exclude_seller_id is not None:
+        own = (
+            SellerLiquidity.objects
+            .filter(cooperative_id=coop_id, seller_id=exclude_seller_id)
+            .values_list("listed_quantity", flat=True)
+            .first()
+            or 0
+        )
+        total -= own
+    return int(total)
+
+
+def secondary_totals_for_buyer(buyer) -> dict[int, int]:
+    """Secondary availability for every cooperative, excluding `buyer`'s own listings."""
+    totals = dict(CooperativeLiquidity.objects.values_list("cooperative_id", "listed_quantity"))
+    if buyer is not None and buyer.is_authenticated:
+        own = SellerLiquidity.objects.filter(seller=buyer, listed_quantity__gt=0)
+        for coop_id, qty in own.values_list("cooperative_id", "listed_quantity"):
+            totals[coop_id] = totals.get(coop_id, 0) - qty
+    return {coop_id: int(qty) for coop_id, qty in totals.items()}
+
+
+def _actual_totals(coop_id: int) -> tuple[int, dict[int, int]]:
+    per_seller = {
+        row["seller_id"]: int(row["total"] or 0)
+        for row in (
+            ShareListing.objects
+            .filter(cooperative_id=coop_id, status=ShareListing.Status.ACTIVE)
+            .values("seller_id")
+            .annotate(total=Sum("quantity_available"))
+        )
+    }
+    return sum(per_seller.values()), per_seller
+
+
+def verify(coop_id: int) -> list[str]:
+    """Compare the book with the listings of one cooperative; returns human readable drift lines."""
+    actual_total, actual_sellers = _actual_totals(coop_id)
+    book_total = secondary_available(coop_id=coop_id)
+    book_sellers = dict(
+        SellerLiquidity.objects
+        .filter(cooperative_id=coop_id)
+        .values_list("seller_id", "listed_quantity")
+    )
+
+    drift = []
+    if book_total != actual_total:
+        drift.append(f"coop {coop_id}: book={book_total} actual={actual_total}")
+    for seller_id in sorted(set(actual_sellers) | set(book_sellers)):
+        book = int(book_sellers.get(seller_id, 0))
+        actual = actual_sellers.get(seller_id, 0)
+        if book != actual:
+            drift.append(f"coop {coop_id} seller {seller_id}: book={book} actual={actual}")
+    return drift
+
+
+@transaction.atomic
+def rebuild(coop_id: int) -> None:
+    """Recompute the book of one cooperative from its ACTIVE listings."""
+    # The writers' order: the coop's seller rows by seller_id, then its book row.
+    # Writers that got there first finish before the recount reads their
+    # listings; later ones queue behind us and apply their deltas on top.
+    list(
+        SellerLiquidity.objects.select_for_update()
+        .filter(cooperative_id=coop_id)
+        .order_by("seller_id")
+        .values_list("id", flat=True)
+    )
+    CooperativeLiquidity.objects.get_or_create(cooperative_id=coop_id)
+    book = CooperativeLiquidity.objects.select_for_update().get(cooperative_id=coop_id)
+
+    actual_total, actual_sellers = _actual_totals(coop_id)
+
+    book.listed_quantity = actual_total
+    book.save(update_fields=["listed_quantity"])
+
+    SellerLiquidity.objects.filter(cooperative_id=coop_id).exclude(seller_id__in=actual_sellers).delete()
+    SellerLiquidity.objects.bulk_create(
+        [
+            SellerLiquidity(cooperative_id=coop_id, seller_id=seller_id, listed_quantity=qty)
+            for seller_id, qty in actual_sellers.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["cooperative", "seller"],
+        update_fields=["listed_quantity"],
+    )
+    marketplace.invalidate()
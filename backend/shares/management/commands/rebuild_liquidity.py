@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from coops.models import Cooperative
+from shares import liquidity
+from taavonyar.db import without_statement_timeout
+
+
+class Command(BaseCommand):
+    help = "Verify and/or rebuild the secondary-market liquidity book from ACTIVE listings."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--coop", type=int, action="append", dest="coops", help="Cooperative id (repeatable). Defaults to all.")
+        parser.add_argument("--verify", action="store_true", help="Only report drift, do not repair.")
+
+    @without_statement_timeout
+    def handle(self, *args, coops=None, verify=False, **options):
+        coop_ids = coops or list(Cooperative.objects.order_by("id").values_list("id", flat=True))
+
+        drifted = 0
+        for coop_id in coop_ids:
+            drift = liquidity.verify(coop_id)
+            if not drift:
+                continue
+            drifted += 1
+            for line in drift:
+                self.stdout.write(line)
+            if not verify:
+                liquidity.rebuild(coop_id)
+                self.stdout.write(self.style.SUCCESS(f"coop {coop_id}: rebuilt"))
+
+        if verify and drifted:
+            raise CommandError(f"{drifted} cooperative(s) have liquidity drift")
+        self.stdout.write(self.style.SUCCESS(f"Checked {len(coop_ids)} cooperative(s), {drifted} with drift."))
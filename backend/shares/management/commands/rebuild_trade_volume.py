@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from coops.models import Cooperative
+from shares import volume
+from taavonyar.db import without_statement_timeout
+
+
+class Command(BaseCommand):
+    help = "Backfill or rebuild the daily/monthly trade-volume rollups from ShareTrade."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--coop", type=int, action="append", dest="coops", help="Cooperative id (repeatable). Defaults to all.")
+
+    @without_statement_timeout
+    def handle(self, *args, coops=None, **options):
+        coop_ids = coops or list(Cooperative.objects.order_by("id").values_list("id", flat=True))
+        for coop_id in coop_ids:
+            volume.rebuild(coop_id)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt trade volume for {len(coop_ids)} cooperative(s)."))
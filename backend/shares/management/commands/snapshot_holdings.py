@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from coops.models import Cooperative
+from shares import ledger
+from taavonyar.db import without_statement_timeout
+
+
+class Command(BaseCommand):
+    help = "Compact the share ledger into point-in-time holding snapshots (run periodically, e.g. nightly)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--coop", type=int, action="append", dest="coops", help="Cooperative id (repeatable). Defaults to all.")
+        parser.add_argument("--keep", type=int, default=0, help="Keep only the newest N snapshots per cooperative (0 keeps all).")
+
+    @without_statement_timeout
+    def handle(self, *args, coops=None, keep=0, **options):
+        queryset = Cooperative.objects.order_by("id")
+        if coops:
+            queryset = queryset.filter(id__in=coops)
+
+        for coop in queryset:
+            snapshot = ledger.take_snapshot(coop)
+            line = f"coop {coop.id}: snapshot at {snapshot.taken_at:%Y-%m-%d %H:%M:%S}"
+            if keep:
+                line += f", pruned {ledger.prune_snapshots(coop, keep=keep)}"
+            self.stdout.write(line)
+
+        self.stdout.write(self.style.SUCCESS("Done."))
@@ -0,0 +1,125 @@
+"""
+Marketplace overview: primary and secondary availability per cooperative.
+
+coops_with_availability() is one annotated query over the cooperatives: the
+primary column plus striped slots and the liquidity book's listed total come
+in as subqueries, so the page no longer joins Python dicts per coop.
+
+Pages of that query are cached in the "marketplace" cache namespace (see
+taavonyar.cache). They don't depend on who is looking: the viewer's own
+listings are subtracted afterwards with one small query. Anything that changes
+listed quantities or primary inventory calls invalidate() inside its
+transaction; coop edits do so through the post_save receiver below.
+"""
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import F, IntegerField, OuterRef, Q, QuerySet, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from coops.models import Cooperative, PrimaryShareSlot
+from taavonyar.cache import bump_version, digest, versioned_key
+from .models import CooperativeLiquidity, SellerLiquidity, ShareHolding
+
+NAMESPACE = "marketplace"
+
+PER_PAGE = 25
+
+# Entries outlive no more than this even if an invalidation is missed
+CACHE_TIMEOUT = 30
+
+
+def invalidate() -> None:
+    bump_version(NAMESPACE)
+
+
+@receiver(post_save, sender=Cooperative)
+@receiver(post_delete, sender=Cooperative)
+def _cooperative_changed(sender, **kwargs):
+    invalidate()
+
+
+def coops_with_availability() -> QuerySet:
+    """Cooperatives annotated with `primary`, `secondary` (all active listings) and `total`."""
+    striped = (
+        PrimaryShareSlot.objects
+        .filter(cooperative=OuterRef("pk"))
+        .values("cooperative")
+        .annotate(total=Sum("available"))
+        .values("total")
+    )
+    listed = CooperativeLiquidity.objects.filter(cooperative=OuterRef("pk")).values("listed_quantity")
+    return (
+        Cooperative.objects
+        .annotate(
+            primary=F("available_primary_shares") + Coalesce(Subquery(striped), Value(0), output_field=IntegerField()),
+            secondary=Coalesce(Subquery(listed), Value(0), output_field=IntegerField()),
+        )
+        .annotate(total=F("primary") + F("secondary"))
+    )
+
+
+def page(*, number, coop_id: int | None = None, search: str = "", available_only: bool = False) -> dict:
+    """One page of marketplace rows as plain dicts, from the cache when possible."""
+    # Searches and page numbers are whatever visitors type: the search goes into
+    # the key hashed, the page as an int, and a page is only cached under the
+    # number the paginator resolved it to (so ?page=<anything> adds no entries)
+    try:
+        number = max(int(number), 1)
+    except (TypeError, ValueError):
+        number = 1
+
+    def key_for(n: int) -> str:
+        return versioned_key(NAMESPACE, "page", coop_id or "", digest(search.lower()), int(available_only), n)
+
+    cached = cache.get(key_for(number))
+    if cached is not None:
+        return cached
+
+    coops = coops_with_availability()
+    if coop_id:
+        coops = coops.filter(id=coop_id)
+    if search:
+        coops = coops.filter(Q(name__icontains=search) | Q(village__icontains=search))
+    if available_only:
+        coops = coops.filter(total__gt=0)
+    coops = coops.order_by("name").values(
+        "id", "name", "village", "price_per_share", "primary", "secondary", "total"
+    )
+
+    p = Paginator(coops, PER_PAGE).get_page(number)
+    result = {
+        "rows": list(p.object_list),
+        "number": p.number,
+        "num_pages": p.paginator.num_pages,
+        "count": p.paginator.count,
+    }
+    cache.set(key_for(p.number), result, CACHE_TIMEOUT)
+    return result
+
+
+def sellable_coops(user) -> list[tuple[int, str, int]]:
+    """(id, name, shares held) of the cooperatives `user` can list shares in."""
+    return list(
+        ShareHolding.objects
+        .filter(user=user, quantity__gt=0)
+        .order_by("cooperative__name")
+        .values_list("cooperative_id", "cooperative__name", "quantity")
+    )
+
+
+def rows_for_buyer(rows: list[dict], buyer) -> list[dict]:
+    """Copy `rows` with the buyer's own listings taken out of the secondary figures."""
+    own = {}
+    if buyer is not None and buyer.is_authenticated and rows:
+        own = dict(
+            SellerLiquidity.objects
+            .filter(seller=buyer, listed_quantity__gt=0, cooperative_id__in=[r["id"] for r in rows])
+            .values_list("cooperative_id", "listed_quantity")
+        )
+    result = []
+    for r in rows:
+        secondary = r["secondary"] - own.get(r["id"], 0)
+        result.append({**r, "secondary": secondary, "total_for_buyer": r["primary"] + secondary})
+    return result
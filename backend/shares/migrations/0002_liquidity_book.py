@@ -0,0 +1,53 @@
+# Generated by Django 5.1.4 on 2026-10-17 12:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coops', '0003_cooperative_available_primary_shares'),
+        ('shares', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CooperativeLiquidity',
+            fields=[
+                ('cooperative', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='liquidity', serialize=False, to='coops.cooperative')),
+                ('listed_quantity', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SellerLiquidity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('listed_quantity', models.PositiveBigIntegerField(default=0)),
+                ('cooperative', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seller_liquidity', to='coops.cooperative')),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='listed_liquidity', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('cooperative', 'seller')},
+            },
+        ),
+        # Backfill the book from the listings that are already ACTIVE
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO shares_sellerliquidity (cooperative_id, seller_id, listed_quantity)
+                SELECT cooperative_id, seller_id, SUM(quantity_available)
+                FROM shares_sharelisting
+                WHERE status = 'ACTIVE'
+                GROUP BY cooperative_id, seller_id;
+
+                INSERT INTO shares_cooperativeliquidity (cooperative_id, listed_quantity)
+                SELECT cooperative_id, SUM(quantity_available)
+                FROM shares_sharelisting
+                WHERE status = 'ACTIVE'
+                GROUP BY cooperative_id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.1.4 on 2026-10-17 12:47
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the indexes without blocking writes on large tables
+    atomic = False
+
+    dependencies = [
+        ('coops', '0003_cooperative_available_primary_shares'),
+        ('shares', '0002_liquidity_book'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='shareholding',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['cooperative', '-quantity'], name='holding_coop_quantity_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='sharelisting',
+            index=models.Index(condition=models.Q(('status', 'ACTIVE')), fields=['cooperative', 'created_at', 'id'], name='listing_active_fifo_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='sharetrade',
+            index=models.Index(fields=['buyer', '-created_at'], include=('cooperative', 'seller', 'quantity', 'price_per_share', 'total_price'), name='trade_buyer_recent_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='sharetrade',
+            index=models.Index(condition=models.Q(('seller__isnull', False)), fields=['seller', '-created_at'], include=('cooperative', 'buyer', 'quantity', 'price_per_share', 'total_price'), name='trade_seller_recent_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='sharetrade',
+            index=models.Index(fields=['cooperative', '-created_at'], name='trade_coop_recent_idx'),
+        ),
+        # Legacy rows may have been left ACTIVE at zero before the constraint existed
+        migrations.RunSQL(
+            sql="UPDATE shares_sharelisting SET status = 'SOLD_OUT' WHERE status = 'ACTIVE' AND quantity_available = 0;",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='sharelisting',
+            constraint=models.CheckConstraint(condition=models.Q(models.Q(('status', 'ACTIVE'), _negated=True), ('quantity_available__gt', 0), _connector='OR'), name='listing_active_has_quantity'),
+        ),
+        migrations.AddConstraint(
+            model_name='sharetrade',
+            constraint=models.CheckConstraint(condition=models.Q(('quantity__gt', 0)), name='trade_quantity_positive'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.1.4 on 2026-10-17 13:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coops', '0004_primary_share_slots'),
+        ('shares', '0003_hot_path_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HoldingSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('cooperative', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holding_snapshots', to='coops.cooperative')),
+            ],
+            options={
+                'unique_together': {('cooperative', 'taken_at')},
+            },
+        ),
+        migrations.CreateModel(
+            name='HoldingSnapshotLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('held', models.PositiveBigIntegerField(default=0)),
+                ('listed', models.PositiveBigIntegerField(default=0)),
+                ('snapshot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='shares.holdingsnapshot')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('snapshot', 'user')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ShareLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.CharField(choices=[('HELD', 'Held'), ('LISTED', 'Listed')], max_length=10)),
+                ('kind', models.CharField(choices=[('OPENING', 'Opening balance'), ('PURCHASE', 'Purchase'), ('SALE', 'Sale'), ('LISTING', 'Listing'), ('UNLISTING', 'Listing canceled'), ('DISTRIBUTION', 'Project distribution')], max_length=20)),
+                ('delta', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('cooperative', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='coops.cooperative')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='share_ledger_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['cooperative', 'created_at'], name='ledger_coop_time_idx')],
+            },
+        ),
+        # Open the ledger with everyone's current position; history before this point is not recoverable
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO shares_shareledgerentry (cooperative_id, user_id, bucket, kind, delta, created_at)
+                SELECT cooperative_id, user_id, 'HELD', 'OPENING', quantity, now()
+                FROM shares_shareholding
+                WHERE quantity > 0;
+
+                INSERT INTO shares_shareledgerentry (cooperative_id, user_id, bucket, kind, delta, created_at)
+                SELECT cooperative_id, seller_id, 'LISTED', 'OPENING', SUM(quantity_available), now()
+                FROM shares_sharelisting
+                WHERE status = 'ACTIVE'
+                GROUP BY cooperative_id, seller_id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
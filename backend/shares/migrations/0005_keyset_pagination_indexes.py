@@ -0,0 +1,39 @@
+# Generated by Django 5.1.4 on 2026-10-17 13:07
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the indexes without blocking writes on large tables
+    atomic = False
+
+    dependencies = [
+        ('coops', '0004_primary_share_slots'),
+        ('shares', '0004_share_ledger'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        RemoveIndexConcurrently(
+            model_name='sharetrade',
+            name='trade_buyer_recent_idx',
+        ),
+        RemoveIndexConcurrently(
+            model_name='sharetrade',
+            name='trade_seller_recent_idx',
+        ),
+        AddIndexConcurrently(
+            model_name='sharelisting',
+            index=models.Index(fields=['seller', '-created_at', '-id'], name='listing_seller_recent_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='sharetrade',
+            index=models.Index(fields=['buyer', '-created_at', '-id'], include=('cooperative', 'seller', 'quantity', 'price_per_share', 'total_price'), name='trade_buyer_recent_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='sharetrade',
+            index=models.Index(condition=models.Q(('seller__isnull', False)), fields=['seller', '-created_at', '-id'], include=('cooperative', 'buyer', 'quantity', 'price_per_share', 'total_price'), name='trade_seller_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.1.4 on 2026-10-17 13:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coops', '0005_export_jobs'),
+        ('shares', '0005_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TradeVolumeBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('DAY', 'Day'), ('MONTH', 'Month')], max_length=10)),
+                ('bucket_start', models.DateField()),
+                ('trade_count', models.PositiveIntegerField(default=0)),
+                ('share_count', models.PositiveBigIntegerField(default=0)),
+                ('value', models.PositiveBigIntegerField(default=0)),
+                ('primary_trade_count', models.PositiveIntegerField(default=0)),
+                ('primary_share_count', models.PositiveBigIntegerField(default=0)),
+                ('primary_value', models.PositiveBigIntegerField(default=0)),
+                ('cooperative', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='volume_buckets', to='coops.cooperative')),
+            ],
+            options={
+                'unique_together': {('cooperative', 'period', 'bucket_start')},
+            },
+        ),
+        # Backfill from existing trades (UTC days, the project's TIME_ZONE)
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO shares_tradevolumebucket
+                    (cooperative_id, period, bucket_start, trade_count, share_count, value,
+                     primary_trade_count, primary_share_count, primary_value)
+                SELECT cooperative_id, p.period,
+                       CASE p.period WHEN 'DAY' THEN d.day ELSE date_trunc('month', d.day)::date END,
+                       COUNT(*), SUM(quantity), SUM(total_price),
+                       COUNT(*) FILTER (WHERE seller_id IS NULL),
+                       COALESCE(SUM(quantity) FILTER (WHERE seller_id IS NULL), 0),
+                       COALESCE(SUM(total_price) FILTER (WHERE seller_id IS NULL), 0)
+                FROM shares_sharetrade
+                CROSS JOIN LATERAL (SELECT (created_at AT TIME ZONE 'UTC')::date AS day) AS d
+                CROSS JOIN (VALUES ('DAY'), ('MONTH')) AS p(period)
+                GROUP BY cooperative_id, p.period, 3;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
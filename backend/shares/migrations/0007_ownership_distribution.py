@@ -0,0 +1,45 @@
+# Generated by Django 5.1.4 on 2026-10-17 14:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coops', '0006_export_job_volume_kind'),
+        ('shares', '0006_trade_volume_buckets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OwnershipDistribution',
+            fields=[
+                ('cooperative', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ownership', serialize=False, to='coops.cooperative')),
+                ('holders', models.PositiveIntegerField(default=0)),
+                ('total_held', models.PositiveBigIntegerField(default=0)),
+                ('sum_squares', models.DecimalField(decimal_places=0, default=0, max_digits=40)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OwnershipDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('holders', models.IntegerField()),
+                ('total_held', models.BigIntegerField()),
+                ('sum_squares', models.DecimalField(decimal_places=0, max_digits=40)),
+                ('cooperative', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='coops.cooperative')),
+            ],
+        ),
+        # Backfill from the holdings that already exist
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO shares_ownershipdistribution (cooperative_id, holders, total_held, sum_squares)
+                SELECT cooperative_id, COUNT(*), SUM(quantity), SUM(quantity::numeric * quantity)
+                FROM shares_shareholding
+                WHERE quantity > 0
+                GROUP BY cooperative_id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
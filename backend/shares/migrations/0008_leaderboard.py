@@ -0,0 +1,57 @@
+# Generated by Django 5.1.4 on 2026-10-17 14:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coops', '0006_export_job_volume_kind'),
+        ('shares', '0007_ownership_distribution'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('node', models.BigIntegerField()),
+                ('holders', models.IntegerField()),
+                ('cooperative', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='coops.cooperative')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['cooperative', 'node'], name='leaderboard_delta_node_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LeaderboardNode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('node', models.BigIntegerField()),
+                ('holders', models.IntegerField(default=0)),
+                ('cooperative', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='coops.cooperative')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('cooperative', 'node'), name='leaderboard_node_unique')],
+            },
+        ),
+        # Backfill from the holdings that already exist: one Fenwick tree per coop
+        # over quantities 1..2**31 (see shares.leaderboard)
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO shares_leaderboardnode (cooperative_id, node, holders)
+                SELECT h.cooperative_id, ((((h.quantity::bigint - 1) >> b) + 1) << b), SUM(h.holders)
+                FROM (
+                    SELECT cooperative_id, quantity, COUNT(*) AS holders
+                    FROM shares_shareholding
+                    WHERE quantity > 0
+                    GROUP BY cooperative_id, quantity
+                ) AS h
+                CROSS JOIN generate_series(0, 31) AS b
+                WHERE (((h.quantity::bigint - 1) >> b) + 1) & 1 = 1
+                GROUP BY 1, 2;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.4 on 2026-10-17 14:37
+
+import numpy as np
+from django.db import migrations, models
+
+
+def pack_lines(apps, schema_editor):
+    # One blob per snapshot: int64 user ids (sorted), held, listed (see shares.captable)
+    HoldingSnapshot = apps.get_model("shares", "HoldingSnapshot")
+    HoldingSnapshotLine = apps.get_model("shares", "HoldingSnapshotLine")
+    for snapshot in HoldingSnapshot.objects.iterator():
+        lines = list(
+            HoldingSnapshotLine.objects
+            .filter(snapshot=snapshot)
+            .exclude(held=0, listed=0)
+            .order_by("user_id")
+            .values_list("user_id", "held", "listed")
+        )
+        snapshot.holders = len(lines)
+        snapshot.positions = np.array(lines, dtype=np.int64).reshape(-1, 3).T.tobytes()
+        snapshot.save(update_fields=["holders", "positions"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shares', '0008_leaderboard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='holdingsnapshot',
+            name='holders',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='holdingsnapshot',
+            name='positions',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.RunPython(pack_lines, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='HoldingSnapshotLine',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-17 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shares', '0009_packed_holding_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ownershipdistribution',
+            name='changes',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
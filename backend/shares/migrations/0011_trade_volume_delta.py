@@ -0,0 +1,30 @@
+# Generated by Django 5.1.4 on 2026-10-17 17:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coops', '0008_export_job_attempt'),
+        ('shares', '0010_ownership_changes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TradeVolumeDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('DAY', 'Day'), ('MONTH', 'Month')], max_length=10)),
+                ('bucket_start', models.DateField()),
+                ('trade_count', models.IntegerField()),
+                ('share_count', models.BigIntegerField()),
+                ('value', models.BigIntegerField()),
+                ('primary_trade_count', models.IntegerField()),
+                ('primary_share_count', models.BigIntegerField()),
+                ('primary_value', models.BigIntegerField()),
+                ('cooperative', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='coops.cooperative')),
+            ],
+        ),
+    ]
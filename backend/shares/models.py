@@ -1,5 +1,6 @@
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 
 class ShareHolding(models.Model):
@@ -9,6 +10,14 @@ class ShareHolding(models.Model):
 
     class Meta:
         unique_together = ("cooperative", "user")
+        indexes = [
+            # Cap table / top shareholders: cooperative's non-empty holdings by size
+            models.Index(
+                fields=["cooperative", "-quantity"],
+                condition=models.Q(quantity__gt=0),
+                name="holding_coop_quantity_idx",
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"{self.user} - {self.cooperative.name}: {self.quantity}"
@@ -31,6 +40,24 @@ class ShareListing(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # FIFO order book: only ACTIVE listings are ever swept
+            models.Index(
+                fields=["cooperative", "created_at", "id"],
+                condition=models.Q(status="ACTIVE"),
+                name="listing_active_fifo_idx",
+            ),
+            # "My listings" keyset pages
+            models.Index(fields=["seller", "-created_at", "-id"], name="listing_seller_recent_idx"),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=~models.Q(status="ACTIVE") | models.Q(quantity_available__gt=0),
+                name="listing_active_has_quantity",
+            ),
+        ]
+
     def __str__(self) -> str:
         return f"{self.cooperative.name} listing by {self.seller} ({self.quantity_available})"
 
@@ -52,6 +79,240 @@ class ShareTrade(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Per-user trade history (keyset pages on created_at, id), covering the columns the pages show
+            models.Index(
+                fields=["buyer", "-created_at", "-id"],
+                include=["cooperative", "seller", "quantity", "price_per_share", "total_price"],
+                name="trade_buyer_recent_idx",
+            ),
+            models.Index(
+                fields=["seller", "-created_at", "-id"],
+                include=["cooperative", "buyer", "quantity", "price_per_share", "total_price"],
+                condition=models.Q(seller__isnull=False),
+                name="trade_seller_recent_idx",
+            ),
+            # Board exports / coop trade log
+            models.Index(fields=["cooperative", "-created_at"], name="trade_coop_recent_idx"),
+        ]
+        constraints = [
+            models.CheckConstraint(condition=models.Q(quantity__gt=0), name="trade_quantity_positive"),
+        ]
+
     def __str__(self) -> str:
         who = "COOP" if self.seller is None else str(self.seller)
         return f"{who} -> {self.buyer} {self.quantity} @ {self.price_per_share}"
+
+
+class CooperativeLiquidity(models.Model):
+    """Total quantity currently offered in ACTIVE listings of a cooperative (maintained by shares.liquidity)."""
+
+    cooperative = models.OneToOneField(
+        "coops.Cooperative",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="liquidity",
+    )
+    listed_quantity = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"{self.cooperative.name}: {self.listed_quantity} listed"
+
+
+class OwnershipDistribution(models.Model):
+    """
+    Compacted ownership figures of a cooperative (maintained by shares.ownership).
+    The live figures are these plus the cooperative's OwnershipDelta rows.
+    """
+
+    cooperative = models.OneToOneField(
+        "coops.Cooperative",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="ownership",
+    )
+    holders = models.PositiveIntegerField(default=0)
+    total_held = models.PositiveBigIntegerField(default=0)
+    # Sum of squared holdings, for the Herfindahl index; outgrows bigint
+    sum_squares = models.DecimalField(max_digits=40, decimal_places=0, default=0)
+    # Holdings writes folded in so far (one per OwnershipDelta): with the pending
+    # deltas, a per-coop change counter (see ownership.changes)
+    changes = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"{self.cooperative.name}: {self.holders} holders, {self.total_held} shares"
+
+
+class OwnershipDelta(models.Model):
+    """
+    One holdings change's effect on OwnershipDistribution, appended by
+    shares.holdings in the writer's statement. Insert-only, so concurrent
+    writers never wait on each other; shares.ownership folds them in.
+    """
+
+    cooperative = models.ForeignKey("coops.Cooperative", on_delete=models.CASCADE, related_name="+")
+    holders = models.IntegerField()
+    total_held = models.BigIntegerField()
+    sum_squares = models.DecimalField(max_digits=40, decimal_places=0)
+
+
+class LeaderboardNode(models.Model):
+    """
+    Compacted node of a cooperative's shareholder leaderboard, a Fenwick tree
+    over holding quantities (maintained by shares.leaderboard). Node n counts
+    the holders whose quantity lies in (n - lowbit(n), n]; absent nodes are 0.
+    The live counts are these plus the cooperative's LeaderboardDelta rows.
+    """
+
+    cooperative = models.ForeignKey("coops.Cooperative", on_delete=models.CASCADE, related_name="+")
+    node = models.BigIntegerField()
+    holders = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["cooperative", "node"], name="leaderboard_node_unique"),
+        ]
+
+
+class LeaderboardDelta(models.Model):
+    """
+    One holdings change's effect on a LeaderboardNode, appended by
+    shares.holdings in the writer's statement. Insert-only, like OwnershipDelta.
+    """
+
+    cooperative = models.ForeignKey("coops.Cooperative", on_delete=models.CASCADE, related_name="+")
+    node = models.BigIntegerField()
+    holders = models.IntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["cooperative", "node"], name="leaderboard_delta_node_idx"),
+        ]
+
+
+class SellerLiquidity(models.Model):
+    """Quantity a seller currently offers in ACTIVE listings of a cooperative (maintained by shares.liquidity)."""
+
+    cooperative = models.ForeignKey("coops.Cooperative", on_delete=models.CASCADE, related_name="seller_liquidity")
+    seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="listed_liquidity")
+    listed_quantity = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("cooperative", "seller")
+
+    def __str__(self) -> str:
+        return f"{self.seller} - {self.cooperative.name}: {self.listed_quantity} listed"
+
+
+class ShareLedgerEntry(models.Model):
+    """
+    One movement of shares, appended by shares.holdings (HELD bucket) and
+    shares.liquidity (LISTED bucket). Rows are never updated or deleted:
+    a user's position at any time is the sum of their deltas up to then.
+    """
+
+    class Bucket(models.TextChoices):
+        HELD = "HELD", "Held"
+        LISTED = "LISTED", "Listed"
+
+    class Kind(models.TextChoices):
+        OPENING = "OPENING", "Opening balance"
+        PURCHASE = "PURCHASE", "Purchase"
+        SALE = "SALE", "Sale"
+        LISTING = "LISTING", "Listing"
+        UNLISTING = "UNLISTING", "Listing canceled"
+        DISTRIBUTION = "DISTRIBUTION", "Project distribution"
+
+    cooperative = models.ForeignKey("coops.Cooperative", on_delete=models.CASCADE, related_name="ledger_entries")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name="share_ledger_entries")
+    bucket = models.CharField(max_length=10, choices=Bucket.choices)
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    delta = models.BigIntegerField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Snapshot tails: a cooperative's movements in a time window
+            models.Index(fields=["cooperative", "created_at"], name="ledger_coop_time_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.user} - {self.cooperative.name}: {self.bucket} {self.delta:+d} ({self.kind})"
+
+
+class HoldingSnapshot(models.Model):
+    """
+    Compacted positions of a cooperative: every ledger entry with created_at <= taken_at, summed per user.
+    Stored as one packed array (shares.captable), not a row per holder.
+    """
+
+    cooperative = models.ForeignKey("coops.Cooperative", on_delete=models.CASCADE, related_name="holding_snapshots")
+    taken_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    holders = models.PositiveIntegerField(default=0)
+    # int64 3 x holders: user ids (sorted), held, listed; see shares.captable.pack
+    positions = models.BinaryField(default=b"")
+
+    class Meta:
+        unique_together = ("cooperative", "taken_at")
+
+    def __str__(self) -> str:
+        return f"{self.cooperative.name} @ {self.taken_at:%Y-%m-%d %H:%M}"
+
+
+class TradeVolumeBucket(models.Model):
+    """
+    Trade totals of one cooperative over one day or month (maintained by shares.volume).
+    Secondary figures are total minus primary.
+    """
+
+    class Period(models.TextChoices):
+        DAY = "DAY", "Day"
+        MONTH = "MONTH", "Month"
+
+    cooperative = models.ForeignKey("coops.Cooperative", on_delete=models.CASCADE, related_name="volume_buckets")
+    period = models.CharField(max_length=10, choices=Period.choices)
+    # First day of the bucket, in settings.TIME_ZONE
+    bucket_start = models.DateField()
+
+    trade_count = models.PositiveIntegerField(default=0)
+    share_count = models.PositiveBigIntegerField(default=0)
+    value = models.PositiveBigIntegerField(default=0)  # Tooman
+
+    primary_trade_count = models.PositiveIntegerField(default=0)
+    primary_share_count = models.PositiveBigIntegerField(default=0)
+    primary_value = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("cooperative", "period", "bucket_start")
+
+    @property
+    def secondary_share_count(self) -> int:
+        return self.share_count - self.primary_share_count
+
+    @property
+    def secondary_value(self) -> int:
+        return self.value - self.primary_value
+
+    def __str__(self) -> str:
+        return f"{self.cooperative.name} {self.period} {self.bucket_start}: {self.share_count} shares"
+
+
+class TradeVolumeDelta(models.Model):
+    """
+    One service call's trades added to a TradeVolumeBucket, appended by
+    shares.volume in the writer's transaction. Insert-only, like OwnershipDelta.
+    """
+
+    cooperative = models.ForeignKey("coops.Cooperative", on_delete=models.CASCADE, related_name="+")
+    period = models.CharField(max_length=10, choices=TradeVolumeBucket.Period.choices)
+    bucket_start = models.DateField()
+
+    trade_count = models.IntegerField()
+    share_count = models.BigIntegerField()
+    value = models.BigIntegerField()
+
+    primary_trade_count = models.IntegerField()
+    primary_share_count = models.BigIntegerField()
+    primary_value = models.BigIntegerField()
@@ -0,0 +1,209 @@
+"""
+Ownership distribution of a cooperative: holder count, shares held and how
+concentrated they are, without reading every holding.
+
+The figures are kept incrementally. Every holdings statement (shares.holdings)
+appends one OwnershipDelta row with its change to the holder count, the total
+and the sum of squared holdings. Those are plain inserts, so writers never
+queue on a per-coop row the way they would with an in-place counter. Readers
+add the deltas to the compacted OwnershipDistribution row. The writer that
+finds COMPACT_AFTER pending folds them, and the leaderboard's deltas from the
+same writes, into the compacted rows (compact_deltas(), after its commit), so
+a coop never keeps much more than COMPACT_AFTER pending deltas of either kind.
+
+Since every holdings write appends exactly one delta, the folded count kept on
+the compacted row plus the pending rows is also a per-coop change counter,
+moved by the writer's own statement: changes() is what the export jobs key
+their artifacts on (coops.exports.data_version).
+
+The top holders are the first TOP_K of the leaderboard (shares.leaderboard),
+read from the (cooperative, -quantity) holdings index, so the dashboard reads
+TOP_K rows however many members the coop has; everyone else is summed into an
+"others" bucket. distribution() caches the whole result
+(taavonyar.cache, coop namespace), so it is recomputed only after holdings change.
+"""
+from django.db import connection, transaction
+
+from coops.signals import coop_namespace
+from taavonyar.cache import stale_while_revalidate
+from . import leaderboard
+from .models import OwnershipDelta, OwnershipDistribution, ShareHolding
+
+TOP_K = 10
+
+# Pending deltas (holdings writes) per coop before they are folded in. Bounds the
+# rows a read sums: figures() at most about this many, a leaderboard rank about
+# this many per tree node (shares.leaderboard)
+COMPACT_AFTER = 100
+
+
+def figures(coop_id: int) -> tuple[int, int, int]:
+    """(holders, shares held, sum of squared holdings) of a cooperative right now."""
+    base = OwnershipDistribution._meta.db_table
+    deltas = OwnershipDelta._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT
+                COALESCE((SELECT holders FROM {base} WHERE cooperative_id = %(coop)s), 0) + COALESCE(SUM(holders), 0),
+                COALESCE((SELECT total_held FROM {base} WHERE cooperative_id = %(coop)s), 0) + COALESCE(SUM(total_held), 0),
+                COALESCE((SELECT sum_squares FROM {base} WHERE cooperative_id = %(coop)s), 0) + COALESCE(SUM(sum_squares), 0),
+                COUNT(*)
+            FROM {deltas}
+            WHERE cooperative_id = %(coop)s
+            """,
+            {"coop": coop_id},
+        )
+        holders, total, sum_squares, pending = cursor.fetchone()
+    if pending > COMPACT_AFTER:
+        # Normally the writers got here first (shares.holdings); this covers deltas written before they did
+        compact_deltas(coop_id)
+    return int(holders), int(total), int(sum_squares)
+
+
+def changes(coop_id: int) -> int:
+    """How many holdings writes the cooperative has seen; only ever goes up."""
+    base = OwnershipDistribution._meta.db_table
+    deltas = OwnershipDelta._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT COALESCE((SELECT changes FROM {base} WHERE cooperative_id = %(coop)s), 0) + COUNT(*)
+            FROM {deltas}
+            WHERE cooperative_id = %(coop)s
+            """,
+            {"coop": coop_id},
+        )
+        return int(cursor.fetchone()[0])
+
+
+def compact_deltas(coop_id: int) -> None:
+    """Fold the coop's pending ownership and leaderboard deltas in (appended by the same writes)."""
+    compact(coop_id)
+    leaderboard.compact(coop_id)
+
+
+@transaction.atomic
+def compact(coop_id: int) -> None:
+    """Fold the coop's pending deltas into its OwnershipDistribution row."""
+    base = OwnershipDistribution._meta.db_table
+    deltas = OwnershipDelta._meta.db_table
+    with connection.cursor() as cursor:
+        # A concurrent compaction blocks on the rows this DELETE takes and then
+        # skips them, so no delta is folded twice
+        cursor.execute(
+            f"""
+            WITH folded AS (
+                DELETE FROM {deltas} WHERE cooperative_id = %(coop)s
+                RETURNING holders, total_held, sum_squares
+            )
+            INSERT INTO {base} (cooperative_id, holders, total_held, sum_squares, changes)
+            SELECT
+                %(coop)s, COALESCE(SUM(holders), 0), COALESCE(SUM(total_held), 0), COALESCE(SUM(sum_squares), 0),
+                COUNT(*)
+            FROM folded
+            ON CONFLICT (cooperative_id) DO UPDATE SET
+                holders = {base}.holders + EXCLUDED.holders,
+                total_held = {base}.total_held + EXCLUDED.total_held,
+                sum_squares = {base}.sum_squares + EXCLUDED.sum_squares,
+                changes = {base}.changes + EXCLUDED.changes
+            """,
+            {"coop": coop_id},
+        )
+
+
+def _actual(coop_id: int) -> tuple[int, int, int]:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT COUNT(*), COALESCE(SUM(quantity), 0), COALESCE(SUM(quantity::numeric * quantity), 0)
+            FROM {ShareHolding._meta.db_table}
+            WHERE cooperative_id = %s AND quantity > 0
+            """,
+            [coop_id],
+        )
+        return tuple(int(v) for v in cursor.fetchone())
+
+
+def verify(coop_id: int) -> list[str]:
+    """Compare the figures with the holdings of one cooperative; returns human readable drift lines."""
+    kept, actual = figures(coop_id), _actual(coop_id)
+    return [
+        f"coop {coop_id} {name}: kept={k} actual={a}"
+        for name, k, a in zip(("holders", "total_held", "sum_squares"), kept, actual)
+        if k != a
+    ]
+
+
+@transaction.atomic
+def rebuild(coop_id: int) -> None:
+    """Recompute a cooperative's figures from its holdings."""
+    base = OwnershipDistribution._meta.db_table
+    deltas = OwnershipDelta._meta.db_table
+    with connection.cursor() as cursor:
+        # One statement, one snapshot: the deltas it drops are exactly those
+        # whose holdings changes the recount sees; later ones stay pending
+        cursor.execute(
+            f"""
+            WITH dropped AS (
+                DELETE FROM {deltas} WHERE cooperative_id = %(coop)s
+                RETURNING 1
+            )
+            INSERT INTO {base} (cooperative_id, holders, total_held, sum_squares, changes)
+            SELECT
+                %(coop)s, COUNT(*), COALESCE(SUM(quantity), 0), COALESCE(SUM(quantity::numeric * quantity), 0),
+                (SELECT COUNT(*) FROM dropped)
+            FROM {ShareHolding._meta.db_table}
+            WHERE cooperative_id = %(coop)s AND quantity > 0
+            ON CONFLICT (cooperative_id) DO UPDATE SET
+                holders = EXCLUDED.holders,
+                total_held = EXCLUDED.total_held,
+                sum_squares = EXCLUDED.sum_squares,
+                -- The figures are recounted, the change counter only ever moves on
+                changes = {base}.changes + EXCLUDED.changes
+            """,
+            {"coop": coop_id},
+        )
+
+
+def _compute(coop_id: int, price_per_share: int) -> dict:
+    holders, total, sum_squares = figures(coop_id)
+    rows = list(
+        leaderboard.standings(coop_id)
+        .values_list("quantity", "user__username", "user__individual__full_name", "user__individual__national_number")
+        [:TOP_K]
+    )
+    top = [
+        {
+            "rank": rank,
+            "name": full_name or username,
+            "national_number": national_number or "-",
+            "quantity": quantity,
+            "worth": quantity * price_per_share,
+            "percent": quantity * 100 / total if total else 0.0,
+        }
+        for rank, (quantity, username, full_name, national_number) in zip(
+            leaderboard.competition_ranks([row[0] for row in rows]), rows
+        )
+    ]
+    top_held = sum(h["quantity"] for h in top)
+    return {
+        "holders": holders,
+        "total_held": total,
+        "top": top,
+        "others_holders": holders - len(top),
+        "others_held": total - top_held,
+        "others_percent": (total - top_held) * 100 / total if total else 0.0,
+        "top_percent": top_held * 100 / total if total else 0.0,
+        # Herfindahl-Hirschman index on the 0-10,000 scale
+        "hhi": round(sum_squares * 10_000 / total**2) if total else 0,
+    }
+
+
+def distribution(coop) -> dict:
+    """Top TOP_K holders, the "others" bucket and concentration figures of `coop`."""
+    return stale_while_revalidate(
+        f"ownership:{coop.id}",
+        lambda: _compute(coop.id, coop.price_per_share),
+        namespaces=[coop_namespace(coop.id)],
+    )
@@ -1,59 +1,72 @@
-from django.db import transaction
-from django.db.models import F
-from django.db.models import Sum
+from django.db import connection, transaction
+from django.db.models import Case, F, Value, When
 from django.utils import timezone
 from typing import Literal
 
 from coops.models import Cooperative
-from .models import ShareHolding, ShareListing, ShareTrade
-
-
-def _get_holding(coop: Cooperative, user):
-    holding, _ = ShareHolding.objects.get_or_create(cooperative=coop, user=user, defaults={"quantity": 0})
-    return holding
+from coops.services import primary_available, take_striped_primary
+from taavonyar.db import purchase_timeouts
+from taavonyar.perf import timed_service
+from . import holdings, liquidity, marketplace, volume
+from .models import ShareLedgerEntry, ShareListing, ShareTrade
 
 
+@timed_service
 @transaction.atomic
 def create_listing(*, coop: Cooperative, seller, quantity: int) -> ShareListing:
     if quantity <= 0:
         raise ValueError("Quantity must be > 0")
 
-    holding = _get_holding(coop, seller)
-    if holding.quantity < quantity:
-        raise ValueError("Not enough shares to list")
-
-    # Reserve shares by decreasing seller holding immediately
-    holding.quantity = F("quantity") - quantity
-    holding.save(update_fields=["quantity"])
-    holding.refresh_from_db()
+    # Liquidity rows before the holding, as in every buy path; rolled back if the debit fails
+    liquidity.listing_added(
+        coop_id=coop.id, seller_id=seller.id, quantity=quantity, kind=ShareLedgerEntry.Kind.LISTING
+    )
+    # Reserve shares by decreasing seller holding immediately (guarded: never below zero)
+    try:
+        holdings.debit(coop_id=coop.id, user_id=seller.id, quantity=quantity, kind=ShareLedgerEntry.Kind.LISTING)
+    except ValueError:
+        raise ValueError("Not enough shares to list") from None
 
-    listing = ShareListing.objects.create(
+    return ShareListing.objects.create(
         cooperative=coop,
         seller=seller,
         quantity_available=quantity,
         price_per_share=coop.price_per_share,  # fixed by cooperative
     )
-    return listing
 
 
+@timed_service
 @transaction.atomic
 def cancel_listing(*, listing: ShareListing, by_user):
     if listing.seller_id != by_user.id:
         raise PermissionError("Only seller can cancel listing")
+
+    # Re-read under lock: the caller's copy may be stale after concurrent buys
+    listing = ShareListing.objects.select_for_update().get(id=listing.id)
     if listing.status != ShareListing.Status.ACTIVE:
         return
 
-    # return remaining shares to seller
-    coop = listing.cooperative
-    holding = _get_holding(coop, listing.seller)
-    holding.quantity = F("quantity") + listing.quantity_available
-    holding.save(update_fields=["quantity"])
-
     listing.status = ShareListing.Status.CANCELED
     listing.save(update_fields=["status"])
 
+    # Liquidity rows before the holding, as in every buy path
+    liquidity.listings_reduced(
+        coop_id=listing.cooperative_id,
+        reductions={listing.seller_id: listing.quantity_available},
+        kind=ShareLedgerEntry.Kind.UNLISTING,
+    )
+    # return remaining shares to seller
+    holdings.credit(
+        coop_id=listing.cooperative_id,
+        user_id=listing.seller_id,
+        quantity=listing.quantity_available,
+        kind=ShareLedgerEntry.Kind.UNLISTING,
+    )
+
 
+@timed_service
 @transaction.atomic
+@purchase_timeouts
 def buy_from_listing(*, listing: ShareListing, buyer, quantity: int) -> ShareTrade:
     if quantity <= 0:
         raise ValueError("Quantity must be > 0")
@@ -70,195 +83,254 @@ def buy_from_listing(*, listing: ShareListing, buyer, quantity: int) -> ShareTra
     price_per_share = coop.price_per_share
     total_price = price_per_share * quantity
 
-    # Give shares to buyer
-    buyer_holding = _get_holding(coop, buyer)
-    buyer_holding.quantity = F("quantity") + quantity
-    buyer_holding.save(update_fields=["quantity"])
-
-    # Reduce listing
-    listing.quantity_available = F("quantity_available") - quantity
-    listing.save(update_fields=["quantity_available"])
-    listing.refresh_from_db()
+    # Reduce listing; flip to SOLD_OUT in the same statement when it hits zero.
+    # Guarded on the live row, so a concurrent buyer can't push it below zero.
+    updated = (
+        ShareListing.objects
+        .filter(id=listing.id, status=ShareListing.Status.ACTIVE, quantity_available__gte=quantity)
+        .update(
+            quantity_available=F("quantity_available") - quantity,
+            status=Case(
+                When(quantity_available=quantity, then=Value(ShareListing.Status.SOLD_OUT)),
+                default=F("status"),
+            ),
+        )
+    )
+    if not updated:
+        raise ValueError("Not enough quantity in listing")
 
-    if listing.quantity_available == 0:
-        listing.status = ShareListing.Status.SOLD_OUT
-        listing.save(update_fields=["status"])
+    liquidity.listings_reduced(
+        coop_id=coop.id, reductions={listing.seller_id: quantity}, kind=ShareLedgerEntry.Kind.SALE
+    )
+    # Give shares to buyer: holding after the liquidity rows, as on every listing path
+    holdings.credit(coop_id=coop.id, user_id=buyer.id, quantity=quantity, kind=ShareLedgerEntry.Kind.PURCHASE)
 
     trade = ShareTrade.objects.create(
         cooperative=coop,
         buyer=buyer,
-        seller=listing.seller,
+        seller_id=listing.seller_id,
         quantity=quantity,
         price_per_share=price_per_share,
         total_price=total_price,
     )
+    volume.record_trades([trade])
     return trade
 
 
+def _sell_primary(*, coop_id: int, buyer_id: int, quantity: int) -> ShareTrade | None:
+    """
+    Decrement the coop's primary inventory and record the trade in one statement.
+    The UPDATE is guarded (available >= quantity), so no prior lock or read is
+    needed; returns None when there is not enough inventory.
+    """
+    coop_table = Cooperative._meta.db_table
+    trade_table = ShareTrade._meta.db_table
+    created_at = timezone.now()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH sold AS (
+                UPDATE {coop_table}
+                SET available_primary_shares = available_primary_shares - %(quantity)s
+                WHERE id = %(coop_id)s AND available_primary_shares >= %(quantity)s
+                RETURNING id, price_per_share
+            )
+            INSERT INTO {trade_table}
+                (cooperative_id, buyer_id, seller_id, quantity, price_per_share, total_price, created_at)
+            SELECT id, %(buyer_id)s, NULL, %(quantity)s, price_per_share, price_per_share * %(quantity)s, %(created_at)s
+            FROM sold
+            RETURNING id, price_per_share, total_price
+            """,
+            {"coop_id": coop_id, "buyer_id": buyer_id, "quantity": quantity, "created_at": created_at},
+        )
+        row = cursor.fetchone()
+
+    if row is None:
+        return None
+    marketplace.invalidate()
+    trade_id, price_per_share, total_price = row
+    return ShareTrade(
+        id=trade_id,
+        cooperative_id=coop_id,
+        buyer_id=buyer_id,
+        seller=None,  # None means cooperative primary sale
+        quantity=quantity,
+        price_per_share=price_per_share,
+        total_price=total_price,
+        created_at=created_at,
+    )
+
+
+@timed_service
 @transaction.atomic
+@purchase_timeouts
 def buy_primary_shares_from_coop(*, coop: Cooperative, buyer, quantity: int) -> ShareTrade:
     """
     Buy shares directly from cooperative if it has available_primary_shares.
     Price is always coop.price_per_share.
     Money is abstracted (we just record the trade).
+
+    No select_for_update: the guarded take is the first statement and locks
+    the cooperative row (or one stripe slot) until commit, through the trade
+    insert, the holding credit and the volume delta. That is the order every
+    share service uses: coop row or slot, then liquidity rows (not touched
+    here), then holdings, so one user buying, listing and canceling at once
+    can't deadlock. The price: on an unstriped coop, concurrent buyers queue
+    for those four statements plus commit rather than for one; stripe hot
+    offerings (coops.services.set_primary_inventory) to spread them.
     """
     if quantity <= 0:
         raise ValueError("Quantity must be > 0")
 
-    coop = Cooperative.objects.select_for_update().get(id=coop.id)
-
-    if coop.available_primary_shares < quantity:
-        raise ValueError("Cooperative does not have enough shares available for sale")
-
-    # Decrease coop available shares
-    coop.available_primary_shares = F("available_primary_shares") - quantity
-    coop.save(update_fields=["available_primary_shares"])
-    coop.refresh_from_db()
+    if coop.primary_stripes:
+        # Striped offering: the slot lock is per-stripe, so concurrent buyers rarely meet
+        price_per_share = take_striped_primary(coop_id=coop.id, stripes=coop.primary_stripes, quantity=quantity)
+        if price_per_share is None:
+            raise ValueError("Cooperative does not have enough shares available for sale")
+        trade = ShareTrade.objects.create(
+            cooperative_id=coop.id,
+            buyer=buyer,
+            seller=None,
+            quantity=quantity,
+            price_per_share=price_per_share,
+            total_price=price_per_share * quantity,
+        )
+    else:
+        trade = _sell_primary(coop_id=coop.id, buyer_id=buyer.id, quantity=quantity)
+        if trade is None:
+            raise ValueError("Cooperative does not have enough shares available for sale")
 
-    # Increase buyer holding
-    buyer_holding = _get_holding(coop, buyer)
-    buyer_holding.quantity = F("quantity") + quantity
-    buyer_holding.save(update_fields=["quantity"])
+    holdings.credit(coop_id=coop.id, user_id=buyer.id, quantity=quantity, kind=ShareLedgerEntry.Kind.PURCHASE)
+    volume.record_trades([trade])
+    return trade
 
-    price_per_share = coop.price_per_share
-    total_price = price_per_share * quantity
 
-    trade = ShareTrade.objects.create(
-        cooperative=coop,
-        buyer=buyer,
-        seller=None,  # None means cooperative primary sale
-        quantity=quantity,
-        price_per_share=price_per_share,
-        total_price=total_price,
+def _plan_secondary_fills(*, coop: Cooperative, buyer, amount: int) -> list[tuple[ShareListing, int]]:
+    """
+    Walk active listings FIFO (oldest first) and decide how much to take from each.
+    Rows are locked as the cursor reaches them, so only the listings we actually
+    consume (plus at most one chunk of look-ahead) are locked.
+    """
+    listings = (
+        ShareListing.objects
+        .select_for_update()
+        .filter(cooperative=coop, status=ShareListing.Status.ACTIVE, quantity_available__gt=0)
+        .exclude(seller=buyer)  # prevent buying own shares
+        .only("id", "seller_id", "quantity_available", "status")
+        .order_by("created_at", "id")
     )
-    return trade
 
+    fills: list[tuple[ShareListing, int]] = []
+    for listing in listings.iterator(chunk_size=200):
+        if amount <= 0:
+            break
+        take = min(listing.quantity_available, amount)
+        fills.append((listing, take))
+        amount -= take
+    return fills
 
+
+@timed_service
 @transaction.atomic
+@purchase_timeouts
 def buy_from_marketplace(*, coop: Cooperative, buyer, quantity: int, source: Literal["primary", "secondary", "auto"] = "auto") -> list[ShareTrade]:
     """
     source:
-      - "primary": only buy from coop.available_primary_shares
+      - "primary": only buy from the coop's primary inventory (column or striped slots)
       - "secondary": only buy from active listings (excluding buyer's own listings)
       - "auto": primary first, then secondary
     Returns list of ShareTrade rows created.
+
+    The whole fill is planned in memory first and then written with a fixed
+    number of statements: one listing bulk update, one holding upsert and one
+    trade bulk insert, regardless of how many listings are swept.
     """
     if quantity <= 0:
         raise ValueError("Quantity must be > 0")
     if source not in ("primary", "secondary", "auto"):
         raise ValueError("Invalid source option")
 
-    trades: list[ShareTrade] = []
-    coop = Cooperative.objects.select_for_update().get(id=coop.id)
+    # NO KEY: the FK checks of ledger/trade inserts in concurrent buy_from_listing
+    # calls take KEY SHARE on this row; a plain FOR UPDATE would deadlock with them
+    coop = Cooperative.objects.select_for_update(no_key=True).get(id=coop.id)
 
     price_per_share = coop.price_per_share
-    remaining = quantity
 
-    # Compute secondary availability (excluding buyer’s own listings)
-    secondary_total = (
-        ShareListing.objects
-        .filter(cooperative=coop, status=ShareListing.Status.ACTIVE)
-        .exclude(seller=buyer)
-        .aggregate(total=Sum("quantity_available"))["total"]
-        or 0
-    )
-    secondary_total = int(secondary_total)
-    primary_total = int(coop.available_primary_shares)
+    # Secondary availability (excluding buyer’s own listings) from the liquidity book
+    secondary_total = liquidity.secondary_available(coop_id=coop.id, exclude_seller_id=buyer.id)
+    primary_total = primary_available(coop)
 
-    if source == "primary" and primary_total < remaining:
+    if source == "primary" and primary_total < quantity:
         raise ValueError("Not enough primary shares available from cooperative")
-    if source == "secondary" and secondary_total < remaining:
+    if source == "secondary" and secondary_total < quantity:
         raise ValueError("Not enough secondary shares available from marketplace")
-    if source == "auto" and (primary_total + secondary_total) < remaining:
+    if source == "auto" and (primary_total + secondary_total) < quantity:
         raise ValueError("Not enough shares available in marketplace")
 
-    def take_primary(amount: int):
-        nonlocal remaining
-        if amount <= 0:
-            return
-        coop.available_primary_shares -= amount
-        coop.save(update_fields=["available_primary_shares"])
+    # Plan: primary first (unless secondary only), then secondary FIFO
+    primary_take = 0
+    if source == "primary":
+        primary_take = quantity
+    elif source == "auto":
+        primary_take = min(primary_total, quantity)
+
+    fills: list[tuple[ShareListing, int]] = []
+    remaining = quantity - primary_take
+    if remaining > 0:
+        fills = _plan_secondary_fills(coop=coop, buyer=buyer, amount=remaining)
+        remaining -= sum(take for _, take in fills)
+
+    if remaining != 0:
+        # should not happen due to availability check, but safety:
+        if source == "secondary":
+            raise ValueError("Not enough secondary shares available")
+        raise ValueError("Not enough shares available")
 
-        buyer_holding = _get_holding(coop, buyer)
-        buyer_holding.quantity += amount
-        buyer_holding.save(update_fields=["quantity"])
+    # Apply the plan
+    trades: list[ShareTrade] = []
 
+    if primary_take > 0:
+        if coop.primary_stripes:
+            if take_striped_primary(coop_id=coop.id, stripes=coop.primary_stripes, quantity=primary_take) is None:
+                raise ValueError("Not enough primary shares available from cooperative")
+        else:
+            coop.available_primary_shares -= primary_take
+            coop.save(update_fields=["available_primary_shares"])
         trades.append(
-            ShareTrade.objects.create(
+            ShareTrade(
                 cooperative=coop,
                 buyer=buyer,
                 seller=None,
-                quantity=amount,
+                quantity=primary_take,
                 price_per_share=price_per_share,
-                total_price=price_per_share * amount,
+                total_price=price_per_share * primary_take,
             )
         )
-        remaining -= amount
-
-    def take_secondary(amount: int):
-        nonlocal remaining
-        if amount <= 0:
-            return
-
-        listings = (
-            ShareListing.objects
-            .select_for_update()
-            .filter(cooperative=coop, status=ShareListing.Status.ACTIVE)
-            .exclude(seller=buyer)  # prevent buying own shares
-            .order_by("created_at", "id")
-        )
 
-        for listing in listings:
-            if remaining <= 0:
-                break
-            if listing.quantity_available <= 0:
-                continue
-
-            take = min(listing.quantity_available, remaining)
+    if fills:
+        reductions: dict[int, int] = {}
+        for listing, take in fills:
+            reductions[listing.seller_id] = reductions.get(listing.seller_id, 0) + take
             listing.quantity_available -= take
-
             if listing.quantity_available == 0:
                 listing.status = ShareListing.Status.SOLD_OUT
-                listing.save(update_fields=["quantity_available", "status"])
-            else:
-                listing.save(update_fields=["quantity_available"])
-
-            buyer_holding = _get_holding(coop, buyer)
-            buyer_holding.quantity += take
-            buyer_holding.save(update_fields=["quantity"])
-
             trades.append(
-                ShareTrade.objects.create(
+                ShareTrade(
                     cooperative=coop,
                     buyer=buyer,
-                    seller=listing.seller,
+                    seller_id=listing.seller_id,
                     quantity=take,
                     price_per_share=price_per_share,
                     total_price=price_per_share * take,
                 )
             )
+        ShareListing.objects.bulk_update(
+            [listing for listing, _ in fills],
+            ["quantity_available", "status"],
+        )
+        liquidity.listings_reduced(coop_id=coop.id, reductions=reductions, kind=ShareLedgerEntry.Kind.SALE)
 
-            remaining -= take
-
-    # Fulfillment order
-    if source == "primary":
-        take_primary(remaining)
-        return trades
-
-    if source == "secondary":
-        take_secondary(remaining)
-        if remaining != 0:
-            # should not happen due to availability check, but safety:
-            raise ValueError("Not enough secondary shares available")
-        return trades
-
-    # auto: primary first then secondary
-    if remaining > 0 and coop.available_primary_shares > 0:
-        take_primary(min(int(coop.available_primary_shares), remaining))
-
-    if remaining > 0:
-        take_secondary(remaining)
-
-    if remaining != 0:
-        raise ValueError("Not enough shares available")
-    return trades
\ No newline at end of file
+    holdings.credit(coop_id=coop.id, user_id=buyer.id, quantity=quantity, kind=ShareLedgerEntry.Kind.PURCHASE)
+    trades = ShareTrade.objects.bulk_create(trades)
+    volume.record_trades(trades)
+    return trades
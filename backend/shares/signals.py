@@ -0,0 +1,10 @@
+"""
+Signals of the share app.
+
+The holding writers (shares.holdings) update ShareHolding with raw SQL, which
+never fires post_save; they send holdings_changed instead.
+"""
+from django.dispatch import Signal
+
+# Sent inside the writer's transaction with `coop_id` and `user_ids` whose holdings changed
+holdings_changed = Signal()
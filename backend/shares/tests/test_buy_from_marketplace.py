@@ -0,0 +1,69 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from shares.services import buy_from_marketplace, create_listing
+from shares.models import ShareHolding, ShareListing
+from tests.factories import CooperativeFactory, UserFactory
+
+
+pytestmark = pytest.mark.django_db
+
+
+def _seed_listings(coop, sizes):
+    listings = []
+    for size in sizes:
+        seller = UserFactory()
+        ShareHolding.objects.create(cooperative=coop, user=seller, quantity=size)
+        listings.append(create_listing(coop=coop, seller=seller, quantity=size))
+    return listings
+
+
+def test_secondary_sweep_is_fifo_and_marks_sold_out():
+    coop = CooperativeFactory(price_per_share=1000)
+    buyer = UserFactory()
+    l1, l2, l3 = _seed_listings(coop, [2, 3, 5])
+
+    trades = buy_from_marketplace(coop=coop, buyer=buyer, quantity=7, source="secondary")
+
+    assert [(t.seller_id, t.quantity) for t in trades] == [
+        (l1.seller_id, 2),
+        (l2.seller_id, 3),
+        (l3.seller_id, 2),
+    ]
+    assert all(t.pk is not None for t in trades)
+    assert [t.total_price for t in trades] == [2000, 3000, 2000]
+
+    for listing in (l1, l2, l3):
+        listing.refresh_from_db()
+    assert (l1.status, l1.quantity_available) == (ShareListing.Status.SOLD_OUT, 0)
+    assert (l2.status, l2.quantity_available) == (ShareListing.Status.SOLD_OUT, 0)
+    assert (l3.status, l3.quantity_available) == (ShareListing.Status.ACTIVE, 3)
+
+    assert ShareHolding.objects.get(cooperative=coop, user=buyer).quantity == 7
+
+
+def test_auto_takes_primary_before_secondary():
+    coop = CooperativeFactory(price_per_share=500, available_primary_shares=4)
+    buyer = UserFactory()
+    ShareHolding.objects.create(cooperative=coop, user=buyer, quantity=1)
+    (listing,) = _seed_listings(coop, [10])
+
+    trades = buy_from_marketplace(coop=coop, buyer=buyer, quantity=6, source="auto")
+
+    assert [(t.seller_id, t.quantity) for t in trades] == [(None, 4), (listing.seller_id, 2)]
+    coop.refresh_from_db()
+    assert coop.available_primary_shares == 0
+    assert ShareHolding.objects.get(cooperative=coop, user=buyer).quantity == 7
+
+
+def test_sweep_query_count_does_not_grow_with_listings():
+    def queries_for(listing_count):
+        coop = CooperativeFactory()
+        buyer = UserFactory()
+        _seed_listings(coop, [1] * listing_count)
+        with CaptureQueriesContext(connection) as ctx:
+            buy_from_marketplace(coop=coop, buyer=buyer, quantity=listing_count, source="secondary")
+        return len(ctx.captured_queries)
+
+    assert queries_for(3) == queries_for(40)
@@ -0,0 +1,95 @@
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+from projects import distribution
+from projects.distribution import claim_next_job, request_distribution, run_job, snapshot_finished
+from projects.models import DistributionJob
+from shares import captable, ledger
+from shares.captable import CapTable
+from shares.models import ShareHolding
+from tests.factories import ContributionFactory, ProjectFactory, UserFactory
+
+
+pytestmark = pytest.mark.django_db
+
+
+def _table(rows):
+    user_ids, held, listed = zip(*rows) if rows else ((), (), ())
+    return CapTable(*(np.array(column, dtype=np.int64) for column in (user_ids, held, listed)))
+
+
+def test_pack_round_trips_and_positions_are_binary_searched():
+    table = _table([(3, 10, 0), (8, 4, 2), (42, 0, 7)])
+
+    unpacked = captable.unpack(captable.pack(table))
+    assert [column.tolist() for column in unpacked] == [[3, 8, 42], [10, 4, 0], [0, 2, 7]]
+    assert unpacked.position(8) == (4, 2)
+    assert unpacked.position(5) == (0, 0)
+    assert unpacked.position(99) == (0, 0)
+    assert np.allclose(unpacked.percentages(), [1000 / 23, 600 / 23, 700 / 23])
+    assert captable.unpack(b"").holders == 0
+    assert captable.EMPTY.percentages().tolist() == []
+
+
+def test_merge_sums_repeated_deltas_and_drops_emptied_users():
+    table = _table([(3, 10, 0), (8, 4, 2)])
+
+    merged = captable.merge(table, [8, 5, 3, 5], [-4, 6, 1, 1], [-2, 0, 0, 3])
+
+    assert [column.tolist() for column in merged] == [[3, 5], [11, 7], [0, 3]]
+
+
+def test_diff_reports_only_changed_owners():
+    before = _table([(3, 10, 0), (8, 4, 2), (9, 1, 0)])
+    after = _table([(3, 5, 5), (8, 7, 0), (11, 2, 0)])
+
+    changed = captable.diff(before, after)
+
+    assert changed.user_ids.tolist() == [8, 9, 11]
+    assert changed.before.tolist() == [6, 1, 0]
+    assert changed.change.tolist() == [1, -1, 2]
+
+
+def test_worker_snapshots_the_cap_table_once_a_distribution_settles(monkeypatch):
+    monkeypatch.setattr(distribution, "DISTRIBUTION_BATCH", 2)
+    project = ProjectFactory(shares_to_distribute=90)
+    a, b = UserFactory(), UserFactory()
+    for user, amount in [(a, 20), (b, 10), (a, 10)]:
+        ContributionFactory(project=project, user=user, amount=amount)
+    request_distribution(project=project, user=None)
+    run_job(claim_next_job())
+
+    # Not yet settled: entries from transactions still in flight could land before the finish
+    assert snapshot_finished() == 0
+
+    monkeypatch.setattr(ledger, "SNAPSHOT_LAG", timedelta(0))
+    assert snapshot_finished() == 1
+    assert snapshot_finished() == 0
+
+    job = DistributionJob.objects.select_related("snapshot").get(project=project)
+    assert job.snapshot.taken_at == job.finished_at
+    table = captable.unpack(job.snapshot.positions)
+    holdings = dict(ShareHolding.objects.filter(cooperative=project.cooperative).values_list("user_id", "quantity"))
+    assert dict(zip(table.user_ids.tolist(), table.held.tolist())) == holdings
+    assert sum(holdings.values()) == 90
+
+
+def test_pruning_keeps_distribution_snapshots_so_the_worker_does_not_retake_them(monkeypatch):
+    monkeypatch.setattr(ledger, "SNAPSHOT_LAG", timedelta(0))
+    project = ProjectFactory(shares_to_distribute=10)
+    ContributionFactory(project=project, amount=10)
+    request_distribution(project=project, user=None)
+    run_job(claim_next_job())
+    assert snapshot_finished() == 1
+    job = DistributionJob.objects.get(project=project)
+
+    # Nightly run: a newer snapshot, then prune down to it
+    coop = project.cooperative
+    ledger.take_snapshot(coop, at=job.finished_at + timedelta(days=1))
+    ledger.take_snapshot(coop, at=job.finished_at + timedelta(days=2))
+    assert ledger.prune_snapshots(coop, keep=1) == 1
+
+    assert DistributionJob.objects.get(id=job.id).snapshot_id == job.snapshot_id
+    assert snapshot_finished() == 0
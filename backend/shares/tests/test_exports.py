@@ -0,0 +1,36 @@
+import csv
+import io
+
+import pytest
+from django.urls import reverse
+
+from shares.models import ShareTrade
+from tests.factories import ContributionFactory, CooperativeFactory, HoldingFactory, IndividualFactory, UserFactory
+
+
+pytestmark = pytest.mark.django_db
+
+
+def _read(response) -> list[list[str]]:
+    assert response.streaming
+    return list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+
+
+def test_my_exports_stream(client):
+    me = UserFactory()
+    coop = CooperativeFactory(name="Pistachio", price_per_share=50)
+    other = IndividualFactory(full_name="Other")
+    HoldingFactory(cooperative=coop, user=me, quantity=4)
+    ContributionFactory(user=me, amount=700)
+    ShareTrade.objects.create(cooperative=coop, buyer=me, seller=None, quantity=1, price_per_share=50, total_price=50)
+    ShareTrade.objects.create(cooperative=coop, buyer=other.user, seller=me, quantity=2, price_per_share=50, total_price=100)
+    client.force_login(me)
+
+    holdings = _read(client.get(reverse("shares:export_my_holdings_csv")))
+    assert holdings[1] == ["Pistachio", "4", "50", "200"]
+
+    contributions = _read(client.get(reverse("shares:export_my_contributions_csv")))
+    assert contributions[1][3:] == ["700", "ACTIVE", ""]
+
+    trades = _read(client.get(reverse("shares:export_my_trade_logs_csv")))
+    assert [row[2:4] for row in trades[1:]] == [["SELL", "Other"], ["BUY", "COOP_PRIMARY"]]
@@ -0,0 +1,72 @@
+import pytest
+from django.urls import reverse
+
+from shares import holdings
+from shares.models import ShareHolding, ShareLedgerEntry, ShareListing
+from shares.services import buy_from_listing, cancel_listing, create_listing
+from tests.factories import CooperativeFactory, HoldingFactory, UserFactory
+
+
+pytestmark = pytest.mark.django_db
+
+PURCHASE = ShareLedgerEntry.Kind.PURCHASE
+SALE = ShareLedgerEntry.Kind.SALE
+
+
+def test_credit_creates_then_accumulates():
+    coop = CooperativeFactory()
+    user = UserFactory()
+
+    assert holdings.credit(coop_id=coop.id, user_id=user.id, quantity=3, kind=PURCHASE) == 3
+    assert holdings.credit(coop_id=coop.id, user_id=user.id, quantity=4, kind=PURCHASE) == 7
+    assert ShareHolding.objects.get(cooperative=coop, user=user).quantity == 7
+
+
+def test_credit_many_returns_new_quantities():
+    coop = CooperativeFactory()
+    a, b = UserFactory(), UserFactory()
+    HoldingFactory(cooperative=coop, user=a, quantity=5)
+
+    assert holdings.credit_many(coop_id=coop.id, credits={a.id: 2, b.id: 6}, kind=PURCHASE) == {a.id: 7, b.id: 6}
+
+
+def test_debit_is_guarded():
+    coop = CooperativeFactory()
+    user = UserFactory()
+    HoldingFactory(cooperative=coop, user=user, quantity=5)
+
+    assert holdings.debit(coop_id=coop.id, user_id=user.id, quantity=5, kind=SALE) == 0
+    with pytest.raises(ValueError):
+        holdings.debit(coop_id=coop.id, user_id=user.id, quantity=1, kind=SALE)
+    with pytest.raises(ValueError):
+        holdings.debit(coop_id=coop.id, user_id=UserFactory().id, quantity=1, kind=SALE)
+    assert ShareHolding.objects.get(cooperative=coop, user=user).quantity == 0
+
+
+def test_listing_round_trip_query_counts(django_assert_max_num_queries):
+    coop = CooperativeFactory(price_per_share=100)
+    seller, buyer = UserFactory(), UserFactory()
+    HoldingFactory(cooperative=coop, user=seller, quantity=10)
+
+    with django_assert_max_num_queries(6):  # debit, listing insert, 2 liquidity upserts (+ savepoint pair)
+        listing = create_listing(coop=coop, seller=seller, quantity=6)
+    with django_assert_max_num_queries(9):  # timeouts, guarded listing update, credit, 2 liquidity updates, trade, volume (+ savepoints)
+        buy_from_listing(listing=listing, buyer=buyer, quantity=2)
+    with django_assert_max_num_queries(7):  # locked re-read, status, credit, 2 liquidity updates (+ savepoints)
+        cancel_listing(listing=listing, by_user=seller)
+
+    listing.refresh_from_db()
+    assert listing.status == ShareListing.Status.CANCELED
+    assert ShareHolding.objects.get(cooperative=coop, user=seller).quantity == 8
+    assert ShareHolding.objects.get(cooperative=coop, user=buyer).quantity == 2
+
+
+def test_admin_shows_holdings_read_only(admin_client):
+    holding = HoldingFactory(quantity=5)
+    url = reverse("admin:shares_shareholding_change", args=[holding.id])
+
+    assert admin_client.get(reverse("admin:shares_shareholding_changelist")).status_code == 200
+    admin_client.post(url, {"cooperative": holding.cooperative_id, "user": holding.user_id, "quantity": 50})
+
+    assert ShareHolding.objects.get(id=holding.id).quantity == 5
+    assert admin_client.get(reverse("admin:shares_shareholding_add")).status_code == 403
@@ -0,0 +1,102 @@
+import random
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from shares import holdings, leaderboard, ownership
+from shares.models import LeaderboardDelta, ShareHolding, ShareLedgerEntry
+from tests.factories import CooperativeFactory, HoldingFactory, UserFactory
+
+
+pytestmark = pytest.mark.django_db
+
+PURCHASE = ShareLedgerEntry.Kind.PURCHASE
+SALE = ShareLedgerEntry.Kind.SALE
+
+
+def _expected_ranks(coop):
+    quantities = dict(ShareHolding.objects.filter(cooperative=coop, quantity__gt=0).values_list("user_id", "quantity"))
+    return {user_id: 1 + sum(q > mine for q in quantities.values()) for user_id, mine in quantities.items()}
+
+
+def test_ranks_follow_every_holdings_write():
+    rng = random.Random(7)
+    coop = CooperativeFactory()
+    users = [u.id for u in UserFactory.create_batch(12)]
+
+    for step in range(60):
+        if step % 3 == 2:
+            held = dict(ShareHolding.objects.filter(cooperative=coop, quantity__gt=0).values_list("user_id", "quantity"))
+            user_id = rng.choice(list(held))
+            holdings.debit(coop_id=coop.id, user_id=user_id, quantity=rng.randint(1, held[user_id]), kind=SALE)
+        else:
+            picked = rng.sample(users, 3)
+            holdings.credit_many(coop_id=coop.id, credits={u: rng.choice([0, 1, 1, 2, 5]) for u in picked}, kind=PURCHASE)
+        if step == 30:
+            leaderboard.compact(coop.id)
+            assert not LeaderboardDelta.objects.filter(cooperative=coop).exists()
+
+    expected = _expected_ranks(coop)
+    assert {u: leaderboard.rank(coop.id, u) for u in expected} == expected
+    assert leaderboard.verify(coop.id) == []
+
+
+def test_pending_deltas_stay_bounded_without_reads(monkeypatch, django_capture_on_commit_callbacks):
+    monkeypatch.setattr(ownership, "COMPACT_AFTER", 4)
+    coop = CooperativeFactory()
+    users = [u.id for u in UserFactory.create_batch(5)]
+
+    most = 0
+    for step in range(40):
+        with django_capture_on_commit_callbacks(execute=True):
+            holdings.credit(coop_id=coop.id, user_id=users[step % 5], quantity=step + 1, kind=PURCHASE)
+        most = max(most, LeaderboardDelta.objects.filter(cooperative=coop).count())
+
+    # Each write adds at most two update paths' worth of rows
+    assert most <= ownership.COMPACT_AFTER * 2 * leaderboard.LEVELS
+    expected = _expected_ranks(coop)
+    assert {u: leaderboard.rank(coop.id, u) for u in expected} == expected
+    assert leaderboard.verify(coop.id) == []
+
+
+def test_ranks_cover_the_whole_quantity_range_in_one_query(django_assert_num_queries):
+    coop, other = CooperativeFactory(), CooperativeFactory()
+    whale, minnow, tied = UserFactory(), UserFactory(), UserFactory()
+    holdings.credit_many(coop_id=coop.id, credits={whale.id: 2**31 - 1, minnow.id: 1, tied.id: 1}, kind=PURCHASE)
+    holdings.credit(coop_id=other.id, user_id=minnow.id, quantity=3, kind=PURCHASE)
+
+    with django_assert_num_queries(1):
+        assert leaderboard.ranks(minnow.id) == {coop.id: 2, other.id: 1}
+    assert leaderboard.rank(coop.id, whale.id) == 1
+    assert leaderboard.rank(coop.id, tied.id) == 2
+    assert leaderboard.rank(other.id, whale.id) is None
+
+    holdings.debit(coop_id=coop.id, user_id=whale.id, quantity=2**31 - 1, kind=SALE)
+    assert leaderboard.rank(coop.id, whale.id) is None
+    assert leaderboard.rank(coop.id, tied.id) == 1
+    assert leaderboard.verify(coop.id) == []
+
+
+def test_dashboard_top_list_uses_competition_ranks(monkeypatch):
+    monkeypatch.setattr(ownership, "TOP_K", 3)
+    coop = CooperativeFactory()
+    a, b, c, d = UserFactory.create_batch(4)
+    holdings.credit_many(coop_id=coop.id, credits={a.id: 9, b.id: 4, c.id: 4, d.id: 1}, kind=PURCHASE)
+
+    top = ownership.distribution(coop)["top"]
+    assert [(h["rank"], h["quantity"]) for h in top] == [(1, 9), (2, 4), (2, 4)]
+    assert list(leaderboard.standings(coop.id).values_list("user_id", flat=True)) == [a.id, b.id, c.id, d.id]
+
+
+def test_rebuild_command_repairs_drift():
+    coop = CooperativeFactory()
+    holdings.credit(coop_id=coop.id, user_id=UserFactory().id, quantity=4, kind=PURCHASE)
+    # Written behind shares.holdings' back
+    behind = HoldingFactory(cooperative=coop, quantity=6)
+
+    with pytest.raises(CommandError, match="1 cooperative"):
+        call_command("rebuild_leaderboard", "--verify")
+
+    call_command("rebuild_leaderboard")
+    assert leaderboard.rank(coop.id, behind.user_id) == 1
+    call_command("rebuild_leaderboard", "--verify")
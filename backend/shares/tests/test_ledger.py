@@ -0,0 +1,70 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from shares import ledger
+from shares.ledger import Position
+from shares.models import ShareHolding, ShareLedgerEntry
+from shares.services import buy_from_listing, buy_primary_shares_from_coop, cancel_listing, create_listing
+from tests.factories import CooperativeFactory, UserFactory
+
+
+pytestmark = pytest.mark.django_db
+
+
+def test_services_write_ledger_matching_holdings():
+    coop = CooperativeFactory(available_primary_shares=20)
+    seller, buyer = UserFactory(), UserFactory()
+
+    buy_primary_shares_from_coop(coop=coop, buyer=seller, quantity=10)
+    listing = create_listing(coop=coop, seller=seller, quantity=6)
+    buy_from_listing(listing=listing, buyer=buyer, quantity=4)
+    listing.refresh_from_db()
+    cancel_listing(listing=listing, by_user=seller)
+    create_listing(coop=coop, seller=seller, quantity=1)
+
+    positions = ledger.as_of(coop, timezone.now())
+    assert positions == {seller.id: Position(held=5, listed=1), buyer.id: Position(held=4, listed=0)}
+    for holding in ShareHolding.objects.filter(cooperative=coop):
+        assert positions[holding.user_id].held == holding.quantity
+
+    kinds = set(ShareLedgerEntry.objects.filter(cooperative=coop).values_list("kind", flat=True))
+    assert kinds == {"PURCHASE", "LISTING", "SALE", "UNLISTING"}
+
+
+def test_as_of_reads_snapshot_plus_tail():
+    coop = CooperativeFactory()
+    a, b = UserFactory(), UserFactory()
+    t0 = timezone.now() - timedelta(days=10)
+
+    def entry(user, delta, days, bucket=ShareLedgerEntry.Bucket.HELD):
+        ShareLedgerEntry.objects.create(
+            cooperative=coop,
+            user=user,
+            bucket=bucket,
+            kind=ShareLedgerEntry.Kind.PURCHASE,
+            delta=delta,
+            created_at=t0 + timedelta(days=days),
+        )
+
+    entry(a, 10, 0)
+    entry(b, 5, 1)
+    snapshot = ledger.take_snapshot(coop, at=t0 + timedelta(days=2))
+    assert snapshot.holders == 2
+
+    entry(a, -3, 3)
+    entry(a, 3, 3, bucket=ShareLedgerEntry.Bucket.LISTED)
+    entry(b, -5, 4)
+
+    assert ledger.as_of(coop, t0 - timedelta(days=1)) == {}
+    assert ledger.as_of(coop, t0 + timedelta(days=1)) == {a.id: (10, 0), b.id: (5, 0)}
+    assert ledger.as_of(coop, t0 + timedelta(days=3)) == {a.id: (7, 3), b.id: (5, 0)}
+    assert ledger.as_of(coop, t0 + timedelta(days=5)) == {a.id: (7, 3)}
+
+    # A later snapshot compacts on top of the earlier one
+    ledger.take_snapshot(coop, at=t0 + timedelta(days=5))
+    ShareLedgerEntry.objects.filter(created_at__lte=t0 + timedelta(days=5)).delete()
+    assert ledger.as_of(coop, t0 + timedelta(days=6)) == {a.id: (7, 3)}
+
+    assert ledger.prune_snapshots(coop, keep=1) == 1
@@ -0,0 +1,52 @@
+import pytest
+from django.core.management import call_command
+
+from shares import liquidity
+from shares.models import CooperativeLiquidity, ShareHolding
+from shares.services import buy_from_listing, buy_from_marketplace, cancel_listing, create_listing
+from tests.factories import CooperativeFactory, UserFactory
+
+
+pytestmark = pytest.mark.django_db
+
+
+def _seller_with_shares(coop, quantity):
+    seller = UserFactory()
+    ShareHolding.objects.create(cooperative=coop, user=seller, quantity=quantity)
+    return seller
+
+
+def test_book_follows_listing_lifecycle():
+    coop = CooperativeFactory()
+    s1 = _seller_with_shares(coop, 10)
+    s2 = _seller_with_shares(coop, 10)
+    buyer = UserFactory()
+
+    l1 = create_listing(coop=coop, seller=s1, quantity=4)
+    l2 = create_listing(coop=coop, seller=s2, quantity=6)
+    assert liquidity.secondary_available(coop_id=coop.id) == 10
+    assert liquidity.secondary_available(coop_id=coop.id, exclude_seller_id=s1.id) == 6
+
+    buy_from_listing(listing=l1, buyer=buyer, quantity=1)
+    buy_from_marketplace(coop=coop, buyer=buyer, quantity=5, source="secondary")
+    assert liquidity.secondary_available(coop_id=coop.id) == 4
+    assert liquidity.secondary_totals_for_buyer(s2) == {coop.id: 0}
+
+    l2.refresh_from_db()
+    cancel_listing(listing=l2, by_user=s2)
+    assert liquidity.secondary_available(coop_id=coop.id) == 0
+    assert liquidity.verify(coop.id) == []
+
+
+def test_rebuild_command_repairs_drift():
+    coop = CooperativeFactory()
+    seller = _seller_with_shares(coop, 10)
+    create_listing(coop=coop, seller=seller, quantity=7)
+
+    CooperativeLiquidity.objects.filter(cooperative=coop).update(listed_quantity=1)
+    assert liquidity.verify(coop.id) != []
+
+    call_command("rebuild_liquidity", coop=[coop.id])
+
+    assert liquidity.verify(coop.id) == []
+    assert liquidity.secondary_available(coop_id=coop.id) == 7
@@ -0,0 +1,97 @@
+import pytest
+from django.urls import reverse
+
+from coops.services import set_primary_inventory
+from shares import marketplace
+from shares.services import buy_primary_shares_from_coop, create_listing
+from tests.factories import CooperativeFactory, HoldingFactory, UserFactory
+
+
+pytestmark = pytest.mark.django_db
+
+
+def _rows(response):
+    return {r["name"]: r for r in response.context["rows"]}
+
+
+def test_rows_combine_primary_stripes_and_listings_minus_own(client):
+    me, seller = UserFactory(), UserFactory()
+    plain = CooperativeFactory(name="Almond", available_primary_shares=7)
+    striped = CooperativeFactory(name="Barberry", available_primary_shares=9)
+    set_primary_inventory(coop=striped, stripes=3)
+    HoldingFactory(cooperative=plain, user=seller, quantity=10)
+    HoldingFactory(cooperative=plain, user=me, quantity=10)
+    create_listing(coop=plain, seller=seller, quantity=4)
+    create_listing(coop=plain, seller=me, quantity=2)
+    client.force_login(me)
+
+    rows = _rows(client.get(reverse("shares:marketplace")))
+    assert (rows["Almond"]["primary"], rows["Almond"]["secondary"], rows["Almond"]["total_for_buyer"]) == (7, 4, 11)
+    assert (rows["Barberry"]["primary"], rows["Barberry"]["secondary"]) == (9, 0)
+
+    # The seller sees my listing but not their own, and can list only where they hold shares
+    client.force_login(seller)
+    response = client.get(reverse("shares:marketplace"))
+    assert _rows(response)["Almond"]["secondary"] == 2
+    assert response.context["sellable"] == [(plain.id, "Almond", 6)]
+
+
+def test_filters_and_pagination(client, monkeypatch):
+    monkeypatch.setattr(marketplace, "PER_PAGE", 2)
+    for name, village, primary in [("A", "North", 1), ("B", "South", 0), ("C", "North", 3), ("D", "North", 4)]:
+        CooperativeFactory(name=name, village=village, available_primary_shares=primary)
+    client.force_login(UserFactory())
+    url = reverse("shares:marketplace")
+
+    first = client.get(url)
+    assert list(_rows(first)) == ["A", "B"]
+    assert first.context["page"]["num_pages"] == 2
+    assert list(_rows(client.get(url, {"page": 2}))) == ["C", "D"]
+    assert list(_rows(client.get(url, {"q": "north", "page": 2}))) == ["D"]
+    assert list(_rows(client.get(url, {"available": "1"}))) == ["A", "C"]
+
+
+def test_cached_page_is_invalidated_by_sales(client, django_assert_max_num_queries, django_capture_on_commit_callbacks):
+    coop = CooperativeFactory(name="Saffron", price_per_share=10, available_primary_shares=10)
+    client.force_login(UserFactory())
+    url = reverse("shares:marketplace")
+    assert _rows(client.get(url))["Saffron"]["primary"] == 10
+
+    # Warm: session, user, the buyer's own listings and holdings only
+    with django_assert_max_num_queries(5):
+        client.get(url)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        buy_primary_shares_from_coop(coop=coop, buyer=UserFactory(), quantity=3)
+    assert _rows(client.get(url))["Saffron"]["primary"] == 7
+
+
+def test_searches_are_hashed_into_the_cache_key(monkeypatch):
+    CooperativeFactory(name="Pistachio", village="Kerman")
+    keys = []
+    real_set = marketplace.cache.set
+    monkeypatch.setattr(marketplace.cache, "set", lambda key, *args, **kw: keys.append(key) or real_set(key, *args, **kw))
+
+    search = "kerman " + "x" * 300
+    assert marketplace.page(number=1, search=search)["rows"] == []
+    assert marketplace.page(number=1, search="KERMAN")["rows"][0]["name"] == "Pistachio"
+    assert len(keys) == 2 and not any("kerman" in key for key in keys)
+    assert len(keys[0]) == len(keys[1])
+
+
+def test_page_numbers_are_cached_under_the_resolved_page(monkeypatch):
+    monkeypatch.setattr(marketplace, "PER_PAGE", 1)
+    CooperativeFactory(name="A")
+    CooperativeFactory(name="B")
+    keys = []
+    real_set = marketplace.cache.set
+    monkeypatch.setattr(marketplace.cache, "set", lambda key, *args, **kw: keys.append(key) or real_set(key, *args, **kw))
+
+    assert marketplace.page(number="2")["number"] == 2
+    for junk in ("999", "x" * 300, "-1", None):
+        marketplace.page(number=junk)
+    assert marketplace.page(number="1")["number"] == 1
+
+    # Page 2 (also what "999" resolves to) and page 1 (everything else) only
+    assert len(set(keys)) == 2
+    assert not any("x" * 10 in key for key in keys)
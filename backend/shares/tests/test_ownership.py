@@ -0,0 +1,95 @@
+import pytest
+from django.core.management import CommandError, call_command
+
+from shares import holdings, ownership
+from shares.models import OwnershipDelta, ShareLedgerEntry
+from tests.factories import CooperativeFactory, HoldingFactory, IndividualFactory, UserFactory
+
+
+pytestmark = pytest.mark.django_db
+
+PURCHASE = ShareLedgerEntry.Kind.PURCHASE
+SALE = ShareLedgerEntry.Kind.SALE
+
+
+def test_holdings_writes_keep_the_figures_exact(monkeypatch):
+    monkeypatch.setattr(ownership, "COMPACT_AFTER", 2)
+    coop = CooperativeFactory()
+    a, b, c = UserFactory(), UserFactory(), UserFactory()
+
+    holdings.credit_many(coop_id=coop.id, credits={a.id: 10, b.id: 5, c.id: 0}, kind=PURCHASE)
+    assert ownership.figures(coop.id) == (2, 15, 125)
+
+    holdings.debit(coop_id=coop.id, user_id=b.id, quantity=5, kind=SALE)
+    holdings.credit(coop_id=coop.id, user_id=c.id, quantity=3, kind=PURCHASE)
+    holdings.credit(coop_id=coop.id, user_id=a.id, quantity=1, kind=PURCHASE)
+    with pytest.raises(ValueError):
+        holdings.debit(coop_id=coop.id, user_id=b.id, quantity=1, kind=SALE)
+
+    # 4 pending deltas: this read folds them into the compacted row
+    assert ownership.figures(coop.id) == (2, 14, 11**2 + 3**2)
+    assert not OwnershipDelta.objects.filter(cooperative=coop).exists()
+    assert ownership.verify(coop.id) == []
+
+
+def test_writers_compact_the_deltas_without_any_reads(monkeypatch, django_capture_on_commit_callbacks):
+    monkeypatch.setattr(ownership, "COMPACT_AFTER", 3)
+    coop = CooperativeFactory()
+    users = UserFactory.create_batch(3)
+
+    pending = []
+    for n in range(10):
+        # Each write is its own transaction: the compaction runs when it commits
+        with django_capture_on_commit_callbacks(execute=True):
+            holdings.credit(coop_id=coop.id, user_id=users[n % 3].id, quantity=n + 1, kind=PURCHASE)
+        pending.append(OwnershipDelta.objects.filter(cooperative=coop).count())
+    with django_capture_on_commit_callbacks(execute=True):
+        holdings.debit(coop_id=coop.id, user_id=users[0].id, quantity=2, kind=SALE)
+
+    assert max(pending) == 3
+    assert pending[3] == 0
+    assert ownership.verify(coop.id) == []
+
+
+def test_a_failed_compaction_does_not_fail_the_write(monkeypatch, django_capture_on_commit_callbacks):
+    monkeypatch.setattr(ownership, "COMPACT_AFTER", 1)
+    monkeypatch.setattr(ownership, "compact_deltas", lambda coop_id: 1 / 0)
+    coop, user = CooperativeFactory(), UserFactory()
+
+    holdings.credit(coop_id=coop.id, user_id=user.id, quantity=2, kind=PURCHASE)
+    with django_capture_on_commit_callbacks(execute=True):
+        # Finds the first write's delta pending: compaction is due, and fails
+        assert holdings.credit(coop_id=coop.id, user_id=user.id, quantity=2, kind=PURCHASE) == 4
+    assert OwnershipDelta.objects.filter(cooperative=coop).count() == 2
+
+
+def test_distribution_has_top_holders_and_an_others_bucket(monkeypatch):
+    monkeypatch.setattr(ownership, "TOP_K", 2)
+    coop = CooperativeFactory(price_per_share=10)
+    alice = IndividualFactory(full_name="Alice").user
+    bob = UserFactory(username="bob")
+    holdings.credit_many(
+        coop_id=coop.id,
+        credits={alice.id: 50, bob.id: 30, UserFactory().id: 15, UserFactory().id: 5},
+        kind=PURCHASE,
+    )
+
+    d = ownership.distribution(coop)
+    assert [(h["name"], h["quantity"], h["worth"]) for h in d["top"]] == [("Alice", 50, 500), ("bob", 30, 300)]
+    assert (d["holders"], d["total_held"], d["others_holders"], d["others_held"]) == (4, 100, 2, 20)
+    assert d["top_percent"] == 80
+    assert d["hhi"] == 50**2 + 30**2 + 15**2 + 5**2
+
+
+def test_rebuild_command_repairs_drift():
+    coop = CooperativeFactory()
+    holdings.credit(coop_id=coop.id, user_id=UserFactory().id, quantity=4, kind=PURCHASE)
+    # Written behind shares.holdings' back
+    HoldingFactory(cooperative=coop, quantity=6)
+
+    with pytest.raises(CommandError, match="1 cooperative"):
+        call_command("rebuild_ownership", "--verify")
+
+    call_command("rebuild_ownership")
+    assert ownership.figures(coop.id) == (2, 10, 52)
+    call_command("rebuild_ownership", "--verify")
@@ -0,0 +1,55 @@
+from datetime import timedelta
+
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+
+from shares.models import ShareListing
+from taavonyar.pagination import decode_cursor, encode_cursor, keyset_page
+from tests.factories import ListingFactory, UserFactory
+
+
+pytestmark = pytest.mark.django_db
+
+
+def test_cursor_round_trip():
+    now = timezone.now()
+    assert decode_cursor(encode_cursor(now, 42)) == (now, 42)
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_keyset_walks_every_row_once_including_timestamp_ties():
+    seller = UserFactory()
+    listings = ListingFactory.create_batch(7, seller=seller)
+    # Give three rows the same timestamp so the id tie-breaker matters
+    same = timezone.now() - timedelta(days=1)
+    ShareListing.objects.filter(id__in=[listings[1].id, listings[2].id, listings[3].id]).update(created_at=same)
+
+    seen, cursor = [], None
+    while True:
+        page = keyset_page(ShareListing.objects.filter(seller=seller), cursor=cursor, per_page=3)
+        seen.extend(listing.id for listing in page.items)
+        if not page.has_next:
+            break
+        cursor = page.next_cursor
+
+    expected = list(
+        ShareListing.objects.filter(seller=seller).order_by("-created_at", "-id").values_list("id", flat=True)
+    )
+    assert seen == expected
+
+
+def test_my_listings_shows_older_link(client):
+    seller = UserFactory()
+    ListingFactory.create_batch(51, seller=seller)
+    client.force_login(seller)
+
+    response = client.get(reverse("shares:my_listings"))
+    assert len(response.context["listings"]) == 50
+    cursor = response.context["page"].next_cursor
+    assert f"?before={cursor}" in response.content.decode()
+
+    response = client.get(reverse("shares:my_listings"), {"before": cursor})
+    assert len(response.context["listings"]) == 1
+    assert not response.context["page"].has_next
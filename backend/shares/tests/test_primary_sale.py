@@ -0,0 +1,37 @@
+import pytest
+
+from shares.models import ShareHolding, ShareTrade
+from shares.services import buy_primary_shares_from_coop
+from tests.factories import CooperativeFactory, UserFactory
+
+
+pytestmark = pytest.mark.django_db
+
+
+def test_primary_sale_decrements_inventory_and_credits_buyer(django_assert_max_num_queries):
+    coop = CooperativeFactory(price_per_share=700, available_primary_shares=10)
+    buyer = UserFactory()
+
+    with django_assert_max_num_queries(6):  # timeouts, guarded update/insert, holding upsert, volume deltas (+ savepoints)
+        trade = buy_primary_shares_from_coop(coop=coop, buyer=buyer, quantity=4)
+
+    coop.refresh_from_db()
+    assert coop.available_primary_shares == 6
+    assert ShareHolding.objects.get(cooperative=coop, user=buyer).quantity == 4
+    assert trade.pk is not None
+    assert trade.seller_id is None
+    assert (trade.price_per_share, trade.total_price) == (700, 2800)
+    assert ShareTrade.objects.get(pk=trade.pk).total_price == 2800
+
+
+def test_primary_sale_over_inventory_rolls_back():
+    coop = CooperativeFactory(available_primary_shares=3)
+    buyer = UserFactory()
+
+    with pytest.raises(ValueError):
+        buy_primary_shares_from_coop(coop=coop, buyer=buyer, quantity=4)
+
+    coop.refresh_from_db()
+    assert coop.available_primary_shares == 3
+    assert not ShareHolding.objects.filter(cooperative=coop, user=buyer).exists()
+    assert not ShareTrade.objects.filter(cooperative=coop).exists()
@@ -0,0 +1,75 @@
+import pytest
+from django.utils import timezone
+
+from shares import volume
+from shares.models import TradeVolumeBucket, TradeVolumeDelta
+from shares.services import buy_from_listing, buy_from_marketplace, buy_primary_shares_from_coop, create_listing
+from tests.factories import CooperativeFactory, UserFactory
+
+
+pytestmark = pytest.mark.django_db
+
+
+def _snapshot(coop):
+    return [
+        (period, b.bucket_start, *(getattr(b, c) for c in volume._COUNTERS))
+        for period in TradeVolumeBucket.Period.values
+        for b in volume.series(coop.id, period=period)
+    ]
+
+
+def test_services_roll_up_trades_by_day_and_month():
+    coop = CooperativeFactory(price_per_share=10, available_primary_shares=100)
+    seller, buyer = UserFactory(), UserFactory()
+
+    buy_primary_shares_from_coop(coop=coop, buyer=seller, quantity=20)
+    listing = create_listing(coop=coop, seller=seller, quantity=8)
+    buy_from_listing(listing=listing, buyer=buyer, quantity=3)
+    buy_from_marketplace(coop=coop, buyer=buyer, quantity=5, source="secondary")
+
+    today = timezone.localdate()
+    [day] = volume.series(coop.id, period=TradeVolumeBucket.Period.DAY, since=today)
+    assert (day.bucket_start, day.trade_count, day.share_count, day.value) == (today, 3, 28, 280)
+    assert (day.primary_share_count, day.secondary_share_count) == (20, 8)
+    [month] = volume.series(coop.id, period=TradeVolumeBucket.Period.MONTH)
+    assert (month.bucket_start, month.share_count) == (today.replace(day=1), day.share_count)
+
+    # The rebuild from ShareTrade agrees with the incremental rollup
+    incremental = _snapshot(coop)
+    volume.rebuild(coop.id)
+    assert _snapshot(coop) == incremental
+    assert not TradeVolumeDelta.objects.filter(cooperative=coop).exists()
+
+
+def test_trades_only_append_deltas_until_folded(monkeypatch):
+    monkeypatch.setattr(volume, "COMPACT_AFTER", 4)
+    coop = CooperativeFactory(price_per_share=10, available_primary_shares=100)
+    buyer = UserFactory()
+
+    # Each primary sale appends a day and a month delta; no bucket row is written
+    buy_primary_shares_from_coop(coop=coop, buyer=buyer, quantity=1)
+    assert TradeVolumeDelta.objects.filter(cooperative=coop).count() == 2
+    assert not TradeVolumeBucket.objects.filter(cooperative=coop).exists()
+
+    for _ in range(3):
+        buy_primary_shares_from_coop(coop=coop, buyer=buyer, quantity=1)
+    before = _snapshot(coop)
+
+    volume.compact(coop.id)
+    assert not TradeVolumeDelta.objects.filter(cooperative=coop).exists()
+    assert TradeVolumeBucket.objects.filter(cooperative=coop).count() == 2
+    assert _snapshot(coop) == before
+    assert before[0][2:4] == (4, 4)
+
+
+def test_writer_past_the_threshold_folds_after_commit(monkeypatch, django_capture_on_commit_callbacks):
+    monkeypatch.setattr(volume, "COMPACT_AFTER", 4)
+    coop = CooperativeFactory(price_per_share=10, available_primary_shares=100)
+    buyer = UserFactory()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        for _ in range(3):
+            buy_primary_shares_from_coop(coop=coop, buyer=buyer, quantity=1)
+
+    assert not TradeVolumeDelta.objects.filter(cooperative=coop).exists()
+    assert _snapshot(coop)[0][2] == 3
@@ -1,6 +1,5 @@
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
-from django.db.models import Sum
 from django.contrib import messages
 from coops.models import Cooperative
 from projects.models import Contribution
@@ -11,55 +10,47 @@ from .services import (
     buy_primary_shares_from_coop,
     buy_from_marketplace,
 )
+from . import leaderboard, marketplace as market
 from django.db import models
-import csv
-from django.http import HttpResponse
 from django.urls import reverse
 from urllib.parse import quote_plus
+from taavonyar.csv_stream import EXPORT_CHUNK_SIZE, stream_csv
+from taavonyar.pagination import keyset_page
+from taavonyar.query_budget import query_budget
 
 
 
 
+@query_budget(9)
 @login_required
 def marketplace(request):
-    coop_id = request.GET.get("coop")
-    coops_qs = Cooperative.objects.order_by("name")
-    if coop_id:
-        coops_qs = coops_qs.filter(id=coop_id)
-
-    # Secondary availability EXCLUDING buyer’s own listings
-    secondary_totals = {
-        row["cooperative_id"]: int(row["total"] or 0)
-        for row in (
-            ShareListing.objects
-            .filter(status=ShareListing.Status.ACTIVE)
-            .exclude(seller=request.user)
-            .values("cooperative_id")
-            .annotate(total=Sum("quantity_available"))
-        )
-    }
-
-    rows = []
-    for c in coops_qs:
-        primary = int(c.available_primary_shares)
-        secondary = secondary_totals.get(c.id, 0)
-        rows.append({
-            "coop": c,
-            "primary": primary,
-            "secondary": secondary,                 
-            "total_for_buyer": primary + secondary, 
-        })
+    coop_id = request.GET.get("coop", "")
+    search = (request.GET.get("q") or "").strip()
+    available_only = request.GET.get("available") == "1"
+
+    page = market.page(
+        number=request.GET.get("page"),
+        coop_id=int(coop_id) if coop_id.isdigit() else None,
+        search=search,
+        available_only=available_only,
+    )
+    # Cached rows are the same for everyone; only the buyer's own listings differ
+    rows = market.rows_for_buyer(page["rows"], request.user)
 
     return render(
         request,
         "shares/marketplace.html",
         {
             "rows": rows,
-            "all_coops": Cooperative.objects.order_by("name"),
+            "page": page,
+            "sellable": market.sellable_coops(request.user),
             "selected_coop_id": coop_id,
+            "search": search,
+            "available_only": available_only,
         },
     )
 
+@query_budget(11)
 @login_required
 def buy_listing(request, listing_id: int):
     if request.method != "POST":
@@ -81,6 +72,7 @@ def buy_listing(request, listing_id: int):
 
 
 
+@query_budget(7)
 @login_required
 def buy_primary(request):
     if request.method != "POST":
@@ -104,6 +96,7 @@ def buy_primary(request):
 
 
 
+@query_budget(7)
 @login_required
 def create_listing(request):
     if request.method != "POST":
@@ -123,16 +116,17 @@ def create_listing(request):
 
 
 
+@query_budget(6)
 @login_required
 def my_listings(request):
-    listings = (
-        ShareListing.objects.select_related("cooperative")
-        .filter(seller=request.user)
-        .order_by("-created_at")
+    page = keyset_page(
+        ShareListing.objects.select_related("cooperative").filter(seller=request.user),
+        cursor=request.GET.get("before"),
     )
-    return render(request, "shares/my_listings.html", {"listings": listings})
+    return render(request, "shares/my_listings.html", {"listings": page.items, "page": page})
 
 
+@query_budget(8)
 @login_required
 def cancel_listing(request, listing_id: int):
     if request.method != "POST":
@@ -150,24 +144,34 @@ def cancel_listing(request, listing_id: int):
     return redirect("shares:my_listings")
 
 
+@query_budget(7)
 @login_required
 def my_trades(request):
-    trades_bought = (
-        ShareTrade.objects.select_related("cooperative", "seller", "buyer")
-        .filter(buyer=request.user)
-        .order_by("-created_at")[:50]
+    # Each side pages independently; the other side's cursor is kept in its links
+    bought_before = request.GET.get("bought_before", "")
+    sold_before = request.GET.get("sold_before", "")
+    bought = keyset_page(
+        ShareTrade.objects.select_related("cooperative").filter(buyer=request.user),
+        cursor=bought_before,
     )
-    trades_sold = (
-        ShareTrade.objects.select_related("cooperative", "seller", "buyer")
-        .filter(seller=request.user)
-        .order_by("-created_at")[:50]
+    sold = keyset_page(
+        ShareTrade.objects.select_related("cooperative").filter(seller=request.user),
+        cursor=sold_before,
     )
     return render(
         request,
         "shares/my_trades.html",
-        {"trades_bought": trades_bought, "trades_sold": trades_sold},
+        {
+            "trades_bought": bought.items,
+            "trades_sold": sold.items,
+            "bought_page": bought,
+            "sold_page": sold,
+            "bought_before": bought_before,
+            "sold_before": sold_before,
+        },
     )
 
+@query_budget(14)
 @login_required
 def buy_marketplace(request):
     if request.method != "POST":
@@ -191,18 +195,22 @@ def buy_marketplace(request):
 
     return redirect(f"/shares/marketplace/?coop={coop.id}")
 
+@query_budget(8)
 @login_required
 def shareholder_dashboard(request):
-    holdings = (
+    holdings = list(
         ShareHolding.objects.select_related("cooperative")
         .filter(user=request.user)
         .order_by("cooperative__name")
     )
+    ranks = leaderboard.ranks(request.user.id)
+    for h in holdings:
+        h.rank = ranks.get(h.cooperative_id)
 
-    contributions = (
-        Contribution.objects.select_related("project", "project__cooperative")
-        .filter(user=request.user)
-        .order_by("-created_at")[:20]
+    contributions_page = keyset_page(
+        Contribution.objects.select_related("project", "project__cooperative").filter(user=request.user),
+        cursor=request.GET.get("contributions_before"),
+        per_page=20,
     )
 
     # chart data
@@ -228,7 +236,8 @@ def shareholder_dashboard(request):
         "shares/shareholder_dashboard.html",
         {
             "holdings": holdings,
-            "contributions": contributions,
+            "contributions": contributions_page.items,
+            "contributions_page": contributions_page,
             "portfolio_labels_json": portfolio_labels,
             "portfolio_values_json": portfolio_values,
             "shareholder_id": shareholder_id,
@@ -239,91 +248,110 @@ def shareholder_dashboard(request):
     )
 
 
+@query_budget(3)
 @login_required
 def export_my_holdings_csv(request):
     holdings = (
-        ShareHolding.objects.select_related("cooperative")
+        ShareHolding.objects
         .filter(user=request.user)
         .order_by("cooperative__name")
+        .values_list("cooperative__name", "quantity", "cooperative__price_per_share")
     )
 
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = 'attachment; filename="my_holdings.csv"'
-    writer = csv.writer(response)
-    writer.writerow(["cooperative", "share_count", "price_per_share", "share_worth_tooman"])
+    def rows():
+        yield ["cooperative", "share_count", "price_per_share", "share_worth_tooman"]
+        for name, quantity, price in holdings.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            yield [name, quantity, price, quantity * price]
 
-    for h in holdings:
-        worth = h.quantity * h.cooperative.price_per_share
-        writer.writerow([h.cooperative.name, h.quantity, h.cooperative.price_per_share, worth])
-
-    return response
+    return stream_csv("my_holdings.csv", rows())
 
 
+@query_budget(3)
 @login_required
 def export_my_contributions_csv(request):
     contributions = (
-        Contribution.objects.select_related("project", "project__cooperative")
+        Contribution.objects
         .filter(user=request.user)
         .order_by("-created_at")
+        .values_list(
+            "created_at",
+            "project__cooperative__name",
+            "project__title",
+            "amount",
+            "project__status",
+            "allocated_shares",
+        )
     )
 
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = 'attachment; filename="my_contributions.csv"'
-    writer = csv.writer(response)
-    writer.writerow([
-        "created_at", "cooperative", "project", "amount_tooman",
-        "project_status", "allocated_shares"
-    ])
-
-    for c in contributions:
-        writer.writerow([
-            c.created_at.isoformat(),
-            c.project.cooperative.name,
-            c.project.title,
-            c.amount,
-            c.project.status,
-            c.allocated_shares if c.allocated_shares is not None else "",
-        ])
-
-    return response
-
-
+    def rows():
+        yield [
+            "created_at", "cooperative", "project", "amount_tooman",
+            "project_status", "allocated_shares"
+        ]
+        for created_at, coop_name, title, amount, status, allocated in contributions.iterator(
+            chunk_size=EXPORT_CHUNK_SIZE
+        ):
+            yield [
+                created_at.isoformat(),
+                coop_name,
+                title,
+                amount,
+                status,
+                allocated if allocated is not None else "",
+            ]
+
+    return stream_csv("my_contributions.csv", rows())
+
+
+@query_budget(3)
 @login_required
 def export_my_trade_logs_csv(request):
+    user_id = request.user.id
     trades = (
-        ShareTrade.objects.select_related("cooperative", "seller__individual", "buyer__individual")
+        ShareTrade.objects
         .filter(models.Q(buyer=request.user) | models.Q(seller=request.user))
         .order_by("-created_at")
+        .values_list(
+            "created_at",
+            "cooperative__name",
+            "buyer_id",
+            "buyer__username",
+            "buyer__individual__full_name",
+            "seller_id",
+            "seller__username",
+            "seller__individual__full_name",
+            "quantity",
+            "price_per_share",
+            "total_price",
+        )
     )
 
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = 'attachment; filename="my_trade_logs.csv"'
-    writer = csv.writer(response)
-    writer.writerow([
-        "created_at", "cooperative", "direction",
-        "counterparty", "quantity", "price_per_share", "total_price"
-    ])
-
-    for t in trades:
-        if t.buyer_id == request.user.id:
-            direction = "BUY"
-            if t.seller is None:
-                counterparty = "COOP_PRIMARY"
+    def rows():
+        yield [
+            "created_at", "cooperative", "direction",
+            "counterparty", "quantity", "price_per_share", "total_price"
+        ]
+        for (
+            created_at, coop_name,
+            buyer_id, buyer_username, buyer_name,
+            seller_id, seller_username, seller_name,
+            quantity, price_per_share, total_price,
+        ) in trades.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            if buyer_id == user_id:
+                direction = "BUY"
+                counterparty = "COOP_PRIMARY" if seller_id is None else (seller_name or seller_username)
             else:
-                counterparty = getattr(t.seller.individual, "full_name", t.seller.username)
-        else:
-            direction = "SELL"
-            counterparty = getattr(t.buyer.individual, "full_name", t.buyer.username)
-
-        writer.writerow([
-            t.created_at.isoformat(),
-            t.cooperative.name,
-            direction,
-            counterparty,
-            t.quantity,
-            t.price_per_share,
-            t.total_price,
-        ])
-
-    return response
-
+                direction = "SELL"
+                counterparty = buyer_name or buyer_username
+
+            yield [
+                created_at.isoformat(),
+                coop_name,
+                direction,
+                counterparty,
+                quantity,
+                price_per_share,
+                total_price,
+            ]
+
+    return stream_csv("my_trade_logs.csv", rows())
@@ -0,0 +1,173 @@
+"""
+Daily and monthly trade-volume rollups per cooperative.
+
+Every service that writes ShareTrade rows calls record_trades() in the same
+transaction, so charts and reports read O(buckets) rows instead of scanning
+the trades. Buckets are keyed by the trade's date in settings.TIME_ZONE.
+
+record_trades() only appends TradeVolumeDelta rows: a trade never updates the
+coop's current day and month rows, so purchases of one coop don't queue on
+them (the same reason shares.ownership keeps OwnershipDelta). series() adds
+the pending deltas to the compacted TradeVolumeBucket rows. The writer that
+finds COMPACT_AFTER pending folds them in (compact(), after its commit).
+"""
+from collections.abc import Iterable
+from datetime import date
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import ShareTrade, TradeVolumeBucket, TradeVolumeDelta
+
+# Column order shared by the inserts, the fold and the rebuild
+_COUNTERS = ("trade_count", "share_count", "value", "primary_trade_count", "primary_share_count", "primary_value")
+
+# Pending deltas per coop before they are folded in; bounds the rows series() sums
+COMPACT_AFTER = 100
+
+
+def record_trades(trades: Iterable[ShareTrade]) -> None:
+    """Append freshly written trades to their day and month buckets in one statement."""
+    buckets: dict[tuple[int, str, date], list[int]] = {}
+    for t in trades:
+        day = timezone.localdate(t.created_at)
+        month = day.replace(day=1)
+        primary = t.seller_id is None
+        delta = (1, t.quantity, t.total_price, int(primary), t.quantity * primary, t.total_price * primary)
+        for period, start in ((TradeVolumeBucket.Period.DAY, day), (TradeVolumeBucket.Period.MONTH, month)):
+            row = buckets.setdefault((t.cooperative_id, period, start), [0] * len(_COUNTERS))
+            for i, value in enumerate(delta):
+                row[i] += value
+    if not buckets:
+        return
+
+    deltas = TradeVolumeDelta._meta.db_table
+    keys = list(buckets)
+    columns = list(zip(*buckets.values()))
+    coop_ids = sorted({k[0] for k in keys})
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH appended AS (
+                INSERT INTO {deltas} (cooperative_id, period, bucket_start, {", ".join(_COUNTERS)})
+                SELECT * FROM unnest(
+                    %s::bigint[], %s::varchar[], %s::date[],
+                    %s::integer[], %s::bigint[], %s::bigint[], %s::integer[], %s::bigint[], %s::bigint[]
+                )
+            )
+            SELECT cooperative_id, COUNT(*) FROM {deltas}
+            WHERE cooperative_id = ANY(%s::bigint[])
+            GROUP BY cooperative_id
+            """,
+            [
+                [k[0] for k in keys],
+                [k[1] for k in keys],
+                [k[2] for k in keys],
+                *(list(c) for c in columns),
+                coop_ids,
+            ],
+        )
+        pending = cursor.fetchall()
+
+    for coop_id, count in pending:
+        if count >= COMPACT_AFTER:
+            # As in shares.holdings: after commit, and a failed fold must not fail the trade
+            transaction.on_commit(lambda coop_id=coop_id: compact(coop_id), robust=True)
+
+
+@transaction.atomic
+def compact(coop_id: int) -> None:
+    """Fold the coop's pending deltas into its TradeVolumeBucket rows."""
+    table = TradeVolumeBucket._meta.db_table
+    deltas = TradeVolumeDelta._meta.db_table
+    sums = ", ".join(f"SUM({c})" for c in _COUNTERS)
+    updates = ", ".join(f"{c} = {table}.{c} + EXCLUDED.{c}" for c in _COUNTERS)
+    with connection.cursor() as cursor:
+        # As in ownership.compact, the DELETE makes a concurrent compaction skip these rows
+        cursor.execute(
+            f"""
+            WITH folded AS (
+                DELETE FROM {deltas} WHERE cooperative_id = %(coop)s
+                RETURNING period, bucket_start, {", ".join(_COUNTERS)}
+            )
+            INSERT INTO {table} (cooperative_id, period, bucket_start, {", ".join(_COUNTERS)})
+            SELECT %(coop)s, period, bucket_start, {sums} FROM folded GROUP BY period, bucket_start
+            ON CONFLICT (cooperative_id, period, bucket_start) DO UPDATE SET {updates}
+            """,
+            {"coop": coop_id},
+        )
+
+
+def series(coop_id: int, *, period: str, since: date | None = None) -> list[TradeVolumeBucket]:
+    """Buckets of one cooperative, oldest first (only buckets that had trades), pending deltas included."""
+    table = TradeVolumeBucket._meta.db_table
+    deltas = TradeVolumeDelta._meta.db_table
+    columns = ", ".join(_COUNTERS)
+    where = "cooperative_id = %(coop)s AND period = %(period)s AND (%(since)s::date IS NULL OR bucket_start >= %(since)s)"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT bucket_start, {", ".join(f"SUM({c})" for c in _COUNTERS)}
+            FROM (
+                SELECT bucket_start, {columns} FROM {table} WHERE {where}
+                UNION ALL
+                SELECT bucket_start, {columns} FROM {deltas} WHERE {where}
+            ) AS b
+            GROUP BY bucket_start
+            HAVING SUM(trade_count) > 0
+            ORDER BY bucket_start
+            """,
+            {"coop": coop_id, "period": period, "since": since},
+        )
+        rows = cursor.fetchall()
+    return [
+        TradeVolumeBucket(
+            cooperative_id=coop_id,
+            period=period,
+            bucket_start=bucket_start,
+            **{c: int(v) for c, v in zip(_COUNTERS, counters)},
+        )
+        for bucket_start, *counters in rows
+    ]
+
+
+@transaction.atomic
+def rebuild(coop_id: int) -> None:
+    """Recompute every bucket of one cooperative from its trades."""
+    table = TradeVolumeBucket._meta.db_table
+    deltas = TradeVolumeDelta._meta.db_table
+    trade_table = ShareTrade._meta.db_table
+    with connection.cursor() as cursor:
+        # One statement, one snapshot (see ownership.rebuild): the deltas it drops
+        # are exactly those whose trades the recount sees. Buckets no trade
+        # reaches any more are zeroed, as in leaderboard.rebuild.
+        cursor.execute(
+            f"""
+            WITH dropped AS (
+                DELETE FROM {deltas} WHERE cooperative_id = %(coop)s
+            ),
+            actual AS (
+                SELECT p.period,
+                       CASE p.period WHEN 'DAY' THEN d.day ELSE date_trunc('month', d.day)::date END AS bucket_start,
+                       COUNT(*) AS trade_count, SUM(quantity) AS share_count, SUM(total_price) AS value,
+                       COUNT(*) FILTER (WHERE seller_id IS NULL) AS primary_trade_count,
+                       COALESCE(SUM(quantity) FILTER (WHERE seller_id IS NULL), 0) AS primary_share_count,
+                       COALESCE(SUM(total_price) FILTER (WHERE seller_id IS NULL), 0) AS primary_value
+                FROM {trade_table}
+                CROSS JOIN LATERAL (SELECT (created_at AT TIME ZONE %(tz)s)::date AS day) AS d
+                CROSS JOIN (VALUES ('DAY'), ('MONTH')) AS p(period)
+                WHERE cooperative_id = %(coop)s
+                GROUP BY 1, 2
+            )
+            INSERT INTO {table} (cooperative_id, period, bucket_start, {", ".join(_COUNTERS)})
+            SELECT %(coop)s, period, bucket_start, {", ".join(f"COALESCE(a.{c}, 0)" for c in _COUNTERS)}
+            FROM actual a
+            FULL JOIN (
+                SELECT period, bucket_start FROM {table} WHERE cooperative_id = %(coop)s
+            ) AS k USING (period, bucket_start)
+            ON CONFLICT (cooperative_id, period, bucket_start) DO UPDATE SET
+                {", ".join(f"{c} = EXCLUDED.{c}" for c in _COUNTERS)}
+            """,
+            {"coop": coop_id, "tz": settings.TIME_ZONE},
+        )
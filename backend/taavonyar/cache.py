@@ -0,0 +1,160 @@
+"""
+Versioned cache namespaces.
+
+Cached values are stored under keys that embed their namespace's current
+version number. Invalidating a namespace bumps the number, so every older key
+is simply never read again (and expires on its own) instead of having to be
+found and deleted.
+
+Writers call bump_version() inside their transaction: the bump runs on
+commit, so a reader can never cache pre-commit data under the new version.
+
+stale_while_revalidate() keeps one entry per key instead and records the
+versions it was computed from. When they move on, a single request recomputes
+it while concurrent ones keep getting the previous value, and an entry is
+never recomputed more often than every REFRESH_INTERVAL seconds, so a burst of
+writes costs each key a handful of queries rather than one per reader.
+cache_public_page() applies that to whole pages for anonymous visitors.
+
+All of this relies on every worker process sharing the cache: settings use
+Redis when REDIS_URL is set, and `check --deploy` warns while the cache is a
+per-process LocMemCache, in which a bump only reaches the process that made
+the write.
+"""
+import functools
+import hashlib
+import time
+from collections.abc import Callable, Iterable
+
+from django.conf import settings
+from django.contrib import messages
+from django.core import checks
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+
+# Longest an entry is served at all, even if an invalidation is missed
+SWR_TIMEOUT = 300
+
+# Minimum age before an outdated entry is recomputed; younger ones are served as is
+REFRESH_INTERVAL = 5
+
+# How long one request may hold the right to recompute an entry
+REFRESH_LOCK_TIMEOUT = 30
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    if settings.CACHES["default"]["BACKEND"] == "django.core.cache.backends.locmem.LocMemCache":
+        return [
+            checks.Warning(
+                "The cache is per process, so invalidations don't reach other worker processes.",
+                hint="Set REDIS_URL to a Redis shared by every process.",
+                id="taavonyar.W001",
+            )
+        ]
+    return []
+
+
+def _version_key(namespace: str) -> str:
+    return f"v:{namespace}"
+
+
+def _fresh_version() -> int:
+    # Starts from the clock, so a version key that was evicted never restarts
+    # at a number whose entries are still cached
+    return time.time_ns() // 1000
+
+
+def current_version(namespace: str) -> int:
+    version = cache.get(_version_key(namespace))
+    if version is None:
+        cache.add(_version_key(namespace), _fresh_version(), timeout=None)
+        version = cache.get(_version_key(namespace))
+    return version
+
+
+def _bump(namespace: str) -> None:
+    try:
+        cache.incr(_version_key(namespace))
+    except ValueError:
+        cache.set(_version_key(namespace), _fresh_version(), timeout=None)
+
+
+def bump_version(namespace: str) -> None:
+    """Invalidate everything cached under `namespace` once the current transaction commits."""
+    transaction.on_commit(lambda: _bump(namespace))
+
+
+def versioned_key(namespace: str, *parts) -> str:
+    return ":".join([namespace, f"v{current_version(namespace)}", *map(str, parts)])
+
+
+def digest(text: str) -> str:
+    """Fixed-length stand-in for free text (searches, query strings) in a cache key."""
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def current_versions(namespaces: Iterable[str]) -> dict[str, int]:
+    return {ns: current_version(ns) for ns in namespaces}
+
+
+def stale_while_revalidate(key: str, compute: Callable, *, namespaces: Iterable[str]):
+    """
+    The cached value of `key`, recomputed by one caller once any of `namespaces`
+    has been bumped (and the entry is at least REFRESH_INTERVAL old).
+    A `compute` result of None is returned but not cached.
+    """
+    versions = current_versions(namespaces)
+    entry = cache.get(key)
+    now = time.time()
+    if entry is not None:
+        if entry["versions"] == versions:
+            return entry["value"]
+        if now - entry["at"] < REFRESH_INTERVAL:
+            return entry["value"]
+        if not cache.add(f"{key}:refresh", 1, REFRESH_LOCK_TIMEOUT):
+            # Someone else is recomputing it
+            return entry["value"]
+
+    try:
+        value = compute()
+        if value is not None:
+            cache.set(key, {"value": value, "versions": versions, "at": now}, SWR_TIMEOUT)
+    finally:
+        if entry is not None:
+            cache.delete(f"{key}:refresh")
+    return value
+
+
+def cache_public_page(namespaces: Callable[..., Iterable[str]]):
+    """
+    Serve a view's GET responses to anonymous visitors from the cache.
+    `namespaces(**view_kwargs)` names the versions the page depends on.
+    Signed-in users always get the live view (their pages show forms and CSRF
+    tokens), and so does a visitor with flash messages waiting to be shown.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != "GET" or request.user.is_authenticated or len(messages.get_messages(request)):
+                return view(request, *args, **kwargs)
+
+            uncacheable = []
+
+            def render():
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200 or response.streaming or response.cookies:
+                    uncacheable.append(response)
+                    return None
+                return response.content, response["Content-Type"]
+
+            cached = stale_while_revalidate(
+                f"page:{digest(request.get_full_path())}", render, namespaces=namespaces(**kwargs)
+            )
+            if uncacheable:
+                return uncacheable[0]
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+        return wrapper
+    return decorator
@@ -0,0 +1,120 @@
+"""
+Database connection runtime.
+
+settings.DATABASES opens connections either from a per-process psycopg pool
+(POSTGRES_POOL=1) or as one persistent connection per worker thread, and
+starts every connection with the POSTGRES_*_TIMEOUT_MS server limits.
+
+The purchase services wait on rows other buyers hold (the cooperative row,
+listings, striped slots). @purchase_timeouts lowers the limits for the rest
+of their transaction, so a stuck lock holder makes buyers fail fast with a
+"try again" error instead of piling up behind it. set_config(..., true) is
+transaction-local: inside a caller's outer transaction the lower limits last
+until that transaction ends.
+
+Workers and bulk commands legitimately run statements longer than that:
+their handle() is wrapped in @without_statement_timeout, which lifts the limit
+on every connection the command's process uses until it returns.
+
+connection_stats() feeds the staff /perf/ page: the pool's own counters when
+pooling, otherwise how many connections this process has opened.
+"""
+import functools
+
+from django.conf import settings
+from django.db import OperationalError, connection
+from django.db.backends.signals import connection_created
+
+# SQLSTATEs of statements canceled by statement_timeout and lock_timeout
+QUERY_CANCELED = "57014"
+LOCK_NOT_AVAILABLE = "55P03"
+
+# Connections opened by this process (the pool counts its own)
+_opened = 0
+
+# Set while a @without_statement_timeout command runs in this process
+_unlimited = False
+
+
+def _lift_statement_timeout(conn) -> None:
+    with conn.cursor() as cursor:
+        cursor.execute("SET statement_timeout = 0")
+
+
+def _count_connection(sender, connection, **kwargs) -> None:
+    # Unlocked, like taavonyar.perf's counters: a lost increment only skews the figure
+    global _opened
+    _opened += 1
+    if _unlimited:
+        # A worker reconnecting mid-run starts from the settings' limit again
+        _lift_statement_timeout(connection)
+
+
+connection_created.connect(_count_connection, dispatch_uid="taavonyar.db.count_connection")
+
+
+def without_statement_timeout(handle):
+    """
+    Run a management command's handle() with statement_timeout off on this
+    process's connections. lock_timeout and the idle limit still apply.
+    """
+
+    @functools.wraps(handle)
+    def wrapper(*args, **kwargs):
+        global _unlimited
+        _unlimited = True
+        try:
+            if connection.connection is not None:
+                _lift_statement_timeout(connection)
+            return handle(*args, **kwargs)
+        finally:
+            _unlimited = False
+            if connection.connection is not None and connection.is_usable():
+                with connection.cursor() as cursor:
+                    # Back to the limit the connection was opened with
+                    cursor.execute("RESET statement_timeout")
+
+    return wrapper
+
+
+def purchase_timeouts(func):
+    """
+    Run `func` under settings.PURCHASE_*_TIMEOUT_MS. Goes inside
+    @transaction.atomic; a timed-out statement becomes ValueError, like the
+    services' other can't-buy-now errors.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config('statement_timeout', %s, true), set_config('lock_timeout', %s, true)",
+                [f"{settings.PURCHASE_STATEMENT_TIMEOUT_MS}ms", f"{settings.PURCHASE_LOCK_TIMEOUT_MS}ms"],
+            )
+        try:
+            return func(*args, **kwargs)
+        except OperationalError as err:
+            if getattr(err.__cause__, "sqlstate", None) in (QUERY_CANCELED, LOCK_NOT_AVAILABLE):
+                raise ValueError("The marketplace is busy right now, please try again.") from err
+            raise
+
+    return wrapper
+
+
+def connection_stats() -> dict:
+    """This process's connection figures: mode, limits and pool or connection counters."""
+    db = settings.DATABASES["default"]
+    stats = {
+        "mode": "pool" if connection.pool else ("persistent" if db["CONN_MAX_AGE"] else "per request"),
+        "statement_timeout_ms": settings.POSTGRES_STATEMENT_TIMEOUT_MS,
+        "lock_timeout_ms": settings.POSTGRES_LOCK_TIMEOUT_MS,
+        "purchase_statement_timeout_ms": settings.PURCHASE_STATEMENT_TIMEOUT_MS,
+        "purchase_lock_timeout_ms": settings.PURCHASE_LOCK_TIMEOUT_MS,
+    }
+    if connection.pool:
+        # psycopg_pool's counters: size, available, waiting, connections_num/ms, requests_wait_ms, ...
+        stats["pool"] = connection.pool.get_stats()
+    else:
+        stats["conn_max_age"] = db["CONN_MAX_AGE"]
+        stats["connections_opened"] = _opened
+    return stats
@@ -0,0 +1,66 @@
+"""
+Keyset ("seek") pagination over (created_at, id), newest first.
+
+Each page is one index range scan that starts at the cursor, so page N costs
+the same as page 1, unlike OFFSET which reads and discards every earlier row.
+Back the queryset with an index on (<filter columns>, -created_at, -id).
+"""
+import base64
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.db.models import Q, QuerySet
+
+DEFAULT_PER_PAGE = 50
+
+
+@dataclass
+class KeysetPage:
+    items: list
+    next_cursor: str | None
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+
+def encode_cursor(created_at: datetime, pk: int) -> str:
+    raw = f"{created_at.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Inverse of encode_cursor; raises ValueError on anything malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.split("|")
+        return datetime.fromisoformat(created_at), int(pk)
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def keyset_page(queryset: QuerySet, *, cursor: str | None, per_page: int = DEFAULT_PER_PAGE) -> KeysetPage:
+    """
+    Return the page of `queryset` that follows `cursor` (the first page when
+    it is empty or malformed). Items are ordered by -created_at, -id.
+    """
+    queryset = queryset.order_by("-created_at", "-id")
+    if cursor:
+        try:
+            created_at, pk = decode_cursor(cursor)
+        except ValueError:
+            pass
+        else:
+            # The redundant created_at__lte gives the planner an index range bound
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk),
+                created_at__lte=created_at,
+            )
+
+    items = list(queryset[: per_page + 1])
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        last = items[-1]
+        next_cursor = encode_cursor(last.created_at, last.pk)
+    return KeysetPage(items=items, next_cursor=next_cursor)
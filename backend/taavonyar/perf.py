@@ -0,0 +1,191 @@
+"""
+Request performance instrumentation.
+
+PerfMiddleware (enabled with settings.PERF_INSTRUMENTATION) records for every
+request its wall time, SQL statement count and time, the slowest statement and
+the time spent inside the share/project service functions (those decorated
+with @timed_service). Per route it keeps totals and a rolling window of recent
+wall times for percentiles, in process memory: every worker process has its
+own figures, and they reset on restart.
+
+Requests slower than PERF_SLOW_REQUEST_MS are written as one JSON object per
+line to the "taavonyar.perf.slow" logger. The staff page at /perf/ lists the
+routes by total time.
+
+The per-request cost is two perf_counter() calls per SQL statement and per
+service call, a deque append and, for slow requests only, a log line.
+Streaming bodies are not timed: the figures stop when the view returns.
+"""
+import functools
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+slow_log = logging.getLogger("taavonyar.perf.slow")
+
+# Recent requests kept per route for the percentiles
+WINDOW = 512
+
+# Longest SQL text kept for the slowest statement
+SQL_PREVIEW = 500
+
+
+@dataclass
+class RequestStats:
+    sql_count: int = 0
+    sql_ms: float = 0.0
+    slowest_sql_ms: float = 0.0
+    slowest_sql: str = ""
+    service_ms: dict[str, float] = field(default_factory=dict)
+    # Nesting depth of timed services, so only the outermost call is counted
+    service_depth: int = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.sql_count += 1
+            self.sql_ms += elapsed
+            if elapsed > self.slowest_sql_ms:
+                self.slowest_sql_ms = elapsed
+                self.slowest_sql = sql[:SQL_PREVIEW]
+
+
+_current: ContextVar[RequestStats | None] = ContextVar("perf_request_stats", default=None)
+
+
+def timed_service(func):
+    """Add the call's wall time to the current request's service time (no-op outside one)."""
+    name = f"{func.__module__}.{func.__name__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        stats = _current.get()
+        if stats is None:
+            return func(*args, **kwargs)
+        stats.service_depth += 1
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stats.service_depth -= 1
+            if stats.service_depth == 0:
+                elapsed = (time.perf_counter() - started) * 1000
+                stats.service_ms[name] = stats.service_ms.get(name, 0.0) + elapsed
+
+    return wrapper
+
+
+class RouteStats:
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.sql_count = 0
+        self.sql_ms = 0.0
+        self.service_ms = 0.0
+        self.recent: deque[float] = deque(maxlen=WINDOW)
+
+    def add(self, wall_ms: float, stats: RequestStats) -> None:
+        # Unlocked: a lost increment under a race only skews a counter slightly
+        self.count += 1
+        self.total_ms += wall_ms
+        self.sql_count += stats.sql_count
+        self.sql_ms += stats.sql_ms
+        self.service_ms += sum(stats.service_ms.values())
+        self.recent.append(wall_ms)
+
+    def percentiles(self) -> dict[str, float]:
+        recent = sorted(self.recent)
+        if not recent:
+            return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+        last = len(recent) - 1
+        return {f"p{p}": recent[min(last, round(last * p / 100))] for p in (50, 95, 99)}
+
+
+_routes: dict[str, RouteStats] = {}
+_routes_lock = threading.Lock()
+
+
+def _route_stats(route: str) -> RouteStats:
+    stats = _routes.get(route)
+    if stats is None:
+        with _routes_lock:
+            stats = _routes.setdefault(route, RouteStats())
+    return stats
+
+
+def top_routes(limit: int = 25) -> list[dict]:
+    """Routes by total wall time, with means and rolling percentiles."""
+    rows = []
+    for route, s in list(_routes.items()):
+        rows.append({
+            "route": route,
+            "count": s.count,
+            "total_ms": s.total_ms,
+            "mean_ms": s.total_ms / s.count if s.count else 0.0,
+            "mean_sql_count": s.sql_count / s.count if s.count else 0.0,
+            "mean_sql_ms": s.sql_ms / s.count if s.count else 0.0,
+            "mean_service_ms": s.service_ms / s.count if s.count else 0.0,
+            **s.percentiles(),
+        })
+    rows.sort(key=lambda r: r["total_ms"], reverse=True)
+    return rows[:limit]
+
+
+def reset() -> None:
+    with _routes_lock:
+        _routes.clear()
+
+
+def _route_of(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "<unresolved>"
+    return f"{request.method} {match.view_name or match.route}"
+
+
+class PerfMiddleware:
+    """Opt-in: removed from the stack unless settings.PERF_INSTRUMENTATION is on."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PERF_INSTRUMENTATION", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, "PERF_SLOW_REQUEST_MS", 500)
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(stats):
+                response = self.get_response(request)
+        finally:
+            wall_ms = (time.perf_counter() - started) * 1000
+            _current.reset(token)
+
+        route = _route_of(request)
+        _route_stats(route).add(wall_ms, stats)
+        if wall_ms >= self.slow_ms:
+            slow_log.warning(json.dumps({
+                "route": route,
+                "path": request.path,
+                "status": response.status_code,
+                "wall_ms": round(wall_ms, 1),
+                "sql_count": stats.sql_count,
+                "sql_ms": round(stats.sql_ms, 1),
+                "slowest_sql_ms": round(stats.slowest_sql_ms, 1),
+                "slowest_sql": stats.slowest_sql,
+                "service_ms": {k: round(v, 1) for k, v in stats.service_ms.items()},
+            }))
+        return response
@@ -0,0 +1,117 @@
+"""
+Per-view SQL query budgets.
+
+Views declare the most queries one request may run with @query_budget. The
+budget covers the whole request as the client sees it: session and auth
+lookups, template rendering and, for streaming responses, the body.
+
+QueryBudgetMiddleware enforces the budgets when settings.QUERY_BUDGETS_ENFORCED
+is on (the test suite turns it on). A request fails with QueryBudgetExceeded
+when it runs more queries than its budget, or when one query shape (the SQL
+with literals and parameters stripped) runs more than `max_repeats` times,
+which is how an N+1 loop shows up regardless of the row count in the test.
+
+Savepoint statements are not counted: tests wrap every request in a
+transaction, so their number differs from production.
+"""
+import re
+from collections import Counter
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import connection
+
+# The same query shape may legitimately run a couple of times (e.g. one series
+# per period); more than this is treated as a loop over rows.
+DEFAULT_MAX_REPEATS = 3
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_PARAM_LISTS = re.compile(r"%s(?:\s*,\s*%s)+")
+_NAMED_CURSOR = re.compile(r'"_django_curs_[^"]*"')
+_SAVEPOINT = re.compile(r"^\s*(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT)\b", re.IGNORECASE)
+
+
+class QueryBudget(NamedTuple):
+    max_queries: int
+    max_repeats: int = DEFAULT_MAX_REPEATS
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(max_queries: int, *, max_repeats: int = DEFAULT_MAX_REPEATS):
+    """Declare the query budget of a view (apply it outermost, above login_required)."""
+    def decorator(view):
+        view.query_budget = QueryBudget(max_queries, max_repeats)
+        return view
+    return decorator
+
+
+def budget_for(view) -> QueryBudget | None:
+    return getattr(view, "query_budget", None)
+
+
+def query_shape(sql: str) -> str:
+    sql = _NAMED_CURSOR.sub('"_django_curs"', sql)
+    sql = _PARAM_LISTS.sub("%s, ...", sql)
+    return " ".join(_LITERALS.sub("?", sql).split())
+
+
+class QueryLog:
+    """execute_wrapper that counts the queries of one request by shape."""
+
+    def __init__(self):
+        self.count = 0
+        self.shapes: Counter[str] = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        if not _SAVEPOINT.match(sql):
+            self.count += 1
+            self.shapes[query_shape(sql)] += 1
+        return execute(sql, params, many, context)
+
+    def check(self, budget: QueryBudget, path: str) -> None:
+        if self.count > budget.max_queries:
+            raise QueryBudgetExceeded(
+                f"{path} ran {self.count} queries, budget is {budget.max_queries}:\n  "
+                + "\n  ".join(f"{n} x {shape}" for shape, n in self.shapes.most_common())
+            )
+        shape, repeats = self.shapes.most_common(1)[0] if self.shapes else ("", 0)
+        if repeats > budget.max_repeats:
+            raise QueryBudgetExceeded(
+                f"{path} ran the same query {repeats} times (max {budget.max_repeats}), likely N+1:\n  {shape}"
+            )
+
+
+class QueryBudgetMiddleware:
+    """Fails requests that exceed their view's query budget; a no-op unless enforced."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, "QUERY_BUDGETS_ENFORCED", False):
+            return self.get_response(request)
+
+        log = QueryLog()
+        with connection.execute_wrapper(log):
+            response = self.get_response(request)
+
+        match = getattr(request, "resolver_match", None)
+        budget = budget_for(match.func) if match else None
+        if budget is None:
+            return response
+
+        if response.streaming:
+            # The body runs its queries while it is being sent
+            response.streaming_content = self._counted(response.streaming_content, log, budget, request.path)
+        else:
+            log.check(budget, request.path)
+        return response
+
+    @staticmethod
+    def _counted(content, log: QueryLog, budget: QueryBudget, path: str):
+        with connection.execute_wrapper(log):
+            yield from content
+        log.check(budget, path)
@@ -47,6 +47,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Opt-in request timing (taavonyar.perf); removes itself unless PERF_INSTRUMENTATION
+    "taavonyar.perf.PerfMiddleware",
+    # Ahead of session/auth, so a view's query budget covers them and the response body
+    "taavonyar.query_budget.QueryBudgetMiddleware",
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -59,6 +63,26 @@ MIDDLEWARE = [
 
 ]
 
+# Fail requests that exceed their view's @query_budget (taavonyar.query_budget).
+# Off in production; the test suite turns it on in conftest.py.
+QUERY_BUDGETS_ENFORCED = os.getenv("DJANGO_QUERY_BUDGETS", "0") == "1"
+
+# Per-route request timing, slow-request log and the staff /perf/ page (taavonyar.perf)
+PERF_INSTRUMENTATION = os.getenv("DJANGO_PERF", "0") == "1"
+PERF_SLOW_REQUEST_MS = int(os.getenv("DJANGO_PERF_SLOW_MS", "500"))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        # One JSON object per slow request
+        "taavonyar.perf.slow": {"handlers": ["console"], "level": "WARNING", "propagate": False},
+    },
+}
+
 ROOT_URLCONF = 'taavonyar.urls'
 
 TEMPLATES = [
@@ -90,6 +114,19 @@ WSGI_APPLICATION = 'taavonyar.wsgi.application'
 #     }
 # }
 
+# Connection runtime (taavonyar.db). Either a psycopg pool per process
+# (POSTGRES_POOL=1) or one persistent connection per worker thread, kept for
+# POSTGRES_CONN_MAX_AGE seconds; both are health-checked before reuse.
+# Every connection starts with these server-side limits (0 disables one), so a
+# stuck lock holder fails its waiters instead of tying up every worker.
+# The workers and bulk commands lift statement_timeout themselves
+# (taavonyar.db.without_statement_timeout); run migrations with
+# POSTGRES_STATEMENT_TIMEOUT_MS=0.
+POSTGRES_POOL = os.getenv("POSTGRES_POOL", "0") == "1"
+POSTGRES_STATEMENT_TIMEOUT_MS = int(os.getenv("POSTGRES_STATEMENT_TIMEOUT_MS", "30000"))
+POSTGRES_LOCK_TIMEOUT_MS = int(os.getenv("POSTGRES_LOCK_TIMEOUT_MS", "5000"))
+POSTGRES_IDLE_IN_TRANSACTION_TIMEOUT_MS = int(os.getenv("POSTGRES_IDLE_IN_TRANSACTION_TIMEOUT_MS", "60000"))
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
@@ -98,8 +135,53 @@ DATABASES = {
         "PASSWORD": os.getenv("POSTGRES_PASSWORD", "admin"),
         "HOST": os.getenv("POSTGRES_HOST", "db"),
         "PORT": os.getenv("POSTGRES_PORT", "5432"),
+        # The pool replaces persistent connections; Django refuses both at once
+        "CONN_MAX_AGE": 0 if POSTGRES_POOL else int(os.getenv("POSTGRES_CONN_MAX_AGE", "60")),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "options": (
+                f"-c statement_timeout={POSTGRES_STATEMENT_TIMEOUT_MS}"
+                f" -c lock_timeout={POSTGRES_LOCK_TIMEOUT_MS}"
+                f" -c idle_in_transaction_session_timeout={POSTGRES_IDLE_IN_TRANSACTION_TIMEOUT_MS}"
+            ),
+        },
     }
 }
+if POSTGRES_POOL:
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": int(os.getenv("POSTGRES_POOL_MIN_SIZE", "2")),
+        "max_size": int(os.getenv("POSTGRES_POOL_MAX_SIZE", "10")),
+        # Seconds a request waits for a free connection before failing
+        "timeout": float(os.getenv("POSTGRES_POOL_TIMEOUT", "5")),
+        "max_idle": float(os.getenv("POSTGRES_POOL_MAX_IDLE", "300")),
+        "max_lifetime": float(os.getenv("POSTGRES_POOL_MAX_LIFETIME", "3600")),
+    }
+
+# Tighter limits for the purchase services (taavonyar.db.purchase_timeouts):
+# buyers queue on the same cooperative and listing rows, so waiting long helps nobody
+PURCHASE_STATEMENT_TIMEOUT_MS = int(os.getenv("PURCHASE_STATEMENT_TIMEOUT_MS", "5000"))
+PURCHASE_LOCK_TIMEOUT_MS = int(os.getenv("PURCHASE_LOCK_TIMEOUT_MS", "1500"))
+
+# Cache (taavonyar.cache). Namespace versions and cached pages must be shared
+# by every worker process, or an invalidation only reaches the process that
+# made the write: deployments point REDIS_URL at one Redis. Without it each
+# process gets its own LocMemCache, which is only right for a single process
+# (runserver, tests).
+REDIS_URL = os.getenv("REDIS_URL", "")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "taavonyar",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
 
 
 
@@ -147,3 +229,5 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+# Under MEDIA_ROOT but never URL-routed: files here are served by views that check access
+PRIVATE_MEDIA_DIR = "private"
@@ -1,12 +1,15 @@
 from django.contrib import admin
-from django.urls import path, include
+import re
+
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
-from .views import home
+from django.views.static import serve
+from .views import home, perf_report
 
 urlpatterns = [
     path("", home, name="home"),
     path("admin/", admin.site.urls),
+    path("perf/", perf_report, name="perf_report"),
 
     path("accounts/", include("accounts.urls")),
     path("coops/", include("coops.urls")),
@@ -15,4 +18,13 @@ urlpatterns = [
 ]
 
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    # Like static(), minus PRIVATE_MEDIA_DIR (board exports go through coops:download_export)
+    urlpatterns += [
+        re_path(
+            r"^%s(?!%s/)(?P<path>.*)$" % (
+                re.escape(settings.MEDIA_URL.lstrip("/")), re.escape(settings.PRIVATE_MEDIA_DIR)
+            ),
+            serve,
+            kwargs={"document_root": settings.MEDIA_ROOT},
+        ),
+    ]
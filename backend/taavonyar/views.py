@@ -1,4 +1,21 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render
 
+from . import db, perf
+from .query_budget import query_budget
+
 def home(request):
     return render(request, "core/home.html")
+
+
+@query_budget(5)
+@staff_member_required
+def perf_report(request):
+    """Routes of this worker process by total time (see taavonyar.perf)."""
+    return render(request, "core/perf.html", {
+        "enabled": settings.PERF_INSTRUMENTATION,
+        "slow_ms": settings.PERF_SLOW_REQUEST_MS,
+        "routes": perf.top_routes(),
+        "database": db.connection_stats(),
+    })
@@ -0,0 +1,85 @@
+import pytest
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.urls import reverse
+
+from shares.models import ShareHolding
+from shares import volume
+from shares.services import buy_from_marketplace
+from taavonyar import db
+from tests.factories import CooperativeFactory, UserFactory
+
+
+def _ms(name: str) -> int:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT setting::int FROM pg_settings WHERE name = %s", [name])
+        return cursor.fetchone()[0]
+
+
+@pytest.mark.django_db
+def test_connections_start_with_the_configured_limits_and_purchases_tighten_them():
+    assert _ms("statement_timeout") == settings.POSTGRES_STATEMENT_TIMEOUT_MS
+    assert _ms("lock_timeout") == settings.POSTGRES_LOCK_TIMEOUT_MS
+
+    seen = []
+    with transaction.atomic():
+        db.purchase_timeouts(lambda: seen.append((_ms("statement_timeout"), _ms("lock_timeout"))))()
+    assert seen == [(settings.PURCHASE_STATEMENT_TIMEOUT_MS, settings.PURCHASE_LOCK_TIMEOUT_MS)]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_purchase_gives_up_on_a_held_row_lock(settings):
+    settings.PURCHASE_LOCK_TIMEOUT_MS = 50
+    coop = CooperativeFactory(available_primary_shares=10)
+    buyer = UserFactory()
+
+    # Another session sits on the cooperative row, like a stuck worker would
+    other = connections.create_connection("default")
+    try:
+        other.set_autocommit(False)
+        with other.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM coops_cooperative WHERE id = %s FOR UPDATE", [coop.id])
+        with pytest.raises(ValueError, match="busy"):
+            buy_from_marketplace(coop=coop, buyer=buyer, quantity=1, source="primary")
+    finally:
+        other.rollback()
+        other.close()
+
+    assert not ShareHolding.objects.filter(user=buyer).exists()
+    # The lower limits went with the failed transaction
+    assert _ms("lock_timeout") == settings.POSTGRES_LOCK_TIMEOUT_MS
+    buy_from_marketplace(coop=coop, buyer=buyer, quantity=1, source="primary")
+
+
+@pytest.mark.django_db
+def test_perf_page_reports_connections(client):
+    client.force_login(UserFactory(is_staff=True))
+
+    content = client.get(reverse("perf_report")).content.decode()
+
+    assert "Database connections: persistent" in content
+    assert db.connection_stats()["connections_opened"] >= 1
+
+
+@pytest.mark.django_db
+def test_bulk_commands_run_without_the_statement_timeout(monkeypatch):
+    coop = CooperativeFactory()
+    seen = []
+    monkeypatch.setattr(volume, "rebuild", lambda coop_id: seen.append(_ms("statement_timeout")))
+
+    call_command("rebuild_trade_volume", "--coop", str(coop.id))
+
+    assert seen == [0]
+    assert _ms("statement_timeout") == settings.POSTGRES_STATEMENT_TIMEOUT_MS
+
+
+@pytest.mark.django_db(transaction=True)
+def test_workers_keep_the_timeout_off_across_reconnects():
+    @db.without_statement_timeout
+    def handle():
+        connection.close()
+        return _ms("statement_timeout")
+
+    assert handle() == 0
+    assert _ms("statement_timeout") == settings.POSTGRES_STATEMENT_TIMEOUT_MS
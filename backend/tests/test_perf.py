@@ -0,0 +1,61 @@
+import json
+import logging
+
+import pytest
+from django.urls import reverse
+
+from taavonyar import perf
+from tests.factories import CooperativeFactory, UserFactory
+
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def instrumented(settings):
+    settings.PERF_INSTRUMENTATION = True
+    settings.PERF_SLOW_REQUEST_MS = 0
+    perf.reset()
+    yield
+    perf.reset()
+
+
+def test_requests_are_recorded_per_route_with_sql_and_service_time(client, instrumented, caplog, monkeypatch):
+    # The slow log has its own handler; let caplog see it too
+    monkeypatch.setattr(perf.slow_log, "propagate", True)
+    coop = CooperativeFactory(price_per_share=10, available_primary_shares=10)
+    client.force_login(UserFactory())
+
+    with caplog.at_level(logging.WARNING, logger="taavonyar.perf.slow"):
+        client.get(reverse("coops:coop_list"))
+        client.post(reverse("shares:buy_primary"), {"coop_id": coop.id, "quantity": "2"})
+
+    routes = {r["route"]: r for r in perf.top_routes()}
+    assert routes["GET coops:coop_list"]["count"] == 1
+    buy = routes["POST shares:buy_primary"]
+    assert buy["mean_sql_count"] > 0
+    assert buy["mean_service_ms"] > 0
+    assert buy["p50"] <= buy["p99"]
+
+    # Threshold 0: every request is written to the slow log as JSON
+    entries = [json.loads(r.getMessage()) for r in caplog.records]
+    assert [e["route"] for e in entries] == ["GET coops:coop_list", "POST shares:buy_primary"]
+    assert entries[1]["slowest_sql"]
+    assert list(entries[1]["service_ms"]) == ["shares.services.buy_primary_shares_from_coop"]
+
+
+def test_middleware_is_off_by_default(client):
+    perf.reset()
+    client.get(reverse("coops:coop_list"))
+    assert perf.top_routes() == []
+
+
+def test_report_is_staff_only(client, instrumented):
+    client.force_login(UserFactory())
+    assert client.get(reverse("perf_report")).status_code == 302
+
+    client.force_login(UserFactory(is_staff=True))
+    client.get(reverse("coops:coop_list"))
+    response = client.get(reverse("perf_report"))
+    assert response.status_code == 200
+    assert b"coops:coop_list" in response.content
@@ -0,0 +1,206 @@
+import pytest
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse
+from django.urls import URLPattern, URLResolver, get_resolver, path, reverse
+
+from accounts.models import BoardMember, Shareholder
+from coops.exports import claim_next_job, request_export, run_job
+from coops.models import ExportJob
+from shares.services import buy_from_listing, buy_primary_shares_from_coop, create_listing
+from taavonyar.query_budget import QueryBudgetExceeded, budget_for, query_budget
+from tests.factories import (
+    ContributionFactory,
+    CooperativeFactory,
+    HoldingFactory,
+    IndividualFactory,
+    ProjectFactory,
+    UserFactory,
+)
+
+
+pytestmark = pytest.mark.django_db
+
+BUDGETED_APPS = ("accounts", "coops", "projects", "shares")
+
+# Rows per table in the fixture: above DEFAULT_MAX_REPEATS, so an N+1 fails
+ROWS = 6
+
+
+def _patterns(resolver: URLResolver, namespace: str | None = None):
+    for p in resolver.url_patterns:
+        if isinstance(p, URLResolver):
+            yield from _patterns(p, p.namespace or namespace)
+        elif isinstance(p, URLPattern):
+            yield namespace, p
+
+
+def test_every_app_url_declares_a_budget():
+    missing = [
+        f"{namespace}:{p.name}"
+        for namespace, p in _patterns(get_resolver())
+        if namespace in BUDGETED_APPS and budget_for(p.callback) is None
+    ]
+    assert missing == []
+
+
+@pytest.fixture
+def world(settings, tmp_path):
+    """A coop with ROWS of everything, seen by a board member who is also a shareholder."""
+    settings.MEDIA_ROOT = tmp_path
+    coop = CooperativeFactory(price_per_share=10, available_primary_shares=1000)
+    other_coop = CooperativeFactory()
+
+    me = IndividualFactory()
+    Shareholder.objects.create(individual=me, shareholder_id="SH-ME", bank_account_number="PENDING")
+    BoardMember.objects.create(
+        individual=me, cooperative=coop, boardmember_id="BM-ME", status=BoardMember.AuthorityStatus.ACCEPTED
+    )
+    HoldingFactory(cooperative=coop, user=me.user, quantity=50)
+    HoldingFactory(cooperative=other_coop, user=me.user, quantity=5)
+
+    holders = [IndividualFactory().user for _ in range(ROWS)] + [UserFactory() for _ in range(ROWS)]
+    for n, user in enumerate(holders):
+        HoldingFactory(cooperative=coop, user=user, quantity=10 + n)
+
+    projects = [ProjectFactory(cooperative=coop) for _ in range(ROWS)]
+    for project in projects:
+        for user in holders[:ROWS]:
+            ContributionFactory(project=project, user=user, amount=100)
+        ContributionFactory(project=project, user=me.user, amount=100)
+
+    listings = [create_listing(coop=coop, seller=user, quantity=2) for user in holders]
+    for listing in listings[:ROWS]:
+        buy_from_listing(listing=listing, buyer=me.user, quantity=1)
+    mine = [create_listing(coop=coop, seller=me.user, quantity=1) for _ in range(ROWS)]
+    for user in holders[:ROWS]:
+        buy_primary_shares_from_coop(coop=coop, buyer=user, quantity=1)
+
+    job = request_export(coop=coop, kind=ExportJob.Kind.SHAREHOLDERS, user=me.user)
+    for _ in range(ROWS - 1):
+        ExportJob.objects.create(cooperative=coop, kind=ExportJob.Kind.TRADES, data_version="old", requested_by=me.user)
+    run_job(claim_next_job())
+
+    return {
+        "coop": coop,
+        "user": me.user,
+        "project": projects[0],
+        "listing": listings[-1],
+        "my_listing": mine[0],
+        "job": job,
+        "holder": holders[0],
+    }
+
+
+def _requests(w):
+    coop, project = w["coop"], w["project"]
+    return [
+        ("get", "accounts:login", {}, {}),
+        ("post", "accounts:logout", {}, {}),
+        ("get", "accounts:register", {}, {}),
+        ("get", "accounts:profile", {}, {}),
+        ("get", "accounts:dashboard", {}, {}),
+        ("get", "accounts:choose_dashboard", {}, {}),
+        ("get", "accounts:switch_mode", {"mode": "board"}, {}),
+        ("get", "coops:coop_list", {}, {}),
+        ("get", "coops:coop_detail", {"coop_id": coop.id}, {}),
+        ("get", "coops:board_coop_edit", {}, {}),
+        ("post", "coops:board_coop_edit", {}, {"name": coop.name, "available_primary_shares": "900"}),
+        ("post", "coops:add_board_member", {}, {"shareholder_id": "SH-NOPE"}),
+        ("get", "coops:export_shareholders_csv", {}, {}),
+        ("get", "coops:export_trades_csv", {}, {}),
+        ("get", "coops:export_summary_csv", {}, {}),
+        ("get", "coops:export_volume_csv", {}, {}),
+        ("get", "coops:export_cap_table_csv", {}, {}),
+        ("get", "coops:board_exports", {}, {}),
+        ("post", "coops:board_exports", {}, {"kind": ExportJob.Kind.TRADES}),
+        ("get", "coops:download_export", {"job_id": w["job"].id}, {}),
+        ("get", "projects:project_list", {}, {}),
+        ("get", "projects:project_detail", {"project_id": project.id}, {}),
+        ("post", "projects:project_contribute", {"project_id": project.id}, {"amount": "100"}),
+        ("get", "projects:board_dashboard", {}, {}),
+        ("get", "projects:board_project_create", {}, {}),
+        ("post", "projects:board_project_create", {}, {"title": "New", "goal_amount": "100", "shares_to_distribute": "10"}),
+        ("get", "projects:board_project_edit", {"project_id": project.id}, {}),
+        ("post", "projects:board_project_edit", {"project_id": project.id}, {"title": "Renamed"}),
+        ("get", "projects:board_project_preview", {"project_id": project.id}, {}),
+        ("post", "projects:project_mark_done", {"project_id": project.id}, {}),
+        ("get", "shares:shareholder_dashboard", {}, {}),
+        ("get", "shares:marketplace", {}, {}),
+        ("post", "shares:create_listing", {}, {"coop_id": coop.id, "quantity": "1"}),
+        ("post", "shares:buy_listing", {"listing_id": w["listing"].id}, {"quantity": "1"}),
+        ("post", "shares:buy_primary", {}, {"coop_id": coop.id, "quantity": "1"}),
+        ("get", "shares:my_listings", {}, {}),
+        ("post", "shares:cancel_listing", {"listing_id": w["my_listing"].id}, {}),
+        ("get", "shares:my_trades", {}, {}),
+        ("post", "shares:buy_marketplace", {}, {"coop_id": coop.id, "quantity": "3", "source": "secondary"}),
+        ("get", "shares:export_my_holdings_csv", {}, {}),
+        ("get", "shares:export_my_contributions_csv", {}, {}),
+        ("get", "shares:export_my_trade_logs_csv", {}, {}),
+    ]
+
+
+def test_every_view_stays_within_its_budget(client, world):
+    """The middleware raises QueryBudgetExceeded on any request over budget or repeating a query."""
+    requests = _requests(world)
+    # Every budgeted URL is exercised
+    assert {name for _, name, _, _ in requests} == {
+        f"{namespace}:{p.name}" for namespace, p in _patterns(get_resolver()) if namespace in BUDGETED_APPS
+    }
+
+    for method, name, kwargs, data in requests:
+        client.force_login(world["user"])
+        response = getattr(client, method)(reverse(name, kwargs=kwargs), data)
+        assert response.status_code < 400, name
+        if response.streaming:
+            b"".join(response.streaming_content)
+
+
+def test_views_without_an_individual_profile_stay_within_budget(client, world):
+    client.force_login(UserFactory())
+    for name in ("accounts:dashboard", "accounts:choose_dashboard", "shares:shareholder_dashboard",
+                 "shares:marketplace", "projects:board_dashboard"):
+        assert client.get(reverse(name)).status_code < 400, name
+
+
+# A tiny urlconf to check the middleware itself
+
+@query_budget(2)
+def _over_budget(request):
+    list(UserFactory._meta.model.objects.all()[:1])
+    list(UserFactory._meta.model.objects.all()[:1])
+    list(UserFactory._meta.model.objects.all()[:1])
+    return HttpResponse("ok")
+
+
+@query_budget(20, max_repeats=2)
+@login_required
+def _n_plus_one(request):
+    for individual in IndividualFactory._meta.model.objects.all():
+        individual.user.username
+    return HttpResponse("ok")
+
+
+urlpatterns = [
+    path("over/", _over_budget),
+    path("loop/", _n_plus_one),
+]
+
+
+@pytest.mark.urls(__name__)
+def test_middleware_rejects_a_request_over_its_budget(client):
+    with pytest.raises(QueryBudgetExceeded, match="ran 3 queries, budget is 2"):
+        client.get("/over/")
+
+
+@pytest.mark.urls(__name__)
+def test_middleware_rejects_a_repeated_query_shape(client):
+    client.force_login(UserFactory())
+    IndividualFactory.create_batch(3)
+    with pytest.raises(QueryBudgetExceeded, match="likely N\\+1"):
+        client.get("/loop/")
+
+
+@pytest.mark.urls(__name__)
+def test_middleware_is_a_no_op_unless_enforced(client, settings):
+    settings.QUERY_BUDGETS_ENFORCED = False
+    assert client.get("/over/").status_code == 200